@@ -0,0 +1,197 @@
+import time
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from core.vram import governor
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+# --- COST MODEL (SEQUENTIAL ALPHA) ---
+# Only one component is resident at a time, so the peak is the Transformer
+# plus its activation buffer, not the sum of every shard.
+ENGINE_BASE_GB = {"4b": 4.5, "9b": 9.0}
+VRAM_PER_MEGAPIXEL_GB = 1.2
+ACTIVATION_SAFETY = 1.5
+
+# Seconds per (megapixel * step) and fixed overhead per dispatch.
+SECONDS_PER_MP_STEP = 2.5
+SECONDS_OVERHEAD = 3.0
+
+# Backpressure
+MAX_CONCURRENT = 1          # One GPU, one strike in flight.
+MAX_QUEUE_DEPTH = 8
+MAX_QUEUE_WAIT_S = 180.0
+MIN_EDGE = 512              # Downscale floor before we refuse outright.
+LATENT_ALIGN = 16           # 16x16 patch size (vae_scale * 2)
+
+ADMIT, QUEUE, DOWNSCALE, REJECT = "admit", "queue", "downscale", "reject"
+
+
+def _engine_key(model_id):
+    return "9b" if "9b" in str(model_id).lower() else "4b"
+
+
+class AdmissionPlan:
+    """Outcome of a pre-flight check. Carries the render size the carrier should use."""
+    def __init__(self, decision, width, height, target_width, target_height, vram_gb, eta_s, retry_after=0, reason=""):
+        self.decision = decision
+        self.width, self.height = width, height
+        self.target_width, self.target_height = target_width, target_height
+        self.vram_gb = vram_gb
+        self.eta_s = eta_s
+        self.retry_after = retry_after
+        self.reason = reason
+
+    @property
+    def upscale(self):
+        return (self.width, self.height) != (self.target_width, self.target_height)
+
+    def as_dict(self):
+        return {
+            "decision": self.decision,
+            "render": [self.width, self.height],
+            "target": [self.target_width, self.target_height],
+            "vram_gb": round(self.vram_gb, 2),
+            "eta_s": round(self.eta_s, 2),
+            "retry_after": self.retry_after,
+            "reason": self.reason,
+        }
+
+
+class AdmissionController:
+    """
+    Pre-flight Gate in front of the Carrier.
+    Predicts VRAM and time for a strike against the governor budget and decides:
+    admit, queue, downscale-and-upscale, or reject with Retry-After.
+    Observed peaks and timings recalibrate the model after every strike.
+    """
+    def __init__(self, max_concurrent=MAX_CONCURRENT, max_queue_depth=MAX_QUEUE_DEPTH, max_wait_s=MAX_QUEUE_WAIT_S):
+        self.max_concurrent = max_concurrent
+        self.max_queue_depth = max_queue_depth
+        self.max_wait_s = max_wait_s
+        self.vram_per_mp = VRAM_PER_MEGAPIXEL_GB
+        self.seconds_per_mp_step = SECONDS_PER_MP_STEP
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self.downscaled = 0
+        self._remaining_s = 0.0
+        self._lock = threading.Lock()
+        self._slots = None
+
+    # --- PREDICTION ---
+    def predict_vram_gb(self, width, height, model_id="4b"):
+        megapixels = (width * height) / 1_000_000
+        return ENGINE_BASE_GB[_engine_key(model_id)] + megapixels * self.vram_per_mp * ACTIVATION_SAFETY
+
+    def predict_seconds(self, width, height, steps):
+        megapixels = (width * height) / 1_000_000
+        return SECONDS_OVERHEAD + megapixels * max(1, steps) * self.seconds_per_mp_step
+
+    def _fit_to_budget(self, width, height, model_id, budget):
+        """Largest aligned size with the same aspect ratio that fits the budget, or None."""
+        headroom = budget - ENGINE_BASE_GB[_engine_key(model_id)]
+        if headroom <= 0:
+            return None
+        max_mp = headroom / (self.vram_per_mp * ACTIVATION_SAFETY)
+        scale = min(1.0, (max_mp * 1_000_000 / (width * height)) ** 0.5)
+        w = int(width * scale) // LATENT_ALIGN * LATENT_ALIGN
+        h = int(height * scale) // LATENT_ALIGN * LATENT_ALIGN
+        if min(w, h) < MIN_EDGE:
+            return None
+        return w, h
+
+    def plan(self, width, height, steps, model_id="4b", background=False):
+        """
+        background=True: background work (batch items) queues however deep the backlog is; only a
+        render that cannot fit the VRAM budget even downscaled is rejected.
+        """
+        budget = governor.get_budget_gb()
+        vram = self.predict_vram_gb(width, height, model_id)
+        render_w, render_h, decision, reason = width, height, ADMIT, ""
+
+        if vram > budget:
+            fit = self._fit_to_budget(width, height, model_id, budget)
+            if fit is None:
+                self.rejected += 1
+                return AdmissionPlan(REJECT, width, height, width, height, vram, 0.0,
+                                     reason=f"Predicted {vram:.2f}GB exceeds budget {budget:.2f}GB")
+            render_w, render_h = fit
+            vram = self.predict_vram_gb(render_w, render_h, model_id)
+            decision, reason = DOWNSCALE, f"Rendering {render_w}x{render_h}, upscaling to {width}x{height}"
+
+        eta = self.predict_seconds(render_w, render_h, steps)
+        with self._lock:
+            depth = self.in_flight + self.waiting
+            wait = self._remaining_s
+        if depth >= self.max_concurrent:
+            if not background and (self.waiting >= self.max_queue_depth or wait > self.max_wait_s):
+                self.rejected += 1
+                return AdmissionPlan(REJECT, render_w, render_h, width, height, vram, eta,
+                                     retry_after=max(1, int(wait)), reason=f"Queue saturated ({depth} ahead)")
+            if decision == ADMIT:
+                decision, reason = QUEUE, f"{depth} ahead, ~{wait:.0f}s wait"
+        if decision == DOWNSCALE:
+            self.downscaled += 1
+        return AdmissionPlan(decision, render_w, render_h, width, height, vram, eta, reason=reason)
+
+    # --- SLOTS ---
+    @asynccontextmanager
+    async def slot(self, plan):
+        """Hold a carrier slot for the duration of a strike. Queued plans wait here."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_concurrent)
+        with self._lock:
+            self.waiting += 1
+            self._remaining_s += plan.eta_s
+        try:
+            await self._slots.acquire()
+        except BaseException:
+            with self._lock:
+                self.waiting -= 1
+                self._remaining_s = max(0.0, self._remaining_s - plan.eta_s)
+            raise
+        with self._lock:
+            self.waiting -= 1
+            self.in_flight += 1
+        try:
+            yield plan
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                self._remaining_s = max(0.0, self._remaining_s - plan.eta_s)
+            self._slots.release()
+
+    # --- CALIBRATION ---
+    def observe(self, plan, seconds, steps, peak_gb=None, model_id="4b"):
+        """Fold a finished strike back into the cost model (EMA)."""
+        megapixels = (plan.width * plan.height) / 1_000_000
+        work = megapixels * max(1, steps)
+        if work > 0 and seconds > SECONDS_OVERHEAD:
+            sample = (seconds - SECONDS_OVERHEAD) / work
+            self.seconds_per_mp_step = 0.8 * self.seconds_per_mp_step + 0.2 * sample
+        if peak_gb and megapixels > 0:
+            sample = (peak_gb - ENGINE_BASE_GB[_engine_key(model_id)]) / (megapixels * ACTIVATION_SAFETY)
+            if sample > 0:
+                self.vram_per_mp = max(self.vram_per_mp * 0.9, 0.8 * self.vram_per_mp + 0.2 * sample)
+
+    def record_oom(self, plan):
+        """An OOM means the model under-predicted. Inflate per-MP cost so the next plan downscales."""
+        self.vram_per_mp *= 1.25
+        logger.warning(f"[ADMISSION] OOM at {plan.width}x{plan.height}. VRAM/MP recalibrated to {self.vram_per_mp:.2f}GB.")
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "in_flight": self.in_flight,
+                "waiting": self.waiting,
+                "eta_backlog_s": round(self._remaining_s, 1),
+                "rejected": self.rejected,
+                "downscaled": self.downscaled,
+                "vram_per_mp": round(self.vram_per_mp, 3),
+                "seconds_per_mp_step": round(self.seconds_per_mp_step, 3),
+            }
+
+
+admission = AdmissionController()
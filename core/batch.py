@@ -0,0 +1,353 @@
+import io
+import os
+import csv
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import logging
+import threading
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+BATCH_ROOT = os.path.join("outputs", "batches")
+MANIFEST_FILE = "manifest.jsonl"
+RESULTS_FILE = "results.jsonl"
+ERRORS_FILE = "errors.jsonl"    # Items that failed this run; not checkpointed, so a resume retries them
+STATE_FILE = "job.json"
+SEED_MAX = 2**31            # seed -1 draws from [0, SEED_MAX) and the drawn seed is recorded
+
+DEFAULTS = {
+    "width": 1024, "height": 1024, "steps": 4, "guidance": 3.5, "seed": -1,
+    "model": "4b", "sampler": "flow_euler", "scheduler": "linear",
+}
+NUMERIC = {"width": int, "height": int, "steps": int, "seed": int, "guidance": float}
+
+
+# --- MANIFEST ---
+def parse_manifest(text, fmt=None):
+    """
+    JSONL (one object per line) or CSV (header row) -> normalized item dicts.
+    Only `prompt` is required; everything else falls back to DEFAULTS.
+    Any malformed row raises ValueError naming the row.
+    """
+    text = text.lstrip("\ufeff")
+    if fmt is None:
+        fmt = "jsonl" if text.lstrip().startswith("{") else "csv"
+    if fmt == "jsonl":
+        rows = []
+        for line in text.splitlines():
+            if line.strip():
+                try:
+                    rows.append(json.loads(line))
+                except ValueError as e:
+                    raise ValueError(f"Manifest row {len(rows) + 1}: invalid JSON ({e}).")
+    elif fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(text)))
+    else:
+        raise ValueError(f"Unknown manifest format: {fmt}")
+
+    items = []
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f"Manifest row {i + 1}: expected an object, got {type(row).__name__}.")
+        prompt = str(row.get("prompt") or "").strip()
+        if not prompt:
+            raise ValueError(f"Manifest row {i + 1}: missing prompt.")
+        item = dict(DEFAULTS)
+        item.update({k: v for k, v in row.items() if k in DEFAULTS and v not in (None, "")})
+        for k, cast in NUMERIC.items():
+            try:
+                item[k] = cast(item[k])
+            except (TypeError, ValueError, OverflowError):
+                raise ValueError(f"Manifest row {i + 1}: {k} must be a number, got {item[k]!r}.")
+        item["model"] = "9b" if "9b" in str(item["model"]).lower() else "4b"
+        item["prompt"] = prompt
+        item["index"] = i
+        item["name"] = str(row.get("name") or f"{i:05d}")
+        items.append(item)
+    return items
+
+
+def locality_order(items):
+    """
+    Run order that keeps Silicon warm: one model residency at a time, scheduler swaps
+    grouped, identical prompts back to back (Brain cache hits), then shape buckets.
+    """
+    return sorted(items, key=lambda it: (it["model"], it["sampler"], it["scheduler"], it["prompt"], it["width"], it["height"], it["index"]))
+
+
+# --- JOB ---
+class BatchJob:
+    """
+    One manifest, one output directory. The results index doubles as the checkpoint:
+    an item is done once its line is in results.jsonl and its PNG exists. A failing item
+    is logged to errors.jsonl and skipped; the rest of the job carries on.
+    """
+    def __init__(self, job_id, root=BATCH_ROOT):
+        self.id = job_id
+        self.dir = os.path.join(root, job_id)
+        self.items = []
+        self.done = {}              # index -> result record
+        self.failed = {}            # index -> error of this run
+        self.status = "pending"     # pending | running | done | cancelled | failed | interrupted
+        self.error = None
+        self.started_at = None
+        self.finished_at = None
+        self.run_completed = 0      # Items rendered by this run (resumed ones excluded)
+        self.run_seconds = 0.0
+        self._cancel = threading.Event()
+        self._lock = threading.Lock()
+
+    # --- PERSISTENCE ---
+    @classmethod
+    def create(cls, items, root=BATCH_ROOT, job_id=None):
+        job = cls(job_id or uuid.uuid4().hex[:12], root)
+        os.makedirs(job.dir, exist_ok=True)
+        with open(os.path.join(job.dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+            for it in items:
+                f.write(json.dumps(it) + "\n")
+        job.items = items
+        job._save_state()
+        return job
+
+    @classmethod
+    def load(cls, job_id, root=BATCH_ROOT):
+        job = cls(job_id, root)
+        with open(os.path.join(job.dir, MANIFEST_FILE), "r", encoding="utf-8") as f:
+            job.items = [json.loads(line) for line in f if line.strip()]
+        try:
+            with open(os.path.join(job.dir, STATE_FILE), "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            job.status, job.error = saved.get("status", "pending"), saved.get("error")
+        except (OSError, ValueError):
+            pass
+        if job.status == "running":
+            job.status = "interrupted"  # Process died mid-run; resumable
+        job._load_results()
+        return job
+
+    def _load_results(self):
+        path = os.path.join(self.dir, RESULTS_FILE)
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue  # Torn final line from a crash
+                if os.path.exists(os.path.join(self.dir, rec["file"])):
+                    self.done[rec["index"]] = rec
+
+    def _save_state(self):
+        tmp = os.path.join(self.dir, STATE_FILE + ".tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"id": self.id, "status": self.status, "error": self.error, "total": len(self.items)}, f)
+        os.replace(tmp, os.path.join(self.dir, STATE_FILE))
+
+    def _record(self, item, filename, seed, seconds, render=None):
+        rec = {"index": item["index"], "name": item["name"], "file": filename, "prompt": item["prompt"],
+               "seed": seed, "width": item["width"], "height": item["height"], "time": round(seconds, 3)}
+        if render is not None and tuple(render) != (item["width"], item["height"]):
+            rec["render"] = list(render)  # Admission downscaled the render; the PNG is upscaled to size
+        with self._lock:
+            self._append(RESULTS_FILE, rec)
+            self.done[item["index"]] = rec
+            self.failed.pop(item["index"], None)
+            self.run_completed += 1
+            self.run_seconds += seconds
+
+    def _record_error(self, item, error):
+        rec = {"index": item["index"], "name": item["name"], "prompt": item["prompt"], "error": str(error) or type(error).__name__, "at": time.time()}
+        with self._lock:
+            self._append(ERRORS_FILE, rec)
+            self.failed[item["index"]] = rec["error"]
+        logger.error(f"[BATCH] {self.id} item {item['index']} ({item['name']}) failed: {rec['error']}")
+
+    def _append(self, name, rec):
+        with open(os.path.join(self.dir, name), "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    # --- EXECUTION ---
+    def pending(self):
+        return [it for it in locality_order(self.items) if it["index"] not in self.done]
+
+    def cancel(self):
+        self._cancel.set()
+
+    async def render_item(self, item, plan=None):
+        """
+        One strike written straight into the job directory (no strike_*/latest.png side effects).
+        plan: Admission plan; its render size is used and the PNG is upscaled back to the item size.
+        Runs on the worker fleet when it is up, otherwise on the in-process carrier.
+        Returns (filename, seed actually used, render size).
+        """
+        from core.carrier import carrier
+        from core.workers import worker_pool
+        seed = item["seed"] if item["seed"] >= 0 else random.randrange(SEED_MAX)
+        width, height = (plan.width, plan.height) if plan is not None else (item["width"], item["height"])
+        filename = f"{item['index']:05d}_{_safe(item['name'])}.png"
+        params = dict(
+            prompt=item["prompt"], model_id=item["model"], height=height, width=width,
+            steps=item["steps"], guidance=item["guidance"], seed=seed,
+            sampler=item["sampler"], scheduler=item["scheduler"],
+            target_height=item["height"], target_width=item["width"],
+            output_path=os.path.join(self.dir, filename),
+        )
+        if worker_pool.enabled:
+            await worker_pool.submit(**params)
+        else:
+            await asyncio.to_thread(carrier.dispatch, **params)
+        return filename, seed, (width, height)
+
+    async def run(self, slot=None):
+        """
+        Render every pending item in locality order.
+        slot: Optional async context factory yielding the admission plan (the admission gate)
+              so batch work shares Silicon with interactive strikes instead of starving them.
+              Raising from it (e.g. the item can never fit the VRAM budget) fails that item only.
+        """
+        self.status, self.error, self.started_at = "running", None, time.time()
+        self.failed = {}
+        self._cancel.clear()
+        self._save_state()
+        todo = self.pending()
+        logger.info(f"[BATCH] {self.id}: {len(todo)} pending / {len(self.items)} total")
+        try:
+            for item in todo:
+                if self._cancel.is_set():
+                    self.status = "cancelled"
+                    break
+                start = time.time()
+                try:
+                    if slot is not None:
+                        async with slot(item) as plan:
+                            filename, seed, render = await self.render_item(item, plan)
+                    else:
+                        filename, seed, render = await self.render_item(item)
+                except Exception as e:
+                    self._record_error(item, e)
+                    continue
+                self._record(item, filename, seed, time.time() - start, render)
+            else:
+                self.status = "done"
+        except Exception as e:
+            self.status, self.error = "failed", str(e)
+            logger.error(f"[BATCH] {self.id} Fault: {e}")
+        finally:
+            self.finished_at = time.time()
+            self._save_state()
+        logger.info(f"[BATCH] {self.id} {self.status.upper()} | {len(self.done)}/{len(self.items)} | {len(self.failed)} failed | {self.images_per_hour():.0f} img/h")
+        return self
+
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        end = self.finished_at if self.status != "running" and self.finished_at else time.time()
+        return end - self.started_at
+
+    def images_per_hour(self):
+        """Wall-clock throughput of this run (queueing behind interactive strikes included)."""
+        elapsed = self.elapsed()
+        return self.run_completed / elapsed * 3600 if elapsed > 0 else 0.0
+
+    def get_state(self):
+        elapsed = self.elapsed()
+        return {
+            "id": self.id, "status": self.status, "error": self.error,
+            "total": len(self.items), "completed": len(self.done), "failed": len(self.failed),
+            "images_per_hour": round(self.images_per_hour(), 1),
+            "avg_render_s": round(self.run_seconds / self.run_completed, 2) if self.run_completed else None,
+            "elapsed_s": round(elapsed, 1),
+            "results": f"/outputs/batches/{self.id}/{RESULTS_FILE}",
+            "errors": f"/outputs/batches/{self.id}/{ERRORS_FILE}" if self.failed else None,
+        }
+
+
+def _safe(name):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in name)[:64]
+
+
+class BatchManager:
+    """Batch jobs of this server process. Jobs left on disk by a crash can be resumed."""
+    def __init__(self, root=BATCH_ROOT):
+        self.root = root
+        self.jobs = {}
+        self._tasks = {}
+
+    def submit(self, items, slot=None):
+        job = BatchJob.create(items, self.root)
+        self.jobs[job.id] = job
+        self._start(job, slot)
+        return job
+
+    def resume(self, job_id, slot=None):
+        job = self.get(job_id)
+        if job is None:
+            return None
+        if job.status != "running":
+            self._start(job, slot)
+        return job
+
+    def _start(self, job, slot):
+        self._tasks[job.id] = asyncio.get_running_loop().create_task(job.run(slot))
+
+    def get(self, job_id):
+        if job_id not in self.jobs:
+            if _safe(job_id) != job_id or not os.path.exists(os.path.join(self.root, job_id, MANIFEST_FILE)):
+                return None
+            self.jobs[job_id] = BatchJob.load(job_id, self.root)
+        return self.jobs[job_id]
+
+    def list(self):
+        if os.path.isdir(self.root):
+            for name in sorted(os.listdir(self.root)):
+                self.get(name)
+        return [j.get_state() for j in self.jobs.values()]
+
+
+batch_manager = BatchManager()
+
+
+# --- CLI ---
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Bulk generation from a JSONL/CSV manifest (resumable).")
+    parser.add_argument("manifest", nargs="?", help="Manifest path (.jsonl or .csv)")
+    parser.add_argument("--resume", metavar="JOB_ID", help="Continue an existing job under outputs/batches/")
+    parser.add_argument("--job-id", help="Job directory name for a new job (default: random)")
+    parser.add_argument("--root", default=BATCH_ROOT, help="Batch output root")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    for job_id in (args.resume, args.job_id):
+        if job_id is not None and _safe(job_id) != job_id:
+            parser.error(f"invalid job id {job_id!r} (letters, digits, '-' and '_' only, at most 64)")
+
+    if args.resume:
+        job = BatchJob.load(args.resume, args.root)
+    elif args.manifest:
+        with open(args.manifest, "r", encoding="utf-8") as f:
+            fmt = "csv" if args.manifest.lower().endswith(".csv") else "jsonl"
+            items = parse_manifest(f.read(), fmt)
+        job = BatchJob.create(items, args.root, job_id=args.job_id)
+    else:
+        parser.error("manifest or --resume is required")
+
+    print(f"BATCH {job.id}: {len(job.pending())} pending -> {job.dir}")
+    try:
+        asyncio.run(job.run())
+    except KeyboardInterrupt:
+        print(f"Interrupted. Resume with: python -m core.batch --resume {job.id}")
+        return 130
+    print(json.dumps(job.get_state(), indent=2))
+    return 0 if job.status == "done" and not job.failed else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,132 @@
+import logging
+import threading
+from collections import OrderedDict
+
+from core.startup import lazy_import
+
+torch = lazy_import("torch")
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+# --- RESOLUTION BUCKETS ---
+# Every render lands on a 128px grid (the UI sliders' step), so the caching allocator
+# sees a small, recurring set of tensor shapes instead of one per request.
+BUCKET_STEP = 128
+BUCKET_MIN = 256
+BUCKET_MAX = 4096           # Largest accepted edge: big renders take the hi-res / admission-downscale paths
+MAX_BUFFER_BUCKETS = 16     # Preallocated shape sets kept on Silicon (LRU); 2048px latents are ~4MB
+
+
+def _snap_edge(v):
+    v = int(v)
+    if not BUCKET_MIN <= v <= BUCKET_MAX:
+        raise ValueError(f"{v}px is outside the supported range [{BUCKET_MIN}, {BUCKET_MAX}].")
+    return int(max(BUCKET_MIN, min(BUCKET_MAX, round(v / BUCKET_STEP) * BUCKET_STEP)))
+
+
+def snap(width, height):
+    """
+    Nearest (width, height) bucket on the BUCKET_STEP grid. Sizes outside [BUCKET_MIN, BUCKET_MAX]
+    raise ValueError rather than being clamped; callers report the snapped size back.
+    """
+    return _snap_edge(width), _snap_edge(height)
+
+
+def _pad_ids(ids, width, out=None):
+    """Zero-pad positional ids to `width` coordinates (axes_dims_rope), into `out` if given."""
+    if out is None:
+        out = torch.zeros((*ids.shape[:-1], width), device=ids.device, dtype=ids.dtype)
+    else:
+        out.zero_()
+    out[..., :ids.shape[-1]] = ids
+    return out
+
+
+class BucketBuffers:
+    """One bucket's preallocated latent tensor and (padded) image positional ids."""
+    def __init__(self, pipe, shape, device, dtype, td):
+        self.latents = torch.empty(shape, device=device, dtype=dtype)
+        ids = pipe._prepare_latent_ids(self.latents).to(device)
+        self.img_ids = ids if ids.shape[-1] == td else _pad_ids(ids, td)
+        self.uses = 0
+
+
+class LatentBufferPool:
+    """
+    Bucketed Buffer Pool.
+    Latent noise is drawn in place into a per-bucket buffer and image ids are built once per
+    bucket, so a steady stream of strikes allocates nothing new for these tensors. Text ids
+    are padded into per-shape buffers as well (their values depend only on sequence length).
+    Buffers are only read by the denoise loop; one strike per process runs at a time.
+    """
+    def __init__(self, max_buckets=MAX_BUFFER_BUCKETS):
+        self.max_buckets = max_buckets
+        self._buckets = OrderedDict()
+        self._txt = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _bucket(self, pipe, shape, device, dtype, td):
+        key = (shape, str(device), dtype, td)
+        with self._lock:
+            entry = self._buckets.get(key)
+            if entry is not None:
+                self._buckets.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+                entry = BucketBuffers(pipe, shape, device, dtype, td)
+                self._buckets[key] = entry
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+                logger.info(f"[BUCKETS] Preallocated {tuple(shape)} ({len(self._buckets)}/{self.max_buckets} buckets)")
+            entry.uses += 1
+            return entry
+
+    def prepare_latents(self, pipe, batch_size, num_latents_channels, height, width, generator=None, latents=None, device="cuda", dtype=None):
+        """Drop-in for Flux2KleinPipeline.prepare_latents: (packed latents, padded img ids)."""
+        dtype = dtype or torch.float16
+        height = 2 * (int(height) // (pipe.vae_scale_factor * 2))
+        width = 2 * (int(width) // (pipe.vae_scale_factor * 2))
+        shape = (batch_size, num_latents_channels * 4, height // 2, width // 2)
+        td = len(pipe.transformer.config.axes_dims_rope)
+        entry = self._bucket(pipe, shape, torch.device(device), dtype, td)
+
+        if latents is None:
+            torch.randn(shape, generator=generator, out=entry.latents)
+        else:
+            entry.latents.copy_(latents)
+        return pipe._pack_latents(entry.latents), entry.img_ids
+
+    def pad_text_ids(self, ids, td):
+        """Text ids padded to `td` coordinates in a reused buffer."""
+        if ids.shape[-1] == td:
+            return ids
+        key = (tuple(ids.shape[:-1]), td, str(ids.device), ids.dtype)
+        with self._lock:
+            out = self._txt.get(key)
+            if out is None:
+                out = self._txt[key] = torch.zeros((*ids.shape[:-1], td), device=ids.device, dtype=ids.dtype)
+                while len(self._txt) > self.max_buckets:
+                    self._txt.popitem(last=False)
+            else:
+                self._txt.move_to_end(key)
+        return _pad_ids(ids, td, out=out)
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+            self._txt.clear()
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "buckets": [f"{k[0][3] * 16}x{k[0][2] * 16}" for k in self._buckets],
+                "text_buffers": len(self._txt),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+latent_buffers = LatentBufferPool()
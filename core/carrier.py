@@ -1,15 +1,43 @@
-import torch
 import time
 import logging
 import os
+import weakref
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
 from core.vram import governor
 from core.loaders.hybrid_loader import hybrid_loader
+from core.loaders.stub_loader import BACKEND
+from core.buckets import latent_buffers
+from core.derivatives import derivatives
+from core.residency import working_set
+from core.profiling import profiler
+from core.startup import lazy_import
 
 # --- CONVOLUTIONAL FRAGMENTATION FIX ---
+# Set before torch is first touched (torch itself is imported lazily)
 os.environ["PYTORCH_ALLOC_CONF"] = "expandable_segments:True"
+torch = lazy_import("torch")
 
 logger = logging.getLogger("ASSET_EDITOR")
 
+# --- TWO-PASS HI-RES ---
+HIRES_THRESHOLD = 1536 * 1536   # Above this pixel count "auto" hi-res takes the two-pass path
+HIRES_BASE_AREA = 1024 * 1024   # Pass 1 renders at this area (aspect preserved)
+HIRES_REFINE_STEPS = 2          # Pass 2 steps at target size
+HIRES_STRENGTH = 0.3            # Fraction of the (unshifted) trajectory replayed at target size
+
+# --- RECLAMATION POLICY ---
+RECLAIM_MARGIN_GB = 0.75        # Activation headroom on top of the next phase's weights
+
+# --- SPECULATIVE PRE-ENCODE ---
+EMBED_CACHE_SIZE = 16           # Prompt embeddings kept in host RAM (~8MB each at 512 tokens)
+
+
+class Preempted(Exception):
+    """A speculative encode handed the strike lock to a waiting strike."""
+
+
 class ZerodragCarrier:
     """
     Zerodrag Pipeline Execution Vessel.
@@ -21,61 +49,156 @@ class ZerodragCarrier:
         self.cached_embeddings = None
         self.engine_resident = False
         self.optics_resident = False
-
-    def clear_board(self, hard=True):
+        self.phase = "IDLE"
+        self.worker_tag = None      # Set in worker-pool processes; keeps strike filenames unique
+        self.timings = {}           # Per-pass seconds of the last strike
+        self._footprints = weakref.WeakKeyDictionary()
+        self.reclaim = {"calls": 0, "skipped": 0, "gc_runs": 0, "syncs": 0, "bytes_total": 0, "bytes_last": 0}
+        self.embed_cache = OrderedDict()    # prompt -> (prompt_embeds, pooled_projections, text_ids) on CPU
+        self._embed_lock = threading.Lock() # Heartbeats read the cache from another thread
+        self.brain_stats = {"hits": 0, "misses": 0, "speculative": 0, "speculative_hits": 0, "speculative_skipped": 0, "speculative_preempted": 0}
+        self._speculated = set()
+        self.strike_lock = threading.RLock()   # One strike or pre-encode on the Silicon at a time (re-entered by model swaps inside a strike)
+        self._preempt = threading.Event()      # Set while any strike waits on the lock: a speculative encode yields at its next layer
+        self._waiting = 0
+        self._waiting_lock = threading.Lock()
+
+    @contextmanager
+    def strike(self):
+        """Hold the strike lock. A speculative encode holding it is preempted instead of waited out."""
+        if not self.strike_lock.acquire(blocking=False):
+            with self._waiting_lock:
+                self._waiting += 1
+                self._preempt.set()
+            try:
+                self.strike_lock.acquire()
+            finally:
+                with self._waiting_lock:
+                    self._waiting -= 1
+                    if not self._waiting:
+                        self._preempt.clear()
+        try:
+            yield
+        finally:
+            self.strike_lock.release()
+
+    def get_state(self):
+        return {
+            "phase": self.phase,
+            "engine_resident": self.engine_resident,
+            "optics_resident": self.optics_resident,
+            "prompt_cached": self.cached_embeddings is not None,
+            "embed_cache": len(self.embed_cache),
+            "brain": dict(self.brain_stats),
+            "reclaim": dict(self.reclaim),
+        }
+
+    @profiler.annotate("carrier.clear_board")
+    def clear_board(self, hard=True, need_gb=None):
         """
-        Surgical Purge of Silicon segments.
-        Hard clear (gc.collect) is mandatory for VRAM handle release in Python.
+        Silicon Reclamation. Returns the bytes handed back to the device.
+        need_gb: Targeted mode. Nothing happens while the next phase fits the headroom
+                 (device free + allocator slack, capped by the governor ceiling); otherwise
+                 cached blocks are released first and a full GC runs only if that is not enough.
+        Without need_gb: hard=True is the full purge (GC + empty_cache + stream sync, used on
+        evacuation and model swaps); hard=False only releases allocator slack.
         Host Residency (Private Bytes) is preserved as long as weights are referenced.
         """
         import gc
-        gc.collect() 
-        if torch.cuda.is_available():
+        self.reclaim["calls"] += 1
+        if not torch.cuda.is_available():
+            if hard and need_gb is None:
+                gc.collect()
+                self.reclaim["gc_runs"] += 1
+            return 0
+
+        free_before = torch.cuda.mem_get_info()[0]
+        if need_gb is not None:
+            if self._headroom_gb() >= need_gb + RECLAIM_MARGIN_GB:
+                self.reclaim["skipped"] += 1
+                self.reclaim["bytes_last"] = 0
+                return 0
             torch.cuda.empty_cache()
-            if hard:
-                pass # ipc_collect removed for speed
-            torch.cuda.synchronize()
-        logger.info("[CARRIER] Board Cleared: Silicon Vacated (Host Residency Preserved).")
-
-    def _warm_manifold(self):
-        """
-        Forces Windows to keep model weights in the Working Set (RAM).
-        Pushes usage toward the target capacity requested.
-        """
-        import psutil
-        try:
-            # Touch a single parameter in each resident shard to prevent paging
-            _ = hybrid_loader.pipeline.text_encoder.model.norm.weight[0].item()
-            _ = hybrid_loader.pipeline.transformer.config.eps
-        except: pass
-        logger.info(f"[SYSTEM] Manifold Warmed: {psutil.virtual_memory().used / 1e9:.2f}GB System RAM Active.")
-
-
+            hard = self._headroom_gb() < need_gb + RECLAIM_MARGIN_GB  # Slack was not enough: real pressure
+        if hard:
+            gc.collect()
+            self.reclaim["gc_runs"] += 1
+        torch.cuda.empty_cache()
+        if hard:
+            torch.cuda.current_stream().synchronize()  # Frees issued on this stream must land before we measure
+            self.reclaim["syncs"] += 1
+
+        reclaimed = max(0, torch.cuda.mem_get_info()[0] - free_before)
+        self.reclaim["bytes_last"] = reclaimed
+        self.reclaim["bytes_total"] += reclaimed
+        mode = "Full Purge" if hard else "Slack Released"
+        logger.info(f"[CARRIER] Board Cleared ({mode}): {reclaimed / 1e9:.2f}GB Reclaimed (Host Residency Preserved).")
+        return reclaimed
+
+    def _headroom_gb(self):
+        """What the allocator can hand out without touching live tensors."""
+        free, _ = torch.cuda.mem_get_info()
+        reserved, allocated = torch.cuda.memory_reserved(), torch.cuda.memory_allocated()
+        device_room = (free + reserved - allocated) / (1024**3)
+        return min(device_room, governor.get_budget_gb() - allocated / (1024**3))
+
+    def _footprint_gb(self, module, scale=1.0):
+        """Weight bytes a component brings to Silicon (cached per module; scale for dtype upcasts)."""
+        size = self._footprints.get(module)
+        if size is None:
+            from core.loaders.component_pool import module_bytes
+            size = self._footprints[module] = module_bytes(module) / (1024**3)
+        return size * scale
+
+    def _migrate(self, component, device, dtype=None):
+        """Host <-> Silicon move of a pipeline component (a `migrate.*` range when profiling)."""
+        module = getattr(hybrid_loader.pipeline, component)
+        with profiler.span(f"migrate.{component}->{device}"):
+            return module.to(device, dtype=dtype) if dtype is not None else module.to(device)
+
+    @profiler.annotate("carrier.brain")
     def _phase_brain(self, prompt):
         """
         PHASE 0: THE BRAIN (TRANSIENT FP16 STRIKE)
+        Cache bookkeeping lives here; the Silicon work is _brain_strike (simulated by the stub).
         """
+        self.phase = "BRAIN"
         # Normalize prompt for comparison
         prompt = prompt.strip() if isinstance(prompt, str) else prompt
         
-        # Check if the prompt actually changed
-        if self.last_prompt == prompt and self.cached_embeddings is not None:
+        # Check the embedding cache (last strike or a speculative pre-encode)
+        cached = self._cached_embedding(prompt)
+        if cached is not None:
+            self.brain_stats["hits"] += 1
+            if prompt in self._speculated:
+                self.brain_stats["speculative_hits"] += 1
+                self._speculated.discard(prompt)
             logger.info(f"[BRAIN] Prompt Cache Hit. (prompt: '{prompt[:40]}...')")
-            return self.cached_embeddings
-        
+            self.last_prompt, self.cached_embeddings = prompt, cached
+            return cached
+        self.brain_stats["misses"] += 1
+
+        embeddings = self._brain_strike(prompt)
+        self._store_embedding(prompt, embeddings)
+        self.cached_embeddings = embeddings
+        self.last_prompt = prompt
+        return self.cached_embeddings
+
+    def _brain_strike(self, prompt):
+        """Text encoder on Silicon for one prompt; the engine and optics are vacated first."""
         # SOFT RESET: Clear internal spatial caches
         hybrid_loader.pipeline._current_ids = None
         
         # Resident Transition: Move to CPU and clear VRAM hard
-        if self.engine_resident: hybrid_loader.pipeline.transformer.to("cpu")
-        if self.optics_resident: hybrid_loader.pipeline.vae.to("cpu")
+        if self.engine_resident: self._migrate("transformer", "cpu")
+        if self.optics_resident: self._migrate("vae", "cpu")
         self.engine_resident = False
         self.optics_resident = False
-        self.clear_board(hard=True)
+        self.clear_board(need_gb=self._footprint_gb(hybrid_loader.pipeline.text_encoder))
 
         
         # --- SOVEREIGN BRAIN ALLOCATION ---
-        hybrid_loader.pipeline.text_encoder.to("cuda", dtype=torch.float16)
+        self._migrate("text_encoder", "cuda", dtype=torch.float16)
 
         
         # Sync Governor to Actual Residency
@@ -83,8 +206,18 @@ class ZerodragCarrier:
         governor.active_model = f"BRAIN_STRIKE (FLUX-4B)"
         logger.info(f"[VRAM] Brain Residency established at {curr_vram:.2f}GB")
         
+        embeddings = self._encode(prompt)
+
+        self._migrate("text_encoder", "cpu")
+        self.clear_board(need_gb=self._footprint_gb(hybrid_loader.pipeline.transformer))
+        logger.info("[BRAIN] Brain Signal Captured: Silicon Purged.")
+        return embeddings
+
+    @profiler.annotate("carrier.brain.encode")
+    def _encode(self, prompt, device="cuda"):
+        """Text encoder forward on wherever it currently lives; embeddings come back on CPU (fp16)."""
         with torch.no_grad():
-            res = hybrid_loader.pipeline.encode_prompt(prompt=prompt)
+            res = hybrid_loader.pipeline.encode_prompt(prompt=prompt, device=device)
             if len(res) == 3:
                 prompt_embeds, pooled_projections, text_ids = res
             else:
@@ -95,26 +228,110 @@ class ZerodragCarrier:
             if pooled_projections is not None:
                 pooled_projections = pooled_projections.to(device="cpu", dtype=torch.float16)
             text_ids = text_ids.to(device="cpu", dtype=torch.float16)
-
-        hybrid_loader.pipeline.text_encoder.to("cpu")
-        self.clear_board(hard=True)
-        
-        self.cached_embeddings = (prompt_embeds, pooled_projections, text_ids)
-        self.last_prompt = prompt
-        logger.info("[BRAIN] Brain Signal Captured: Silicon Purged.")
-        return self.cached_embeddings
-
-    def _phase_engine(self, prompt_embeds, pooled_projections, text_ids, height, width, steps, guidance, seed):
+        return prompt_embeds, pooled_projections, text_ids
+
+    def _cached_embedding(self, prompt):
+        with self._embed_lock:
+            cached = self.embed_cache.get(prompt)
+            if cached is not None:
+                self.embed_cache.move_to_end(prompt)
+            return cached
+
+    def _store_embedding(self, prompt, embeddings):
+        with self._embed_lock:
+            self.embed_cache[prompt] = embeddings
+            self.embed_cache.move_to_end(prompt)
+            while len(self.embed_cache) > EMBED_CACHE_SIZE:
+                evicted, _ = self.embed_cache.popitem(last=False)
+                self._speculated.discard(evicted)
+
+    def cached_prompts(self):
+        """Prompts with cached embeddings (LRU order); safe to call from other threads."""
+        with self._embed_lock:
+            return list(self.embed_cache)
+
+    def _yield_points(self, encoder):
+        """Pre-hooks on every layer of the encoder's layer stacks: raise Preempted once a strike is waiting."""
+        def check(module, args):
+            if self._preempt.is_set():
+                raise Preempted()
+        return [layer.register_forward_pre_hook(check)
+                for stack in encoder.modules() if isinstance(stack, torch.nn.ModuleList) for layer in stack]
+
+    def pre_encode(self, prompt):
+        """
+        Speculative Brain pass for a prompt the user is still typing. Never waits and never
+        evicts: skipped while a strike holds the Silicon or before the pipeline exists.
+        Runs on the GPU when the encoder fits the idle headroom alongside whatever is resident,
+        otherwise on the CPU copy of the encoder. The CPU pass takes seconds, so a strike that
+        arrives meanwhile preempts it between encoder layers (see strike()).
+        Returns "cached" | "encoded" | "busy" | "preempted" | "cold".
+        """
+        prompt = prompt.strip() if isinstance(prompt, str) else prompt
+        if not prompt:
+            return "cold"
+        if prompt in self.embed_cache:
+            return "cached"
+        if hybrid_loader.pipeline is None:
+            return "cold"
+        if self._preempt.is_set() or not self.strike_lock.acquire(blocking=False):
+            self.brain_stats["speculative_skipped"] += 1
+            return "busy"
+        try:
+            t = time.time()
+            self.phase = "BRAIN_SPECULATIVE"
+            try:
+                embeddings, where = self._speculative_encode(prompt)
+            except Preempted:
+                self.brain_stats["speculative_preempted"] += 1
+                logger.info(f"[BRAIN] Speculative Encode preempted by a strike after {time.time() - t:.2f}s.")
+                return "preempted"
+            finally:
+                self.phase = "IDLE"
+            self._store_embedding(prompt, embeddings)
+            self._speculated.add(prompt)
+            self.brain_stats["speculative"] += 1
+            logger.info(f"[BRAIN] Speculative Encode ({where}) {time.time() - t:.2f}s: '{prompt[:40]}...'")
+            return "encoded"
+        finally:
+            self.strike_lock.release()
+
+    def _speculative_encode(self, prompt):
+        """
+        One encode under the strike lock, yielding to a waiting strike between encoder layers
+        (raises Preempted). Returns (embeddings, "GPU" | "CPU").
+        """
+        pipe = hybrid_loader.pipeline
+        encoder = pipe.text_encoder
+        strike_ids = getattr(pipe, "_current_ids", None)  # The engine's text ids must survive a speculative encode
+        on_gpu = torch.cuda.is_available() and self._headroom_gb() >= self._footprint_gb(encoder) + RECLAIM_MARGIN_GB
+        if on_gpu:
+            self._migrate("text_encoder", "cuda", dtype=torch.float16)
+        hooks = self._yield_points(encoder)
+        try:
+            return self._encode(prompt, device="cuda" if on_gpu else "cpu"), "GPU" if on_gpu else "CPU"
+        finally:
+            for hook in hooks:
+                hook.remove()
+            pipe._current_ids = strike_ids
+            if on_gpu:
+                self._migrate("text_encoder", "cpu")
+                self.clear_board(hard=False)
+
+    @profiler.annotate("carrier.engine")
+    def _phase_engine(self, prompt_embeds, pooled_projections, text_ids, height, width, steps, guidance, seed, latents=None, sigmas=None, mu=None):
         """
         PHASE 1: THE ENGINE (SEQUENTIAL ALPHA STRIKE)
+        latents/sigmas/mu: Refine pass (start from noised latents on a truncated, re-shifted trajectory).
         """
+        self.phase = "ENGINE"
         if not self.engine_resident:
             logger.info("[CARRIER] Migrating Transformer (FP16) to Silicon...")
         if not self.engine_resident:
             # Resident Swap: Keep weights in RAM, but vacate VRAM for Transformer
-            hybrid_loader.pipeline.text_encoder.to("cpu")
-            self.clear_board(hard=True)
-            hybrid_loader.pipeline.transformer.to("cuda", dtype=torch.float16)
+            self._migrate("text_encoder", "cpu")
+            self.clear_board(need_gb=self._footprint_gb(hybrid_loader.pipeline.transformer))
+            self._migrate("transformer", "cuda", dtype=torch.float16)
             self.engine_resident = True
 
 
@@ -127,8 +344,9 @@ class ZerodragCarrier:
         # SAMPLING LOGIC ALIGNMENT: Calculate Mu Shift for Distilled Trajectory
         # image_seq_len is based on 16x16 patch size (vae_scale * 2)
         image_seq_len = (height // 16) * (width // 16)
-        from diffusers.pipelines.flux2.pipeline_flux2_klein import compute_empirical_mu
-        mu = compute_empirical_mu(image_seq_len=image_seq_len, num_steps=steps)
+        if mu is None:
+            from diffusers.pipelines.flux2.pipeline_flux2_klein import compute_empirical_mu
+            mu = compute_empirical_mu(image_seq_len=image_seq_len, num_steps=steps)
         logger.info(f"[ENGINE] Recalibrated Trajectory | Mu: {mu:.4f} | Sequence: {image_seq_len}")
 
         # Move embeddings to target device
@@ -138,9 +356,10 @@ class ZerodragCarrier:
         text_ids = text_ids.to("cuda", dtype=torch.float16)
 
         # Recalibrate scheduler for the distilled trajectory
-        hybrid_loader.pipeline.scheduler.set_timesteps(steps, device="cuda", mu=mu)
+        refine = {"latents": latents, "sigmas": sigmas, "mu": mu} if latents is not None else {}
+        hybrid_loader.pipeline.scheduler.set_timesteps(steps, device="cuda", mu=mu, **({"sigmas": sigmas} if sigmas is not None else {}))
 
-        with torch.no_grad():
+        with torch.no_grad(), profiler.steps(hybrid_loader.pipeline.transformer, "engine.step"):
             output = hybrid_loader.pipeline(
                 prompt_embeds=prompt_embeds,
                 height=height,
@@ -148,7 +367,8 @@ class ZerodragCarrier:
                 num_inference_steps=steps,
                 guidance_scale=guidance,
                 generator=generator,
-                output_type="latent"
+                output_type="latent",
+                **refine
             )
 
             latents = output.images
@@ -162,10 +382,52 @@ class ZerodragCarrier:
         logger.info(f"[PROFILE] Transformer Logic: {engine_time:.2f}s")
         return latents
 
+    @staticmethod
+    def hires_base(height, width, area=HIRES_BASE_AREA):
+        """Pass-1 size: `area` pixels at the target aspect, snapped to the 16px patch grid."""
+        scale = min(1.0, (area / float(height * width)) ** 0.5)
+        return max(16, int(height * scale) // 16 * 16), max(16, int(width * scale) // 16 * 16)
+
+    @profiler.annotate("carrier.hires_upscale")
+    def _phase_upscale(self, latents, height, width, steps, strength, seed, base_seq_len):
+        """
+        LATENT HANDOFF: Base-pass latents -> noised target-size latents + refine schedule.
+        Upscales in VAE latent space, re-enters the packed/BN-normalized space the transformer
+        samples in, and noises to the first sigma of the refine trajectory. The refine schedule
+        keeps the base pass's empirical mu: the target sequence length would shift the short
+        tail back toward pure noise and undo the composition.
+        """
+        import numpy as np
+        import torch.nn.functional as F
+        from diffusers.pipelines.flux2.pipeline_flux2_klein import compute_empirical_mu
+        pipe = hybrid_loader.pipeline
+
+        lat_h, lat_w = 2 * (height // 16), 2 * (width // 16)
+        up = F.interpolate(latents.float(), size=(lat_h, lat_w), mode="bicubic", align_corners=False)
+        up = pipe._patchify_latents(up)
+        bn_mean = pipe.vae.bn.running_mean.view(1, -1, 1, 1).to(up.device, up.dtype)
+        bn_std = torch.sqrt(pipe.vae.bn.running_var.view(1, -1, 1, 1) + pipe.vae.config.batch_norm_eps).to(up.device, up.dtype)
+        up = (up - bn_mean) / bn_std
+
+        # Tail of a (steps / strength)-step trajectory, shifted for the base sequence length
+        total = max(steps, int(round(steps / max(strength, 1e-3))))
+        sigmas = np.linspace(1.0, 1.0 / total, total)[-steps:].tolist()
+        mu = compute_empirical_mu(image_seq_len=base_seq_len, num_steps=total)
+        pipe.scheduler.set_timesteps(steps, device="cuda", sigmas=sigmas, mu=mu)
+        sigma0 = float(pipe.scheduler.sigmas[0])
+
+        generator = torch.Generator(device="cuda").manual_seed(seed + 1) if seed != -1 else None
+        noise = torch.randn(up.shape, generator=generator, device="cuda", dtype=torch.float32)
+        noised = (1.0 - sigma0) * up.to("cuda") + sigma0 * noise
+        logger.info(f"[HIRES] Latent Handoff -> {width}x{height} | Sigma0: {sigma0:.3f} | Mu: {mu:.4f} | Refine: {steps} step(s)")
+        return noised.to(torch.float16), sigmas, mu
+
+    @profiler.annotate("carrier.optics")
     def _phase_optics(self, latents, height, width):
         """
         PHASE 2: THE OPTICS (FP32 DECODE)
         """
+        self.phase = "OPTICS"
         if not self.optics_resident:
             # --- VRAM SAFETY CHECK ---
             free_mem = torch.cuda.mem_get_info()[0] / (1024**3) # Binary GB
@@ -177,13 +439,13 @@ class ZerodragCarrier:
             
             if self.engine_resident and (free_mem < 2.0 or remaining_budget < 0.5): 
                 logger.warning("[SYSTEM] VRAM Constraint (Free: {free_mem:.2f}GB). Offloading Engine...")
-                hybrid_loader.pipeline.transformer.to("cpu")
+                self._migrate("transformer", "cpu")
                 self.engine_resident = False
-                self.clear_board(hard=True)
+                self.clear_board(need_gb=self._footprint_gb(hybrid_loader.pipeline.vae, scale=2.0))  # FP16 host -> FP32 decode
 
 
             logger.info("[CARRIER] Mobilizing VAE for Decode (FP32 Precision)...")
-            hybrid_loader.pipeline.vae.to("cuda", dtype=torch.float32)
+            self._migrate("vae", "cuda", dtype=torch.float32)
             self.optics_resident = True
 
         optics_start = time.time()
@@ -193,40 +455,76 @@ class ZerodragCarrier:
             # No additional scaling is needed before VAE decoding
             optics_latents = latents.to("cuda", dtype=torch.float32)
             
-            image_voxels = hybrid_loader.pipeline.vae.decode(optics_latents, return_dict=False)[0]
+            with profiler.span("optics.vae_decode"):
+                image_voxels = hybrid_loader.pipeline.vae.decode(optics_latents, return_dict=False)[0]
 
-            image = hybrid_loader.pipeline.image_processor.postprocess(image_voxels, output_type="pil")[0]
+            with profiler.span("optics.postprocess"):
+                image = hybrid_loader.pipeline.image_processor.postprocess(image_voxels, output_type="pil")[0]
 
 
         optics_time = time.time() - optics_start
         logger.info(f"[PROFILE] VAE Logic: {optics_time:.2f}s")
         
         # RESIDENT OPTICS: Keep VAE in Private Bytes but offload Silicon
-        hybrid_loader.pipeline.vae.to("cpu")
+        self._migrate("vae", "cpu")
         self.optics_resident = False
-        self.clear_board(hard=True)
-        import psutil
-        logger.info(f"[SYSTEM] Residency Status: {psutil.virtual_memory().used / 1e9:.2f}GB RAM Active.")
+        self.clear_board(need_gb=0.0)  # Strike over: only enforce the governor ceiling
         return image
 
 
 
-    def dispatch(self, prompt, model_id="4b", height=1024, width=1024, steps=4, guidance=0.0, seed=-1, sampler="flow_euler", scheduler="linear"):
+    @profiler.annotate("carrier.evacuate")
+    def evacuate(self):
+        """
+        Soft Recovery: Vacate Silicon for every component but keep host residency.
+        Used on faults (incl. OOM) so the next strike pays a migration, not a cold reload.
+        """
+        if hybrid_loader.pipeline is None: return
+        try:
+            self._migrate("transformer", "cpu")
+            self._migrate("text_encoder", "cpu")
+            self._migrate("vae", "cpu")
+        except Exception as e:
+            logger.warning(f"[CARRIER] Evacuation incomplete: {e}")
+        self.engine_resident = False
+        self.optics_resident = False
+        latent_buffers.clear()
+        self.clear_board()
 
+    def invalidate_brain(self):
+        """Drop the prompt cache (embeddings belong to the text encoder that produced them)."""
+        self.last_prompt = None
+        self.cached_embeddings = None
+        with self._embed_lock:
+            self.embed_cache.clear()
+            self._speculated.clear()
+
+    def render(self, *args, **kwargs):
+        """Runs Brain -> Engine -> Optics and returns (PIL image, stats) without persisting. See _render."""
+        with self.strike(), profiler.capture() as capture:
+            image, stats = self._render(*args, **kwargs)
+            if capture is not None:
+                capture.update(stats)
+            return image, stats
+
+    def _render(self, prompt, model_id="4b", height=1024, width=1024, steps=4, guidance=0.0, seed=-1, sampler="flow_euler", scheduler="linear", target_height=None, target_width=None, hires="auto", hires_steps=HIRES_REFINE_STEPS, hires_strength=HIRES_STRENGTH):
         """
-        Executes the Blitz V2 Sequential Alpha Strike.
+        Runs Brain -> Engine -> Optics and returns (PIL image, stats) without persisting.
+        target_height/target_width: Final output size when the admission gate downscaled the render.
+        hires: True / False / "auto" (above HIRES_THRESHOLD). Two-pass path: base-resolution
+               generate, latent upscale, `hires_steps` refine steps at full size, one VAE decode.
         """
         start_time = time.time()
         # IDENTITY LOCK
-        # Robust Build: Ensure pipeline exists and matches target context
-        if hybrid_loader.pipeline is None:
-            hybrid_loader.build_franklin_pipeline(model_id=model_id, sampler_type=sampler, scheduler_type=scheduler)
+        # Robust Build: Ensure the resident pipeline matches target context (Model Manager swaps in place)
+        from model_manager import model_manager
+        model_manager.load_flux_model(model_size=model_id, sampler_type=sampler, scheduler_type=scheduler)
         
         # --- HOT-SWAP SCHEDULER ---
         hybrid_loader.hot_swap_scheduler(sampler_type=sampler, scheduler_type=scheduler)
         
-        # WARM MANIFOLD: Touch resident weights to prevent disk paging
-        self._warm_manifold()
+        # WORKING SET: Pin host copies that appeared since the last strike (no-op when already pinned)
+        working_set.ensure()
 
         # Log active context
 
@@ -241,40 +539,127 @@ class ZerodragCarrier:
         logger.info(f"[GOVERNOR] Ceiling: {governor.limit_percent}% ({budget:.2f}GB) | Load: {used:.2f}GB | Headroom: {budget - used:.2f}GB")
 
         governor.active_model = model_id # Sync with UI ID Protocol
+        if torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+
+        if hires == "auto":
+            hires = height * width > HIRES_THRESHOLD
+        base_h, base_w = self.hires_base(height, width) if hires else (height, width)
+        hires = hires and (base_h, base_w) != (height, width)
+        self.timings = {}
 
         try:
+            t = time.time()
             prompt_embeds, pooled_projections, text_ids = self._phase_brain(prompt)
-            latents = self._phase_engine(prompt_embeds, pooled_projections, text_ids, height, width, steps, guidance, seed)
+            self.timings["brain"] = time.time() - t
+
+            t = time.time()
+            latents = self._phase_engine(prompt_embeds, pooled_projections, text_ids, base_h, base_w, steps, guidance, seed)
+            self.timings["base"] = time.time() - t
+            if hires:
+                t = time.time()
+                noised, sigmas, mu = self._phase_upscale(
+                    latents, height, width, max(1, int(hires_steps)), float(hires_strength), seed,
+                    base_seq_len=(base_h // 16) * (base_w // 16)
+                )
+                del latents
+                latents = self._phase_engine(
+                    prompt_embeds, pooled_projections, text_ids, height, width, len(sigmas), guidance, seed,
+                    latents=noised, sigmas=sigmas, mu=mu
+                )
+                self.timings["refine"] = time.time() - t
+
+            t = time.time()
             image = self._phase_optics(latents, height, width)
-
-            output_dir = "outputs"
-            os.makedirs(output_dir, exist_ok=True)
-            
-            # UNIQUE STRIKE IDENTITY
-            timestamp = int(time.time())
-            filename = f"strike_{timestamp}.png"
-            output_path = os.path.join(output_dir, filename)
-            
-            # Save Primary and Mirror (latest.png)
-            image.save(output_path)
-            image.save(os.path.join(output_dir, "latest.png"))
-            
-            total_time = time.time() - start_time
-            logger.info(f"[SUCCESS] Total Sovereign Time: {total_time:.2f}s | Saved: {filename}")
-            return {"status": "success", "time": total_time, "path": f"/outputs/{filename}"}
-
+            self.timings["decode"] = time.time() - t
+            if hires:
+                logger.info(f"[PROFILE] Hi-Res Two-Pass: {base_w}x{base_h} base {self.timings['base']:.2f}s + refine {self.timings['refine']:.2f}s + decode {self.timings['decode']:.2f}s")
+
+            # DOWNSCALE-AND-UPSCALE: Restore the requested canvas size
+            if target_width and target_height and (target_width, target_height) != image.size:
+                from PIL import Image
+                image = image.resize((target_width, target_height), Image.LANCZOS)
+                logger.info(f"[OPTICS] Upscaled {width}x{height} -> {target_width}x{target_height}")
         except Exception as e:
             import traceback
+            self.phase = "FAULT"
             logger.error(f"Blitz Strike Fault: {e}")
             logger.error(traceback.format_exc())
             try:
-                hybrid_loader.pipeline.transformer.to("cpu")
-                hybrid_loader.pipeline.text_encoder.to("cpu")
-                hybrid_loader.pipeline.vae.to("cpu")
-                self.engine_resident = False
-                self.optics_resident = False
-                self.clear_board()
+                self.evacuate()
             except: pass
             raise e
 
-carrier = ZerodragCarrier()
+        self.phase = "IDLE"
+        peak_gb = self._peak_gb()
+        timings = {k: round(v, 3) for k, v in self.timings.items()}
+        return image, {"time": time.time() - start_time, "peak_gb": peak_gb, "passes": timings, "hires": bool(hires)}
+
+    def _peak_gb(self):
+        """Peak Silicon allocation of the strike that just ran."""
+        return torch.cuda.max_memory_allocated() / (1024**3) if torch.cuda.is_available() else 0.0
+
+    @staticmethod
+    def _save_atomic(image, path):
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # Per writer: concurrent strikes may target the same path
+        image.save(tmp, format="PNG")
+        os.replace(tmp, path)
+
+    def dispatch(self, prompt, model_id="4b", height=1024, width=1024, steps=4, guidance=0.0, seed=-1, sampler="flow_euler", scheduler="linear", target_height=None, target_width=None, hires="auto", hires_steps=HIRES_REFINE_STEPS, hires_strength=HIRES_STRENGTH, output_path=None):
+
+        """
+        Executes the Blitz V2 Sequential Alpha Strike.
+        target_height/target_width: Final output size when the admission gate downscaled the render.
+        output_path: Write the PNG here (atomically) instead of a new strike_*.png; latest.png
+                     and derivatives are left alone (batch items).
+        """
+        start_time = time.time()
+        image, stats = self.render(
+            prompt, model_id=model_id, height=height, width=width, steps=steps, guidance=guidance,
+            seed=seed, sampler=sampler, scheduler=scheduler, target_height=target_height, target_width=target_width,
+            hires=hires, hires_steps=hires_steps, hires_strength=hires_strength
+        )
+
+        self.phase = "PERSIST"
+        if output_path is not None:
+            self._save_atomic(image, output_path)
+            filename, url = os.path.basename(output_path), "/" + output_path.replace(os.sep, "/")
+        else:
+            output_dir = "outputs"
+            os.makedirs(output_dir, exist_ok=True)
+
+            # UNIQUE STRIKE IDENTITY: reserved with O_EXCL, so concurrent strikes in one second never share a name
+            timestamp = int(time.time())
+            stem = f"strike_{timestamp}_{self.worker_tag}" if self.worker_tag else f"strike_{timestamp}"
+            filename, n = f"{stem}.png", 1
+            while True:
+                output_path = os.path.join(output_dir, filename)
+                try:
+                    out = open(output_path, "xb")  # Write-once: /outputs serves strikes as immutable
+                    break
+                except FileExistsError:
+                    filename = f"{stem}-{n}.png"
+                    n += 1
+
+            # Save Primary and Mirror (latest.png, replaced atomically: readers never see a torn file)
+            try:
+                with out:
+                    image.save(out, format="PNG")
+            except BaseException:
+                os.remove(output_path)  # Release the reservation
+                raise
+            self._save_atomic(image, os.path.join(output_dir, "latest.png"))
+            derivatives.submit(output_path)
+            url = f"/outputs/{filename}"
+        
+        self.phase = "IDLE"
+        total_time = time.time() - start_time
+        logger.info(f"[SUCCESS] Total Sovereign Time: {total_time:.2f}s | Peak: {stats['peak_gb']:.2f}GB | Saved: {filename}")
+        return {"status": "success", "time": total_time, "peak_gb": stats["peak_gb"], "passes": stats["passes"], "hires": stats["hires"], "path": url}
+
+
+if BACKEND == "stub":
+    from core.stub_carrier import StubCarrier
+    carrier = StubCarrier()
+else:
+    carrier = ZerodragCarrier()
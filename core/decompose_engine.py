@@ -0,0 +1,233 @@
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from PIL import Image
+from core.startup import lazy_import
+
+torch = lazy_import("torch")
+F = lazy_import("torch.nn.functional")
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+NEGATIVE_PROMPT = " "
+MAX_CAPTIONS = 128
+RESOLUTION_MIN = 384        # Below this the layer split degrades faster than it speeds up
+RESOLUTION_MAX = 1024
+RESOLUTION_ALIGN = 32       # VAE stride (8) x patch size (2) x 2
+GUIDE_RADIUS = 8            # Guided-filter window (full-res pixels)
+GUIDE_EPS = 1e-3
+
+# --- SPEED PRESETS ---
+# true_cfg_scale > 1 runs two model passes per step; the fast tiers drop to one.
+# Resolution is the decode area's side (tokens scale with its square): the fast tiers
+# decompose small and rely on refine_alpha to bring the mattes back to source resolution.
+PRESETS = {
+    "quality":  {"steps": 50, "true_cfg_scale": 4.0, "resolution": 640,  "refine_alpha": False},
+    "balanced": {"steps": 30, "true_cfg_scale": 4.0, "resolution": 640,  "refine_alpha": True},
+    "fast":     {"steps": 20, "true_cfg_scale": 1.0, "resolution": 512,  "refine_alpha": True},
+    "draft":    {"steps": 10, "true_cfg_scale": 1.0, "resolution": 384,  "refine_alpha": True},
+}
+DEFAULT_PRESET = "quality"
+
+
+def _to_tensor(img):
+    """PIL -> float (1, C, H, W) in [0, 1]."""
+    data = torch.frombuffer(bytearray(img.tobytes()), dtype=torch.uint8)
+    c = len(img.getbands())
+    return data.view(img.height, img.width, c).permute(2, 0, 1).unsqueeze(0).float() / 255.0
+
+
+def _to_image(t, mode):
+    arr = (t.clamp(0, 1) * 255).round().to(torch.uint8).squeeze(0).permute(1, 2, 0).contiguous()
+    if mode == "L":
+        arr = arr[..., 0]
+    return Image.frombytes(mode, (arr.shape[1], arr.shape[0]), arr.numpy().tobytes())
+
+
+def _box(x, r):
+    """Mean over a (2r+1)^2 window via integral images: O(1) per pixel regardless of r."""
+    h, w = x.shape[-2:]
+    c = F.pad(x, (1, 0, 1, 0)).cumsum(-1).cumsum(-2)
+    ys, xs = torch.arange(h, device=x.device), torch.arange(w, device=x.device)
+    y0, y1 = (ys - r).clamp(0, h), (ys + r + 1).clamp(0, h)
+    x0, x1 = (xs - r).clamp(0, w), (xs + r + 1).clamp(0, w)
+    lo, hi = c.index_select(-2, y0), c.index_select(-2, y1)
+    total = hi.index_select(-1, x1) - lo.index_select(-1, x1) - hi.index_select(-1, x0) + lo.index_select(-1, x0)
+    area = (y1 - y0).view(-1, 1) * (x1 - x0).view(1, -1)
+    return total / area
+
+
+class AlphaGuide:
+    """Full-res guide statistics, computed once and shared by every layer of a decompose."""
+    def __init__(self, source, radius=GUIDE_RADIUS, eps=GUIDE_EPS):
+        self.radius, self.eps = radius, eps
+        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self.I = _to_tensor(source.convert("L")).to(self.device, torch.float64)
+        self.mean_I = _box(self.I, radius)
+        self.var_I = _box(self.I * self.I, radius) - self.mean_I * self.mean_I
+
+
+def guided_upsample_alpha(alpha, guide, radius=GUIDE_RADIUS, eps=GUIDE_EPS):
+    """
+    Edge-aware alpha upsampling (guided filter, grey guide).
+    alpha: low-res L image, guide: full-res source (or a prepared AlphaGuide). Returns a
+    full-res L image whose edges follow the source instead of the bicubic blur of the matte.
+    """
+    g = guide if isinstance(guide, AlphaGuide) else AlphaGuide(guide, radius, eps)
+    I, mean_I, r = g.I, g.mean_I, g.radius
+    p = F.interpolate(_to_tensor(alpha).to(g.device), size=I.shape[-2:], mode="bicubic", align_corners=False).clamp(0, 1).double()
+    mean_p = _box(p, r)
+    cov_Ip = _box(I * p, r) - mean_I * mean_p
+    a = cov_Ip / (g.var_I + g.eps)
+    b = mean_p - a * mean_I
+    q = _box(a, r) * I + _box(b, r)
+    return _to_image(q.float().cpu(), "L")
+
+
+class DecomposeEngine:
+    """
+    Qwen-Image-Layered Strike Controller.
+    Named speed presets, cached text conditioning (auto-caption and its embeddings per
+    source, negative prompt embeddings once per resident model) and a low-res-decompose /
+    full-res-alpha refinement path. Cached embeddings live in host RAM, keyed by the model
+    manager's residency key, and are dropped when that model is evicted.
+    """
+    def __init__(self):
+        self._captions = OrderedDict()  # image_key -> caption text (model-independent)
+        self._embeds = OrderedDict()    # (model_key, prompt) -> (embeds, mask) on CPU
+        self._lock = threading.Lock()
+        self.caption_hits = 0
+        self.embed_hits = 0
+
+    @staticmethod
+    def resolve(preset=DEFAULT_PRESET, steps=None, resolution=None, refine_alpha=None):
+        cfg = dict(PRESETS.get(preset, PRESETS[DEFAULT_PRESET]))
+        if steps: cfg["steps"] = max(1, int(steps))
+        if resolution:
+            snapped = int(round(int(resolution) / RESOLUTION_ALIGN)) * RESOLUTION_ALIGN
+            cfg["resolution"] = max(RESOLUTION_MIN, min(RESOLUTION_MAX, snapped))
+        if refine_alpha is not None: cfg["refine_alpha"] = bool(refine_alpha)
+        return cfg
+
+    # --- TEXT CONDITIONING CACHE ---
+    def _caption(self, pipe, image, image_key):
+        """Auto-caption once per source image; None if the pipeline captions internally only."""
+        captioner = getattr(pipe, "get_image_caption", None)
+        if captioner is None:
+            return None
+        with self._lock:
+            if image_key in self._captions:
+                self._captions.move_to_end(image_key)
+                self.caption_hits += 1
+                return self._captions[image_key]
+        try:
+            caption = captioner(image, use_en_prompt=True)
+        except Exception as e:
+            logger.warning(f"[DECOMPOSE] Caption bypass: {e}")
+            return None
+        with self._lock:
+            self._captions[image_key] = caption
+            while len(self._captions) > MAX_CAPTIONS:
+                self._captions.popitem(last=False)
+        return caption
+
+    def _prompt_embeds(self, pipe, model_key, prompt):
+        """(embeds, mask) for `prompt` on the pipeline's device; encoded once per resident model."""
+        encode = getattr(pipe, "encode_prompt", None)
+        if encode is None or model_key is None:
+            return None
+        key = (model_key, prompt)
+        with self._lock:
+            cached = self._embeds.get(key)
+            if cached is not None:
+                self._embeds.move_to_end(key)
+                self.embed_hits += 1
+        if cached is None:
+            try:
+                with torch.inference_mode():
+                    embeds, mask = encode(prompt=prompt)[:2]
+            except Exception as e:
+                logger.warning(f"[DECOMPOSE] Conditioning cache bypass: {e}")
+                return None
+            cached = (embeds.to("cpu"), None if mask is None else mask.to("cpu"))
+            with self._lock:
+                self._embeds[key] = cached
+                while len(self._embeds) > MAX_CAPTIONS + 1:
+                    self._embeds.popitem(last=False)
+        device = getattr(pipe, "_execution_device", "cuda")
+        embeds, mask = cached
+        return embeds.to(device), None if mask is None else mask.to(device)
+
+    def invalidate(self, model_key=None):
+        """Drop cached embeddings of an evicted model (all models when None). Captions are kept."""
+        with self._lock:
+            for key in [k for k in self._embeds if model_key is None or k[0] == model_key]:
+                del self._embeds[key]
+
+    # --- STRIKE ---
+    def run(self, pipe, image, layers, preset=DEFAULT_PRESET, steps=None, resolution=None, refine_alpha=None, image_key=None, model_key=None):
+        """Decompose `image` (RGBA PIL) into `layers` RGBA PIL images. `model_key` scopes the embedding cache."""
+        cfg = self.resolve(preset, steps, resolution, refine_alpha)
+        image_key = image_key or hashlib.sha256(image.tobytes()).hexdigest()[:16]
+        start = time.time()
+
+        inputs = {
+            "image": image,
+            "generator": torch.Generator(device="cuda").manual_seed(42),
+            "true_cfg_scale": cfg["true_cfg_scale"],
+            "num_inference_steps": cfg["steps"],
+            "num_images_per_prompt": 1,
+            "layers": layers,
+            "resolution": cfg["resolution"],
+            "cfg_normalize": True,
+        }
+        caption = self._caption(pipe, image, image_key)
+        if caption is not None:
+            positive = self._prompt_embeds(pipe, model_key, caption)
+            if positive is not None:
+                inputs["prompt_embeds"], inputs["prompt_embeds_mask"] = positive
+            else:
+                inputs["prompt"] = caption
+        else:
+            inputs["use_en_prompt"] = True  # Auto-caption in English
+        if cfg["true_cfg_scale"] > 1.0:
+            negative = self._prompt_embeds(pipe, model_key, NEGATIVE_PROMPT)
+            if negative is not None:
+                inputs["negative_prompt_embeds"], inputs["negative_prompt_embeds_mask"] = negative
+            else:
+                inputs["negative_prompt"] = NEGATIVE_PROMPT
+
+        with torch.inference_mode():
+            output = pipe(**inputs)
+        result = list(output.images[0])
+        model_time = time.time() - start
+
+        if cfg["refine_alpha"] and result and max(image.size) > cfg["resolution"]:
+            guide = AlphaGuide(image)
+            result = [self.refine_layer(layer, image, guide) for layer in result]
+        logger.info(f"[PROFILE] Decompose ({preset.upper()}): {model_time:.2f}s model, {time.time() - start - model_time:.2f}s refine | {cfg}")
+        return result
+
+    @staticmethod
+    def refine_layer(layer, source, guide=None):
+        """Upsample a low-res RGBA layer to source size; alpha follows source edges."""
+        rgba = layer.convert("RGBA")
+        rgb = rgba.convert("RGB").resize(source.size, Image.LANCZOS)
+        alpha = guided_upsample_alpha(rgba.getchannel("A"), guide or source)
+        rgb.putalpha(alpha)
+        return rgb
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "captions": len(self._captions),
+                "caption_hits": self.caption_hits,
+                "embeddings": len(self._embeds),
+                "embedding_hits": self.embed_hits,
+                "negative_cached": any(k[1] == NEGATIVE_PROMPT for k in self._embeds),
+            }
+
+
+decompose_engine = DecomposeEngine()
@@ -0,0 +1,188 @@
+import os
+import json
+import math
+import time
+import shutil
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+OUTPUT_DIR = "outputs"
+PYRAMID_DIR = "_pyramid"        # outputs/_pyramid/<source path without extension>/
+META_FILE = "meta.json"         # Written last: its presence marks a complete pyramid
+TILE_SIZE = 256
+THUMB_SIZE = 256
+WEBP_QUALITY = 82
+WEBP_METHOD = 4                 # 0 (fast) .. 6 (small); 4 keeps a 4K pyramid around a second
+BUILD_WORKERS = 1               # Background work: never compete with the encode pool for cores
+SOURCE_TYPES = {".png", ".jpg", ".jpeg", ".webp"}
+
+
+def pyramid_key(url):
+    """
+    /outputs URL (or path under outputs/) -> pyramid key, e.g. "/outputs/abc/layer_0.png" -> "abc/layer_0.png".
+    Returns None for anything outside outputs/, mutable mirrors (latest.*) and non-images.
+    """
+    rel = url.split("?", 1)[0].replace("\\", "/")
+    if rel.startswith("/outputs/"):
+        rel = rel[len("/outputs/"):]
+    elif rel.startswith(OUTPUT_DIR + "/"):
+        rel = rel[len(OUTPUT_DIR) + 1:]
+    rel = rel.strip("/")
+    stem, ext = os.path.splitext(rel)
+    parts = stem.split("/")
+    if not stem or ext.lower() not in SOURCE_TYPES or ".." in parts or parts[0] == PYRAMID_DIR:
+        return None
+    if os.path.basename(stem).startswith("latest"):
+        return None
+    return stem + ext.lower()
+
+
+def levels_for(width, height, tile=TILE_SIZE):
+    """Level 0 fits in one tile; the top level is full resolution."""
+    return 1 + max(0, math.ceil(math.log2(max(width, height) / tile)))
+
+
+class DerivativeBuilder:
+    """
+    Output Derivative Stage.
+    Every result / decompose layer gets a thumbnail and a WebP tile pyramid (deep-zoom layout,
+    TILE_SIZE tiles, each level half the previous) so the viewport fetches only the visible
+    tiles at its current zoom. Builds run on a background thread; a request for a pyramid that
+    is still queued waits for that one build instead of starting a second.
+    """
+    def __init__(self, root=OUTPUT_DIR):
+        self.root = root
+        self._pool = ThreadPoolExecutor(max_workers=BUILD_WORKERS, thread_name_prefix="derivatives")
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.stats = {"built": 0, "failed": 0, "tiles": 0, "seconds": 0.0, "bytes_in": 0, "bytes_out": 0}
+
+    def source_path(self, key):
+        return os.path.join(self.root, *key.split("/"))
+
+    def pyramid_dir(self, key):
+        return os.path.join(self.root, PYRAMID_DIR, *os.path.splitext(key)[0].split("/"))
+
+    def tile_path(self, key, level, col, row):
+        return os.path.join(self.pyramid_dir(key), str(level), f"{col}_{row}.webp")
+
+    def thumb_path(self, key):
+        return os.path.join(self.pyramid_dir(key), "thumb.webp")
+
+    def meta(self, key):
+        try:
+            with open(os.path.join(self.pyramid_dir(key), META_FILE), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    # --- SCHEDULING ---
+    def submit(self, url):
+        """Queue a pyramid build for a freshly written output. Returns the future (None if not eligible)."""
+        key = pyramid_key(url)
+        if key is None:
+            return None
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is None:
+                fut = self._pool.submit(self._build_guarded, key)
+                self._pending[key] = fut
+        return fut
+
+    def ensure(self, key):
+        """Blocking: the pyramid meta for `key`, building (or joining the queued build) if needed."""
+        meta = self.meta(key)
+        if meta is not None:
+            return meta
+        if not os.path.exists(self.source_path(key)):
+            return None
+        with self._lock:
+            fut = self._pending.get(key)
+            if fut is None:
+                fut = self._pool.submit(self._build_guarded, key)
+                self._pending[key] = fut
+        return fut.result()
+
+    def _build_guarded(self, key):
+        try:
+            return self.meta(key) or self.build(key)
+        except Exception as e:
+            self.stats["failed"] += 1
+            logger.error(f"[DERIVATIVES] {key} Fault: {e}")
+            return None
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    # --- BUILD ---
+    def build(self, key):
+        from PIL import Image
+        start = time.time()
+        src = self.source_path(key)
+        out = self.pyramid_dir(key)
+        tmp = out + ".tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp, exist_ok=True)
+
+        with Image.open(src) as im:
+            im.load()
+            image = im.convert("RGBA" if im.mode in ("RGBA", "LA", "P") or "transparency" in im.info else "RGB")
+        width, height = image.size
+        levels = levels_for(width, height)
+        tiles, written = 0, 0
+
+        thumb = image.copy()
+        thumb.thumbnail((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
+        thumb.save(os.path.join(tmp, "thumb.webp"), "WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+        written += os.path.getsize(os.path.join(tmp, "thumb.webp"))
+
+        # Top level is the source; each lower level halves the one above it
+        level_img = image
+        for level in range(levels - 1, -1, -1):
+            if level < levels - 1:
+                level_img = level_img.resize((max(1, math.ceil(level_img.width / 2)), max(1, math.ceil(level_img.height / 2))), Image.LANCZOS)
+            level_dir = os.path.join(tmp, str(level))
+            os.makedirs(level_dir, exist_ok=True)
+            for row in range(math.ceil(level_img.height / TILE_SIZE)):
+                for col in range(math.ceil(level_img.width / TILE_SIZE)):
+                    box = (col * TILE_SIZE, row * TILE_SIZE,
+                           min(level_img.width, (col + 1) * TILE_SIZE), min(level_img.height, (row + 1) * TILE_SIZE))
+                    path = os.path.join(level_dir, f"{col}_{row}.webp")
+                    level_img.crop(box).save(path, "WEBP", quality=WEBP_QUALITY, method=WEBP_METHOD)
+                    written += os.path.getsize(path)
+                    tiles += 1
+
+        meta = {"width": width, "height": height, "tile": TILE_SIZE, "levels": levels, "format": "webp", "alpha": image.mode == "RGBA"}
+        with open(os.path.join(tmp, META_FILE), "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        shutil.rmtree(out, ignore_errors=True)
+        os.makedirs(os.path.dirname(out), exist_ok=True)
+        os.replace(tmp, out)
+
+        elapsed = time.time() - start
+        self.stats["built"] += 1
+        self.stats["tiles"] += tiles
+        self.stats["seconds"] += elapsed
+        self.stats["bytes_in"] += os.path.getsize(src)
+        self.stats["bytes_out"] += written
+        logger.info(f"[DERIVATIVES] {key}: {width}x{height} -> {levels} levels / {tiles} tiles ({written / 1e6:.1f}MB) in {elapsed:.2f}s")
+        return meta
+
+    def get_state(self):
+        with self._lock:
+            queued = len(self._pending)
+        built = self.stats["built"]
+        return {
+            "queued": queued,
+            "built": built,
+            "failed": self.stats["failed"],
+            "tiles": self.stats["tiles"],
+            "avg_build_s": round(self.stats["seconds"] / built, 2) if built else None,
+            "tile_bytes_ratio": round(self.stats["bytes_out"] / self.stats["bytes_in"], 2) if self.stats["bytes_in"] else None,
+        }
+
+
+derivatives = DerivativeBuilder()
@@ -0,0 +1,129 @@
+import logging
+from PIL import Image, ImageFilter
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+MASK_THRESHOLD = 8          # Mask values above this count as "edit"
+DEFAULT_PADDING = 32        # Context pixels around the mask bbox
+DEFAULT_FEATHER = 8         # Blend radius at the seam
+FULL_FRAME_RATIO = 0.6      # Above this bbox/canvas area, cropping buys nothing
+LATENT_ALIGN = 16
+
+# Efficient resolution buckets (~0.25MP .. ~1MP, 16-aligned, common aspect ratios)
+RESOLUTION_BUCKETS = [
+    (512, 512), (576, 448), (448, 576), (640, 384), (384, 640),
+    (768, 768), (896, 640), (640, 896), (1024, 576), (576, 1024),
+    (1024, 1024), (1152, 896), (896, 1152), (1280, 768), (768, 1280),
+]
+
+
+def mask_bbox(mask, padding=DEFAULT_PADDING, threshold=MASK_THRESHOLD):
+    """Padded (left, top, right, bottom) box around the edited region, clamped to the canvas. None if empty."""
+    box = mask.point(lambda v: 255 if v > threshold else 0).getbbox()
+    if box is None:
+        return None
+    l, t, r, b = box
+    w, h = mask.size
+    return max(0, l - padding), max(0, t - padding), min(w, r + padding), min(h, b + padding)
+
+
+def pick_bucket(width, height):
+    """Smallest bucket with the closest aspect ratio that does not downsample the crop (largest if none fits)."""
+    aspect = width / height
+    ranked = sorted(RESOLUTION_BUCKETS, key=lambda b: (abs(b[0] / b[1] - aspect), b[0] * b[1]))
+    best_aspect = abs(ranked[0][0] / ranked[0][1] - aspect)
+    same_shape = [b for b in ranked if abs(abs(b[0] / b[1] - aspect) - best_aspect) < 1e-6]
+    for b in sorted(same_shape, key=lambda b: b[0] * b[1]):
+        if b[0] >= width and b[1] >= height:
+            return b
+    return max(same_shape, key=lambda b: b[0] * b[1])
+
+
+def match_canvas(mask, size):
+    """Mask at canvas size: bbox math and the pipeline both assume mask pixels line up with the image."""
+    if mask.size == tuple(size):
+        return mask
+    logger.warning(f"[INPAINT] Mask {mask.size[0]}x{mask.size[1]} != canvas {size[0]}x{size[1]}; resizing mask.")
+    return mask.resize(tuple(size), Image.BILINEAR)
+
+
+def _expand_to_aspect(box, bucket, canvas):
+    """
+    Grow the box towards the bucket aspect, shifted inward to stay inside the canvas.
+    Near an edge the canvas may be too small for the full aspect; the remainder is padded
+    (see CropPlan.inner), never stretched.
+    """
+    l, t, r, b = box
+    cw, ch = canvas
+    target = bucket[0] / bucket[1]
+    w, h = r - l, b - t
+    if w / h < target:
+        w = min(cw, int(round(h * target)))
+    else:
+        h = min(ch, int(round(w / target)))
+    cx, cy = (l + r) / 2, (t + b) / 2
+    l = int(max(0, min(cw - w, cx - w / 2)))
+    t = int(max(0, min(ch - h, cy - h / 2)))
+    return l, t, l + w, t + h
+
+
+class CropPlan:
+    """Where the crop came from and what size the pipeline sees."""
+    def __init__(self, box, bucket, canvas):
+        self.box = box
+        self.bucket = bucket
+        self.canvas = canvas
+
+    @property
+    def size(self):
+        return self.box[2] - self.box[0], self.box[3] - self.box[1]
+
+    @property
+    def inner(self):
+        """(x, y, w, h) of the crop inside the bucket: aspect-preserving fit, centred, rest is padding."""
+        w, h = self.size
+        scale = min(self.bucket[0] / w, self.bucket[1] / h)
+        iw, ih = min(self.bucket[0], round(w * scale)), min(self.bucket[1], round(h * scale))
+        return (self.bucket[0] - iw) // 2, (self.bucket[1] - ih) // 2, iw, ih
+
+    def as_dict(self):
+        return {"box": list(self.box), "bucket": list(self.bucket), "canvas": list(self.canvas), "inner": list(self.inner)}
+
+
+def plan_crop(mask, padding=DEFAULT_PADDING):
+    """CropPlan for a canvas-sized mask (see match_canvas), or None when the edit spans most of the canvas (run full-frame)."""
+    box = mask_bbox(mask, padding)
+    if box is None:
+        return None
+    canvas = mask.size
+    area = (box[2] - box[0]) * (box[3] - box[1])
+    if area > FULL_FRAME_RATIO * canvas[0] * canvas[1]:
+        return None
+    bucket = pick_bucket(box[2] - box[0], box[3] - box[1])
+    box = _expand_to_aspect(box, bucket, canvas)
+    return CropPlan(box, bucket, canvas)
+
+
+def crop_inputs(image, mask, plan):
+    """Cropped (image, mask) pair at the bucket size; scaled uniformly, padding outside `plan.inner` is left unmasked."""
+    if mask.size != image.size:
+        raise ValueError(f"Mask {mask.size} does not match image {image.size}")
+    x, y, w, h = plan.inner
+    img = Image.new(image.mode, plan.bucket, (127,) * len(image.getbands()))
+    img.paste(image.crop(plan.box).resize((w, h), Image.LANCZOS), (x, y))
+    msk = Image.new(mask.mode, plan.bucket, 0)
+    msk.paste(mask.crop(plan.box).resize((w, h), Image.BILINEAR), (x, y))
+    return img, msk
+
+
+def composite(original, result, mask, plan, feather=DEFAULT_FEATHER):
+    """Paste the pipeline's crop back into the full canvas through a feathered mask."""
+    x, y, w, h = plan.inner
+    patch = result.resize(plan.bucket, Image.LANCZOS).crop((x, y, x + w, y + h)).resize(plan.size, Image.LANCZOS)
+    alpha = mask.crop(plan.box).convert("L")
+    if feather > 0:
+        alpha = alpha.filter(ImageFilter.MaxFilter(feather * 2 + 1)).filter(ImageFilter.GaussianBlur(feather))
+    out = original.convert("RGB").copy()
+    out.paste(patch.convert("RGB"), plan.box[:2], alpha)
+    logger.info(f"[INPAINT] Crop Composite | Box: {plan.box} | Bucket: {plan.bucket[0]}x{plan.bucket[1]}")
+    return out
@@ -0,0 +1,135 @@
+import gc
+import os
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+def module_bytes(obj, seen=None):
+    """Host bytes of a torch module's parameters/buffers (0 for tokenizers etc.)."""
+    import torch
+    if not isinstance(obj, torch.nn.Module):
+        return 0
+    seen = set() if seen is None else seen
+    total = 0
+    for t in list(obj.parameters()) + list(obj.buffers()):
+        key = t.untyped_storage().data_ptr()
+        if key in seen:
+            continue
+        seen.add(key)
+        total += t.untyped_storage().nbytes()
+    return total
+
+
+def disk_bytes(path):
+    """On-disk weight bytes under `path` (a file, or every .safetensors/.bin below a directory)."""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(root, f)) for f in files if f.endswith((".safetensors", ".bin")))
+    return total
+
+
+class PooledComponent:
+    def __init__(self, key, module):
+        self.key = key
+        self.module = module
+        self.owners = set()
+        self.bytes = module_bytes(module)
+
+
+class ComponentPool:
+    """
+    Shared-Weight Component Pool.
+    Components are keyed by (kind, path, dtype, quantization) and handed out by reference,
+    so every pipeline built over the same shard shares one host copy. Entries are
+    reference-counted by owner (pipeline key) and dropped when the last owner releases.
+    Factories run outside the pool lock (per-key load lock), so state stays readable mid-build.
+    """
+    def __init__(self):
+        self._entries = {}
+        self._loading = {}              # key -> Lock held while its factory runs
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(kind, path, dtype=None, quantization=None):
+        return (kind, os.path.normpath(path), str(dtype) if dtype is not None else None, quantization)
+
+    def contains(self, kind, path, dtype=None, quantization=None):
+        with self._lock:
+            return self.key(kind, path, dtype, quantization) in self._entries
+
+    def acquire(self, owner, kind, path, factory, dtype=None, quantization=None):
+        """Shared component for `owner`; `factory()` runs only on a pool miss."""
+        k = self.key(kind, path, dtype, quantization)
+        with self._lock:
+            entry = self._share(k, owner, kind)
+            if entry is not None:
+                return entry.module
+            loading = self._loading.setdefault(k, threading.Lock())
+        with loading:
+            with self._lock:
+                entry = self._share(k, owner, kind)  # Loaded by a concurrent build while we waited
+                if entry is not None:
+                    return entry.module
+            try:
+                entry = PooledComponent(k, factory())
+            except BaseException:
+                with self._lock:
+                    self._loading.pop(k, None)
+                raise
+            with self._lock:
+                self.misses += 1
+                self._entries[k] = entry
+                entry.owners.add(owner)
+                self._loading.pop(k, None)
+        logger.info(f"[POOL] Loaded {kind} ({entry.bytes / 1e9:.2f}GB) <- {path}")
+        return entry.module
+
+    def _share(self, k, owner, kind):
+        entry = self._entries.get(k)
+        if entry is not None:
+            self.hits += 1
+            entry.owners.add(owner)
+            logger.info(f"[POOL] Shared {kind} -> {owner}")
+        return entry
+
+    def release(self, owner):
+        """Drop `owner`'s references; components nobody owns leave the pool."""
+        with self._lock:
+            freed = 0
+            for k in list(self._entries):
+                entry = self._entries[k]
+                entry.owners.discard(owner)
+                if not entry.owners:
+                    freed += entry.bytes
+                    del self._entries[k]
+        if freed:
+            gc.collect()
+            logger.info(f"[POOL] Released {owner}: {freed / 1e9:.2f}GB freed.")
+        return freed
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(e.bytes for e in self._entries.values())
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "components": len(self._entries),
+                "pool_gb": round(self.total_bytes() / 1e9, 2),
+                "shared": sum(1 for e in self._entries.values() if len(e.owners) > 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": [
+                    {"kind": e.key[0], "path": e.key[1], "dtype": e.key[2], "gb": round(e.bytes / 1e9, 2), "owners": sorted(e.owners)}
+                    for e in self._entries.values()
+                ],
+            }
+
+
+component_pool = ComponentPool()
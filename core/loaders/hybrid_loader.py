@@ -1,19 +1,19 @@
 import os
-import torch
-import torch.nn as nn
-from transformers import Qwen2Config, AutoModel, AutoTokenizer
-from diffusers.pipelines.flux2.pipeline_flux2_klein import Flux2KleinPipeline
-from diffusers import (
-    Flux2Transformer2DModel, 
-    AutoencoderKLFlux2, 
-    FlowMatchEulerDiscreteScheduler
-)
-from diffusers.pipelines.flux2.pipeline_flux2_klein import Qwen3ForCausalLM
+import inspect
 import logging
 import warnings
+import threading
 from core.vram import governor
+from core.loaders.component_pool import component_pool, disk_bytes
+from core.buckets import latent_buffers
+from core.source_cache import source_cache
+from core.startup import lazy_import, startup_profile
+from core.loaders.stub_loader import BACKEND, StubLoader
 import psutil
 
+# torch / transformers / diffusers load on the first pipeline build, not at server import
+torch = lazy_import("torch")
+
 # --- SHUT UP WARNINGS ---
 warnings.filterwarnings("ignore", category=FutureWarning, module="diffusers")
 warnings.filterwarnings("ignore", message=".*torch_dtype.*") 
@@ -61,6 +61,7 @@ def patch_qwen_attention():
     logger.info("[SYSTEM] SIGNAL RESTORED: Qwen Q/K Norms Patched.")
 
 def patch_flux_nuclear_stability():
+    from diffusers import Flux2Transformer2DModel
     # 1. Device Alignment Guard (CPU->CUDA Teleport)
     if not getattr(Flux2Transformer2DModel, "_sovereign_device_patched", False):
         _orig_trans_forward = Flux2Transformer2DModel.forward
@@ -101,6 +102,7 @@ def patch_flux_pipeline():
             
             # Use our custom guidance logic: pass gs to the transformer via a patch
             self._sovereign_gs = gs
+            self.transformer._sovereign_gs = gs
 
             # OPTIMIZATION: Clear internal IDs on fresh strike
             if k.get("prompt_embeds") is None:
@@ -110,7 +112,19 @@ def patch_flux_pipeline():
             k.pop("pooled_projections", None)
             k.pop("text_ids", None)
             if k.get("prompt_embeds") is not None: k["prompt"] = None
-            return _orig_call(self, *a, **k)
+
+            # TRAJECTORY OVERRIDE: the pipeline derives mu from its own sequence length;
+            # hi-res refine passes pin the base pass's shift instead
+            mu = k.pop("mu", None)
+            if mu is None:
+                return _orig_call(self, *a, **k)
+            sch = self.scheduler
+            _orig_set = sch.set_timesteps
+            sch.set_timesteps = lambda *sa, **sk: _orig_set(*sa, **dict(sk, mu=mu))
+            try:
+                return _orig_call(self, *a, **k)
+            finally:
+                del sch.set_timesteps
 
         
         _orig_encode = Flux2KleinPipeline.encode_prompt
@@ -125,55 +139,110 @@ def patch_flux_pipeline():
 
             if isinstance(res, tuple):
                 e, ids = res[0], res[1]
-                td = len(self.transformer.config.axes_dims_rope)
-                if ids.shape[-1] != td:
-                    n_ids = torch.zeros((*ids.shape[:-1], td), device=ids.device, dtype=ids.dtype); n_ids[..., :ids.shape[-1]] = ids; ids = n_ids
+                ids = latent_buffers.pad_text_ids(ids, len(self.transformer.config.axes_dims_rope))
                 # Cache for optimization
                 self._current_ids = ids
                 return e, ids
             return res
             
-        _orig_latents = Flux2KleinPipeline.prepare_latents
-        def robust_latents(self, *a, **k):
-            k["device"], k["dtype"] = torch.device("cuda"), torch.float16
-            res = _orig_latents(self, *a, **k)
-            l, ids = res[0], res[1]
-            td = len(self.transformer.config.axes_dims_rope)
-            if ids.shape[-1] != td:
-                n_ids = torch.zeros((*ids.shape[:-1], td), device=ids.device, dtype=ids.dtype); n_ids[..., :ids.shape[-1]] = ids; ids = n_ids
-            return l, ids
+        def robust_latents(self, batch_size, num_latents_channels, height, width, dtype=None, device=None, generator=None, latents=None):
+            # BUCKETED BUFFERS: noise is drawn in place and img ids are built once per shape
+            return latent_buffers.prepare_latents(
+                self, batch_size, num_latents_channels, height, width,
+                generator=generator, latents=latents, device="cuda", dtype=torch.float16
+            )
             
 
         Flux2KleinPipeline.__call__, Flux2KleinPipeline.encode_prompt, Flux2KleinPipeline.prepare_latents = sovereign_call, robust_encode, robust_latents
+
+        # SOURCE LATENTS: reference images reach the VAE through prepare_image_latents -> _encode_vae_image(image=pixels).
+        # Only hook that exact shape; any other pipeline keeps encoding PIL inputs itself.
+        encode = getattr(Flux2KleinPipeline, "_encode_vae_image", None)
+        if encode is not None and hasattr(Flux2KleinPipeline, "prepare_image_latents") and "image" in inspect.signature(encode).parameters:
+            Flux2KleinPipeline._encode_vae_image = source_cache.cached_encoder(encode)
+        else:
+            logger.warning("[LOADER] Flux2KleinPipeline has no image-latent hook; img2img re-encodes its source every strike.")
         Flux2KleinPipeline._sovereign_patched_call = True
 
     # NOTE: Custom RMSNorm patch was removed. The official _get_qwen3_prompt_embeds
     # stacks raw hidden states without normalization. Our RMSNorm patch was causing noise.
 
 class HybridLoader:
-    def __init__(self): self.pipeline, self.base_path = None, "models/flux-klein"
-    def build_franklin_pipeline(self, model_id="4b", precision="fp16", sampler_type="flow_euler", scheduler_type="linear"):
+    def __init__(self):
+        self.pipeline, self.base_path, self.model_id = None, "models/flux-klein", None
+        self._patched = False
+        self._patch_lock = threading.Lock()
+
+    def ensure_patched(self):
+        """Imports the ML stack and applies the Sovereign patches once (deferred from import time)."""
+        if self._patched: return
+        with self._patch_lock:
+            if self._patched: return
+            with startup_profile.span("ml_stack_patch"):
+                patch_qwen_attention()
+                patch_flux_nuclear_stability()
+                patch_flux_pipeline()
+            self._patched = True
+
+    def component_paths(self, model_id="4b"):
+        """Weight-bearing pooled components of a FLUX variant: kind -> path (pool key)."""
+        variant = "klein-4b" if "4b" in model_id.lower() else "klein-9b"
+        return {
+            "transformer": os.path.join(self.base_path, "transformer", variant, "safetensors", "diffusion_pytorch_model-large.safetensors"),
+            "text_encoder": os.path.join(self.base_path, "text_encoder"),
+            "vae": os.path.join(self.base_path, "vae"),
+        }
+
+    def estimate_bytes(self, model_id="4b"):
+        """Host bytes a build would add: on-disk size of the components not already pooled (upper bound at fp16)."""
+        return sum(
+            disk_bytes(path) for kind, path in self.component_paths(model_id).items()
+            if not component_pool.contains(kind, path, torch.float16) and os.path.exists(path)
+        )
+
+    def build_franklin_pipeline(self, model_id="4b", precision="fp16", sampler_type="flow_euler", scheduler_type="linear", owner=None):
+        """
+        Components come from the shared pool keyed by (path, dtype, quantization), so sibling
+        pipelines (4B/9B, edit variants) hold one host copy of each common shard.
+        owner: Pool owner tag for reference counting (defaults to flux-<size>).
+        Returns the pipeline without activating it: the Model Manager publishes it as
+        `self.pipeline` under the strike lock, so a build can run while another strike is live.
+        """
+        self.ensure_patched()
+        from transformers import AutoTokenizer
+        from diffusers import Flux2Transformer2DModel, AutoencoderKLFlux2
+        from diffusers.pipelines.flux2.pipeline_flux2_klein import Flux2KleinPipeline
         variant, target_dtype = ("klein-4b" if "4b" in model_id.lower() else "klein-9b"), torch.float16
         logger.info(f"[ENGINE] Initiating Hardware Override (TURING) | Target: {model_id.upper()} | Sampler: {sampler_type.upper()} | Scheduler: {scheduler_type.upper()}")
         try:
             # Load Transformer using from_single_file for proper BFL→diffusers weight conversion
             # CRITICAL: from_pretrained loads zeros due to weight naming mismatch
-            trans_base = os.path.join(self.base_path, "transformer", variant, "safetensors")
-            trans_weights = os.path.join(trans_base, "diffusion_pytorch_model-large.safetensors")
-            trans_config = os.path.join(trans_base, "config.json")
-            transformer = Flux2Transformer2DModel.from_single_file(trans_weights, config=trans_config, torch_dtype=target_dtype, low_cpu_mem_usage=True).to("cpu")
+            trans_weights = self.component_paths(model_id)["transformer"]
+            trans_config = os.path.join(os.path.dirname(trans_weights), "config.json")
+            owner = owner or f"flux-{'4b' if '4b' in variant else '9b'}"
+            transformer = component_pool.acquire(
+                owner, "transformer", trans_weights, dtype=target_dtype,
+                factory=lambda: Flux2Transformer2DModel.from_single_file(trans_weights, config=trans_config, torch_dtype=target_dtype, low_cpu_mem_usage=True).to("cpu")
+            )
             import gc; gc.collect()
             torch.cuda.empty_cache()
             enc_path = os.path.join(self.base_path, "text_encoder")
             
             # Use native Qwen3ForCausalLM for noise suppression
             from transformers.models.qwen3.modeling_qwen3 import Qwen3ForCausalLM
-            text_encoder = Qwen3ForCausalLM.from_pretrained(enc_path, torch_dtype=torch.float16, low_cpu_mem_usage=True).to("cpu")
+            text_encoder = component_pool.acquire(
+                owner, "text_encoder", enc_path, dtype=torch.float16,
+                factory=lambda: Qwen3ForCausalLM.from_pretrained(enc_path, torch_dtype=torch.float16, low_cpu_mem_usage=True).to("cpu")
+            )
             
             # --- TOKENIZER & VAE (FP16 for all components) ---
             tok_path = os.path.join(self.base_path, "tokenizer")
-            tokenizer = AutoTokenizer.from_pretrained(tok_path)
-            vae = AutoencoderKLFlux2.from_pretrained(os.path.join(self.base_path, "vae"), torch_dtype=torch.float16, low_cpu_mem_usage=True).to("cpu")
+            vae_path = os.path.join(self.base_path, "vae")
+            tokenizer = component_pool.acquire(owner, "tokenizer", tok_path, factory=lambda: AutoTokenizer.from_pretrained(tok_path))
+            vae = component_pool.acquire(
+                owner, "vae", vae_path, dtype=torch.float16,
+                factory=lambda: AutoencoderKLFlux2.from_pretrained(vae_path, torch_dtype=torch.float16, low_cpu_mem_usage=True).to("cpu")
+            )
             import gc; gc.collect()
             torch.cuda.empty_cache()
 
@@ -199,22 +268,25 @@ class HybridLoader:
             # 'linear' is the default shift=3.0 in the config
 
             
-            self.pipeline = Flux2KleinPipeline(scheduler=sch, text_encoder=text_encoder, tokenizer=tokenizer, transformer=transformer, vae=vae, is_distilled=True)
+            pipeline = Flux2KleinPipeline(scheduler=sch, text_encoder=text_encoder, tokenizer=tokenizer, transformer=transformer, vae=vae, is_distilled=True)
             
             # --- GUIDANCE PROXY: Inject guidance into transformer call ---
-            _orig_trans_forward = self.pipeline.transformer.forward
-            def sovereign_trans_forward(*a, **k):
-                if hasattr(self.pipeline, "_sovereign_gs"):
-                    # For Klein 4B, guidance is often passed as a scaled tensor
-                    # Even if guidance_embeds is False, the forward accepts it
-                    k["guidance"] = torch.tensor([self.pipeline._sovereign_gs], device=k["hidden_states"].device, dtype=k["hidden_states"].dtype)
-                return _orig_trans_forward(*a, **k)
-            self.pipeline.transformer.forward = sovereign_trans_forward
+            # Installed once per (pooled) transformer; guidance is read off the transformer itself
+            if not getattr(transformer, "_sovereign_proxy", False):
+                _orig_trans_forward = transformer.forward
+                def sovereign_trans_forward(*a, **k):
+                    gs = getattr(transformer, "_sovereign_gs", None)
+                    if gs is not None:
+                        # For Klein 4B, guidance is often passed as a scaled tensor
+                        # Even if guidance_embeds is False, the forward accepts it
+                        k["guidance"] = torch.tensor([gs], device=k["hidden_states"].device, dtype=k["hidden_states"].dtype)
+                    return _orig_trans_forward(*a, **k)
+                transformer.forward = sovereign_trans_forward
+                transformer._sovereign_proxy = True
 
             # --- SCHEDULER CONTEXT TRACKING (for hot-swap) ---
 
-            self._current_sampler = sampler_type
-            self._current_scheduler = scheduler_type
+            pipeline._sampler_context = (sampler_type, scheduler_type)
             
             # --- ANCHOR CHAT TEMPLATE ---
             template_path = os.path.join(tok_path, "chat_template.jinja")
@@ -225,9 +297,27 @@ class HybridLoader:
             
             logger.info(f"[SUCCESS] MIRACLE CALIBRATION: {sampler_type.upper()} + {scheduler_type.upper()} Active (Shift: {sch.config.shift})")
             logger.info(f"Manifold Residency: {psutil.virtual_memory().used / 1e9:.1f}GB / {psutil.virtual_memory().total / 1e9:.1f}GB System RAM")
-            return self.pipeline
+            return pipeline
         except Exception as e: logger.error(f"Override Fault: {e}"); raise e
     
+    def wrap_pipeline(self, pipeline_cls, source=None, **overrides):
+        """
+        Zero-copy pipeline wrapper (e.g. an edit variant) over pooled components.
+        Only the Python wrapper is new; every module is the same reference as `source`.
+        """
+        source = source or self.pipeline
+        if source is None:
+            raise RuntimeError("No resident pipeline to wrap.")
+        self.ensure_patched()
+        expected, optional = pipeline_cls._get_signature_keys(pipeline_cls)
+        components = {k: v for k, v in source.components.items() if k in expected}
+        components.update({k: source.config[k] for k in optional if k in source.config})
+        components.update(overrides)
+        wrapped = pipeline_cls(**components)
+        wrapped._sampler_context = getattr(source, "_sampler_context", None)
+        logger.info(f"[POOL] Wrapped {pipeline_cls.__name__} over resident components (no copies).")
+        return wrapped
+
     def hot_swap_scheduler(self, sampler_type="flow_euler", scheduler_type="linear"):
 
         """
@@ -238,10 +328,8 @@ class HybridLoader:
             logger.warning("Hot-swap aborted: No pipeline loaded.")
             return False
         
-        # Check if swap is needed
-        current_s = getattr(self, '_current_sampler', None)
-        current_sch = getattr(self, '_current_scheduler', None)
-        if current_s == sampler_type and current_sch == scheduler_type:
+        # Check if swap is needed (context lives on the pipeline; several may be resident)
+        if getattr(self.pipeline, '_sampler_context', None) == (sampler_type, scheduler_type):
             return False  # Already at target config
         
         from diffusers import FlowMatchEulerDiscreteScheduler, FlowMatchHeunDiscreteScheduler
@@ -263,13 +351,9 @@ class HybridLoader:
         
         # 4. Swap
         self.pipeline.scheduler = sch
-        self._current_sampler = sampler_type
-        self._current_scheduler = scheduler_type
+        self.pipeline._sampler_context = (sampler_type, scheduler_type)
         
         logger.info(f"[SUCCESS] HOT-SWAP: {sampler_type.upper()} + {scheduler_type.upper()} (Shift: {sch.config.shift})")
         return True
 
-patch_qwen_attention()
-patch_flux_nuclear_stability()
-patch_flux_pipeline()
-hybrid_loader = HybridLoader()
+hybrid_loader = StubLoader() if BACKEND == "stub" else HybridLoader()
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import random
+import logging
+import threading
+from types import SimpleNamespace
+from core.source_cache import source_cache
+
+logger = logging.getLogger(__name__)
+
+# ASSET_BACKEND=stub swaps the carrier and hybrid loader for simulated ones (no GPU, no weights)
+BACKEND = os.environ.get("ASSET_BACKEND", "zerodrag").strip().lower()
+
+# Timing / memory model of the simulated backend. Override with ASSET_STUB_PROFILE
+# (a JSON file path or an inline JSON object); keys are merged over these defaults.
+# Distributions: {"dist": "const", "value"} | "uniform" (low, high) | "normal" (mean, std)
+#                | "lognormal" (median, sigma) | "exponential" (mean)
+STUB_PROFILE = {
+    "build_s": {"dist": "lognormal", "median": 8.0, "sigma": 0.2},          # First pipeline build
+    "brain_s": {"dist": "lognormal", "median": 0.45, "sigma": 0.25},        # Text encoder strike
+    "brain_cpu_factor": 6.0,                                                # Speculative CPU encode slowdown
+    "step_s_per_mp": {"dist": "lognormal", "median": 0.22, "sigma": 0.15},  # Per denoising step per megapixel
+    "optics_s_per_mp": {"dist": "lognormal", "median": 0.55, "sigma": 0.3}, # VAE decode per megapixel
+    "migrate_s": {"dist": "uniform", "low": 0.15, "high": 0.6},             # Component host <-> Silicon move
+    "vram_base_gb": 8.6,
+    "vram_per_mp_gb": 1.9,
+    "fail_rate": 0.0,                                                       # Injected strike faults
+    "image": "noise",                                                       # noise (realistic PNG size) | flat
+    "speed": 1.0,                                                           # Multiplier on every simulated delay
+}
+
+
+def load_profile(spec=None):
+    spec = spec if spec is not None else os.environ.get("ASSET_STUB_PROFILE", "")
+    profile = dict(STUB_PROFILE)
+    if spec:
+        if not spec.lstrip().startswith("{"):
+            with open(spec, "r", encoding="utf-8") as f:
+                spec = f.read()
+        profile.update(json.loads(spec))
+    return profile
+
+
+def sample(spec, rng):
+    """One draw (seconds, GB, ...) from a profile entry; plain numbers are constants."""
+    if not isinstance(spec, dict):
+        return float(spec)
+    dist = spec.get("dist", "const")
+    if dist == "const":
+        return float(spec["value"])
+    if dist == "uniform":
+        return rng.uniform(spec["low"], spec["high"])
+    if dist == "normal":
+        return max(0.0, rng.gauss(spec["mean"], spec["std"]))
+    if dist == "lognormal":
+        return rng.lognormvariate(0.0, spec["sigma"]) * spec["median"]
+    if dist == "exponential":
+        return rng.expovariate(1.0 / spec["mean"])
+    raise ValueError(f"Unknown distribution: {dist}")
+
+
+class StubPipeline:
+    """Stands in for Flux2KleinPipeline: no modules, so residency/pools account nothing."""
+    def __init__(self, model_id="4b", sampler_type="flow_euler", scheduler_type="linear"):
+        self.model_id = model_id
+        self.sampler_type = sampler_type
+        self.scheduler_type = scheduler_type
+        self.components = {}
+        self.text_encoder = self.transformer = self.vae = None
+        self._current_ids = None
+        self.encodes = 0
+
+    def to(self, *args, **kwargs):
+        return self
+
+    @source_cache.cached_encoder
+    def _encode_vae_image(self, image, generator=None):
+        """Simulated VAE encode (8x pool of the preprocessed pixels); counted so cache hits are observable."""
+        import torch
+        self.encodes += 1
+        return torch.nn.functional.avg_pool2d(image, 8)
+
+    def __call__(self, prompt=None, image=None, height=None, width=None, generator=None, **kwargs):
+        """Reference-image path of Flux2KleinPipeline: PIL -> [-1, 1] pixels -> _encode_vae_image."""
+        import numpy as np
+        import torch
+        from PIL import Image
+        if image is not None:
+            width, height = image.size
+            pixels = torch.from_numpy(np.asarray(image.convert("RGB"), dtype=np.float32) / 127.5 - 1.0)
+            self._encode_vae_image(image=pixels.permute(2, 0, 1)[None], generator=generator)
+        return SimpleNamespace(images=[Image.new("RGB", (width or 1024, height or 1024))])
+
+
+class StubLoader:
+    """
+    Simulated Hybrid Loader.
+    Same surface the carrier and model manager use; builds take `build_s` and produce a
+    StubPipeline. Lets the server, admission, caches and telemetry run on a plain CI box.
+    """
+    def __init__(self, profile=None):
+        self.profile = profile or load_profile()
+        self.rng = random.Random()
+        self.pipeline = None
+        self.model_id = None
+        self._lock = threading.Lock()
+        logger.warning("[STUB] Simulated backend active (ASSET_BACKEND=stub): no weights are loaded.")
+
+    def delay(self, key, scale=1.0):
+        seconds = sample(self.profile[key], self.rng) * scale * float(self.profile.get("speed", 1.0))
+        time.sleep(seconds)
+        return seconds
+
+    def ensure_patched(self):
+        pass
+
+    def build_franklin_pipeline(self, model_id="4b", precision="fp16", sampler_type="flow_euler", scheduler_type="linear", owner=None):
+        with self._lock:
+            seconds = self.delay("build_s")
+        logger.info(f"[STUB] Built simulated FLUX-{model_id.upper()} in {seconds:.2f}s")
+        return StubPipeline(model_id, sampler_type, scheduler_type)  # Activated by the Model Manager
+
+    def estimate_bytes(self, model_id="4b"):
+        return 0
+
+    def wrap_pipeline(self, pipeline_cls, source=None, **overrides):
+        return StubPipeline()
+
+    def hot_swap_scheduler(self, sampler_type="flow_euler", scheduler_type="linear"):
+        if self.pipeline is not None:
+            self.pipeline.sampler_type, self.pipeline.scheduler_type = sampler_type, scheduler_type
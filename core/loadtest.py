@@ -0,0 +1,397 @@
+import io
+import os
+import sys
+import json
+import time
+import uuid
+import zlib
+import random
+import struct
+import threading
+import subprocess
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# End-to-end load generator. Pair with ASSET_BACKEND=stub (--spawn-stub) to measure the server,
+# admission gate, caches and telemetry without a GPU; point it at a real box for the real thing.
+DEFAULT_URL = "http://127.0.0.1:8000"
+DEFAULT_MIX = "txt2img=6,view=4,preencode=2"   # img2img / decompose need real pipelines: opt in with --mix
+PROMPTS = [
+    "a brass astrolabe on a walnut desk, studio lighting",
+    "isometric sci-fi crate, hand painted texture",
+    "portrait of an old fisherman, overcast light",
+    "neon alley in the rain, cinematic",
+    "low poly fox, white background",
+    "watercolor map of a coastal town",
+    "ceramic teapot with cherry blossom glaze",
+    "desert canyon at golden hour, wide angle",
+]
+SIZES = [(1024, 1024), (768, 1024), (1024, 768), (1280, 720)]
+PROBE_INTERVAL_S = 0.25     # /api/health cadence (event-loop responsiveness under load)
+SPAWN_TIMEOUT_S = 90.0      # --spawn-stub: wait for /api/health
+REQUEST_TIMEOUT_S = 600.0
+
+
+# --- PAYLOADS ---
+def _png(width=512, height=512, seed=0):
+    """Small gradient RGB PNG built with zlib only (no PIL on the client)."""
+    rng = random.Random(seed)
+    r, g = rng.randrange(256), rng.randrange(256)
+    rows = b"".join(
+        b"\x00" + bytes(v for x in range(width) for v in (r, (g + y) & 255, (x * 255) // width))
+        for y in range(height)
+    )
+
+    def chunk(tag, data):
+        return struct.pack(">I", len(data)) + tag + data + struct.pack(">I", zlib.crc32(tag + data) & 0xFFFFFFFF)
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", header) + chunk(b"IDAT", zlib.compress(rows, 6)) + chunk(b"IEND", b"")
+
+
+def _multipart(fields, files=None):
+    boundary = uuid.uuid4().hex
+    body = io.BytesIO()
+    for name, value in fields.items():
+        body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"\r\n\r\n{value}\r\n".encode())
+    for name, (filename, data, ctype) in (files or {}).items():
+        body.write(f"--{boundary}\r\nContent-Disposition: form-data; name=\"{name}\"; filename=\"{filename}\"\r\nContent-Type: {ctype}\r\n\r\n".encode())
+        body.write(data)
+        body.write(b"\r\n")
+    body.write(f"--{boundary}--\r\n".encode())
+    return body.getvalue(), f"multipart/form-data; boundary={boundary}"
+
+
+class Scenarios:
+    """Request builders per traffic type. Each returns (method, path, fields, files)."""
+    def __init__(self, repeat_ratio=0.2, seed=None):
+        self.repeat_ratio = repeat_ratio
+        self.rng = random.Random(seed)
+        self.history = []           # (prompt, seed, w, h) already requested: repeats hit the result cache
+        self.outputs = []           # Image paths returned by the server (viewer traffic)
+        self.sources = [_png(512, 512, i) for i in range(3)]
+        self._lock = threading.Lock()
+
+    def txt2img(self):
+        with self._lock:
+            if self.history and self.rng.random() < self.repeat_ratio:
+                prompt, seed, w, h = self.rng.choice(self.history)
+            else:
+                w, h = self.rng.choice(SIZES)
+                prompt, seed = self.rng.choice(PROMPTS), self.rng.randrange(1, 2**31)
+                self.history = (self.history + [(prompt, seed, w, h)])[-256:]
+        return "POST", "/api/txt2img", {"prompt": prompt, "seed": seed, "width": w, "height": h, "steps": 4}, None
+
+    def img2img(self):
+        with self._lock:
+            src, prompt = self.rng.choice(self.sources), self.rng.choice(PROMPTS)
+        return "POST", "/api/img2img", {"prompt": prompt, "strength": 0.6, "steps": 4}, {"image": ("source.png", src, "image/png")}
+
+    def decompose(self):
+        with self._lock:
+            src = self.rng.choice(self.sources)
+        return "POST", "/api/decompose", {"layers": 2, "preset": "fast"}, {"image": ("source.png", src, "image/png")}
+
+    def preencode(self):
+        with self._lock:
+            prompt = self.rng.choice(PROMPTS)
+            prompt = prompt[:self.rng.randrange(8, len(prompt) + 1)]  # Partially typed
+        return "POST", "/api/preencode", {"prompt": prompt}, None
+
+    def view(self):
+        """Viewer traffic: pyramid metadata + thumbnail of a recent output (health when none yet)."""
+        with self._lock:
+            path = self.rng.choice(self.outputs) if self.outputs else None
+        if path is None:
+            return "GET", "/api/health", None, None
+        return "GET", "/api/pyramid?" + urllib.parse.urlencode({"src": path}), None, None
+
+    def observe(self, kind, payload):
+        if kind in ("txt2img", "img2img") and isinstance(payload, dict) and isinstance(payload.get("image"), str):
+            with self._lock:
+                self.outputs = (self.outputs + [payload["image"]])[-64:]
+
+
+# --- TRANSPORT ---
+def request(base, method, path, fields=None, files=None, timeout=REQUEST_TIMEOUT_S):
+    """Returns (status, seconds, parsed JSON or None). Status 0 = transport failure."""
+    data, headers = None, {}
+    if fields is not None or files:
+        data, ctype = _multipart(fields or {}, files)
+        headers["Content-Type"] = ctype
+    req = urllib.request.Request(base + path, data=data, method=method, headers=headers)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as res:
+            body, status, ctype = res.read(), res.status, res.headers.get("Content-Type", "")
+    except urllib.error.HTTPError as e:
+        body, status, ctype = e.read(), e.code, e.headers.get("Content-Type", "")
+    except (urllib.error.URLError, OSError):
+        return 0, time.perf_counter() - start, None
+    elapsed = time.perf_counter() - start
+    payload = None
+    if "json" in ctype:
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            pass
+    return status, elapsed, payload
+
+
+class Recorder:
+    def __init__(self):
+        self.latency = defaultdict(list)
+        self.outcomes = defaultdict(Counter)
+        self.cached = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, kind, status, seconds, payload):
+        # The strike endpoints report faults as 200 {"status": "error"}
+        app_error = isinstance(payload, dict) and payload.get("status") == "error"
+        outcome = "ok" if 200 <= status < 300 and not app_error else ("error" if app_error else str(status or "conn"))
+        with self._lock:
+            self.latency[kind].append(seconds)
+            self.outcomes[kind][outcome] += 1
+            if isinstance(payload, dict) and payload.get("cached"):
+                self.cached[kind] += 1
+
+
+class TelemetryWatch:
+    """N /ws/telemetry subscribers; records frame rate and inter-frame gaps (needs `websockets`)."""
+    def __init__(self, base, count, hz=2.0):
+        self.url = base.replace("http", "ws", 1) + f"/ws/telemetry?hz={hz}"
+        self.count = count
+        self.frames = 0
+        self.gaps = []
+        self.errors = 0
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def start(self):
+        try:
+            from websockets.sync.client import connect
+        except ImportError:
+            print("LOADTEST: `websockets` not installed; telemetry subscribers disabled.", file=sys.stderr)
+            return False
+
+        def listen():
+            try:
+                with connect(self.url, open_timeout=10) as ws:
+                    last = None
+                    while not self._stop.is_set():
+                        try:
+                            ws.recv(timeout=1.0)
+                        except TimeoutError:
+                            continue
+                        now = time.perf_counter()
+                        with self._lock:
+                            self.frames += 1
+                            if last is not None:
+                                self.gaps.append(now - last)
+                        last = now
+            except Exception:
+                with self._lock:
+                    self.errors += 1
+
+        for _ in range(self.count):
+            t = threading.Thread(target=listen, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return True
+
+    def stop(self):
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=3)
+
+
+# --- RUNNER ---
+def parse_mix(spec):
+    mix = {}
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        name, _, weight = part.partition("=")
+        if not hasattr(Scenarios, name) or name == "observe":
+            raise ValueError(f"Unknown traffic type: {name}")
+        mix[name] = float(weight or 1)
+    return {k: v for k, v in mix.items() if v > 0}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100.0 * (len(ordered) - 1))))]
+
+
+def run(base, mix, duration, clients=8, rate=None, repeat_ratio=0.2, telemetry=0, seed=None):
+    """
+    Closed loop (default): `clients` users each issue the next request when the last returns.
+    Open loop (`rate` req/s): Poisson arrivals regardless of completions; latency counts from
+    the scheduled arrival, so queueing behind a saturated server is not hidden.
+    """
+    scenarios, recorder, probe = Scenarios(repeat_ratio, seed), Recorder(), Recorder()
+    kinds, weights = list(mix), list(mix.values())
+    pick = random.Random(seed)
+    deadline = time.perf_counter() + duration
+    watch = TelemetryWatch(base, telemetry) if telemetry else None
+    if watch is not None and not watch.start():
+        watch = None
+
+    def fire(kind, scheduled=None):
+        method, path, fields, files = getattr(scenarios, kind)()
+        status, seconds, payload = request(base, method, path, fields, files)
+        if scheduled is not None:
+            seconds = time.perf_counter() - scheduled
+        recorder.add(kind, status, seconds, payload)
+        scenarios.observe(kind, payload)
+
+    def probe_loop():
+        while time.perf_counter() < deadline:
+            status, seconds, payload = request(base, "GET", "/api/health", timeout=30)
+            probe.add("health", status, seconds, payload)
+            time.sleep(PROBE_INTERVAL_S)
+
+    probe_thread = threading.Thread(target=probe_loop, daemon=True)
+    probe_thread.start()
+    start = time.perf_counter()
+    if rate:
+        with ThreadPoolExecutor(max_workers=max(64, int(rate * 30))) as pool:
+            next_at = start
+            while next_at < deadline:
+                time.sleep(max(0.0, next_at - time.perf_counter()))
+                pool.submit(fire, pick.choices(kinds, weights)[0], next_at)
+                next_at += pick.expovariate(rate)
+    else:
+        def client(i):
+            rng = random.Random(None if seed is None else seed + i)
+            while time.perf_counter() < deadline:
+                fire(rng.choices(kinds, weights)[0])
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            list(pool.map(client, range(clients)))
+    elapsed = time.perf_counter() - start
+    probe_thread.join(timeout=30)
+    if watch is not None:
+        watch.stop()
+    return report(recorder, probe, watch, elapsed)
+
+
+def _summary(latency, outcomes, elapsed, cached=0):
+    ok = outcomes.get("ok", 0)
+    ms = lambda v: None if v is None else round(v * 1000, 1)
+    return {
+        "count": len(latency),
+        "ok": ok,
+        "errors": {k: v for k, v in outcomes.items() if k != "ok"},
+        "cached": cached,
+        "throughput_rps": round(ok / elapsed, 3) if elapsed else 0.0,
+        "p50_ms": ms(percentile(latency, 50)),
+        "p90_ms": ms(percentile(latency, 90)),
+        "p99_ms": ms(percentile(latency, 99)),
+        "max_ms": ms(max(latency) if latency else None),
+    }
+
+
+def report(recorder, probe, watch, elapsed):
+    out = {"elapsed_s": round(elapsed, 2), "traffic": {}}
+    for kind in sorted(recorder.latency):
+        out["traffic"][kind] = _summary(recorder.latency[kind], recorder.outcomes[kind], elapsed, recorder.cached[kind])
+    everything = [v for vals in recorder.latency.values() for v in vals]
+    total = Counter()
+    for c in recorder.outcomes.values():
+        total.update(c)
+    out["total"] = _summary(everything, total, elapsed, sum(recorder.cached.values()))
+    out["health_probe"] = _summary(probe.latency["health"], probe.outcomes["health"], elapsed)
+    if watch is not None:
+        out["telemetry"] = {
+            "subscribers": watch.count,
+            "frames": watch.frames,
+            "frames_per_s": round(watch.frames / elapsed, 2) if elapsed else 0.0,
+            "gap_p50_ms": None if not watch.gaps else round(percentile(watch.gaps, 50) * 1000, 1),
+            "gap_p99_ms": None if not watch.gaps else round(percentile(watch.gaps, 99) * 1000, 1),
+            "gap_max_ms": None if not watch.gaps else round(max(watch.gaps) * 1000, 1),
+            "disconnects": watch.errors,
+        }
+    return out
+
+
+def print_report(result):
+    print(f"LOADTEST {result['elapsed_s']:.1f}s")
+    header = f"{'traffic':<12}{'count':>7}{'ok':>7}{'cached':>8}{'req/s':>9}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'max ms':>10}  errors"
+    print(header)
+    print("-" * len(header))
+    rows = list(result["traffic"].items()) + [("TOTAL", result["total"]), ("health", result["health_probe"])]
+    fmt = lambda v: "-" if v is None else f"{v:.1f}"
+    for kind, s in rows:
+        errors = ", ".join(f"{k}:{v}" for k, v in sorted(s["errors"].items())) or "-"
+        print(f"{kind:<12}{s['count']:>7}{s['ok']:>7}{s['cached']:>8}{s['throughput_rps']:>9.2f}{fmt(s['p50_ms']):>10}{fmt(s['p90_ms']):>10}{fmt(s['p99_ms']):>10}{fmt(s['max_ms']):>10}  {errors}")
+    t = result.get("telemetry")
+    if t:
+        print(f"telemetry: {t['subscribers']} subscribers | {t['frames_per_s']} frames/s | gap p50 {t['gap_p50_ms']}ms p99 {t['gap_p99_ms']}ms max {t['gap_max_ms']}ms | disconnects {t['disconnects']}")
+
+
+def spawn_stub(base, profile=None):
+    """Launch server.py with the simulated backend and wait until it answers /api/health."""
+    env = dict(os.environ, ASSET_BACKEND="stub")
+    if profile:
+        env["ASSET_STUB_PROFILE"] = profile
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    proc = subprocess.Popen([sys.executable, "server.py"], cwd=root, env=env)
+    limit = time.perf_counter() + SPAWN_TIMEOUT_S
+    while time.perf_counter() < limit:
+        if proc.poll() is not None:
+            raise RuntimeError(f"Stub server exited with code {proc.returncode}")
+        if request(base, "GET", "/api/health", timeout=2)[0] == 200:
+            return proc
+        time.sleep(0.5)
+    proc.terminate()
+    raise RuntimeError(f"Stub server did not come up within {SPAWN_TIMEOUT_S:.0f}s")
+
+
+# --- CLI ---
+def main(argv=None):
+    import argparse
+    parser = argparse.ArgumentParser(description="Mixed-traffic load test: throughput and tail latency per request type.")
+    parser.add_argument("--url", default=DEFAULT_URL, help="Server base URL")
+    parser.add_argument("--duration", type=float, default=60.0, help="Seconds of traffic")
+    parser.add_argument("--clients", type=int, default=8, help="Closed-loop concurrent users")
+    parser.add_argument("--rate", type=float, default=None, help="Open-loop Poisson arrivals per second (overrides --clients)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Traffic weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--repeat-ratio", type=float, default=0.2, help="Fraction of txt2img repeating an earlier prompt+seed")
+    parser.add_argument("--telemetry", type=int, default=0, metavar="N", help="Telemetry websocket subscribers")
+    parser.add_argument("--seed", type=int, default=None, help="Traffic RNG seed (reproducible request sequence)")
+    parser.add_argument("--spawn-stub", action="store_true", help="Start server.py with ASSET_BACKEND=stub for the run")
+    parser.add_argument("--profile", default=None, help="Stub timing profile (JSON file or inline JSON)")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args(argv)
+
+    base = args.url.rstrip("/")
+    try:
+        mix = parse_mix(args.mix)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.spawn_stub and {"img2img", "decompose"} & set(mix):
+        parser.error("img2img / decompose have no simulated backend; drop them from --mix with --spawn-stub")
+    proc = spawn_stub(base, args.profile) if args.spawn_stub else None
+    try:
+        mode = f"open loop {args.rate:g} req/s" if args.rate else f"{args.clients} clients"
+        print(f"LOADTEST {base} | {mode} | {args.duration:.0f}s | mix {mix}", file=sys.stderr)
+        result = run(base, mix, args.duration, clients=args.clients, rate=args.rate,
+                     repeat_ratio=args.repeat_ratio, telemetry=args.telemetry, seed=args.seed)
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(timeout=15)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print_report(result)
+    return 0 if result["total"]["count"] and not result["total"]["errors"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
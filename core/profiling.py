@@ -0,0 +1,179 @@
+import os
+import json
+import time
+import uuid
+import logging
+import functools
+import threading
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+PROFILE_ROOT = os.path.join("outputs", "profiles")
+MAX_ARMED = 20                  # Dispatches one arm request may capture
+MEMORY_HISTORY_ENTRIES = 200000 # Allocator events kept for the memory snapshot
+
+
+class ProfilerCapture:
+    """
+    On-Demand Strike Profiler.
+    `arm(n)` captures the next n dispatches with torch.profiler (CPU + CUDA activity, memory)
+    and the CUDA caching-allocator history. Carrier phases, migrations, reclamation and every
+    transformer step appear as named ranges. Per dispatch, under outputs/profiles/<capture>/:
+      dispatch_<i>.trace.json   Chrome trace (chrome://tracing, ui.perfetto.dev)
+      dispatch_<i>.memory.html  Memory timeline by category (memory=True)
+      dispatch_<i>.snapshot.pickle  Allocator snapshot (pytorch.org/memory_viz)
+      dispatch_<i>.summary.json Phase timings, peak memory, files
+    Nothing is imported or recorded while disarmed; spans are no-ops.
+    """
+    def __init__(self, root=PROFILE_ROOT):
+        self.root = root
+        self.capture_id = None
+        self.remaining = 0
+        self.index = 0
+        self.memory = True
+        self.active = False
+        self.captures = []
+        self._lock = threading.Lock()
+
+    # --- CONTROL ---
+    def arm(self, count=1, memory=True):
+        with self._lock:
+            self.capture_id = time.strftime("%Y%m%d-%H%M%S") + "-" + uuid.uuid4().hex[:6]
+            self.remaining = max(1, min(MAX_ARMED, int(count)))
+            self.index = 0
+            self.memory = bool(memory)
+        logger.info(f"[PROFILER] Armed for the next {self.remaining} dispatch(es) -> {os.path.join(self.root, self.capture_id)}")
+        return self.get_state()
+
+    def disarm(self):
+        with self._lock:
+            self.remaining = 0
+        return self.get_state()
+
+    def _take(self):
+        with self._lock:
+            if self.remaining <= 0 or self.active:
+                return None
+            self.remaining -= 1
+            self.index += 1
+            self.active = True
+            return self.capture_id, self.index
+
+    # --- ANNOTATION ---
+    def span(self, name):
+        """Named range in the trace while a capture is running; free otherwise."""
+        if not self.active:
+            return nullcontext()
+        from torch.profiler import record_function
+        return record_function(name)
+
+    def annotate(self, name):
+        def wrap(fn):
+            @functools.wraps(fn)
+            def inner(*args, **kwargs):
+                with self.span(name):
+                    return fn(*args, **kwargs)
+            return inner
+        return wrap
+
+    @contextmanager
+    def steps(self, module, name):
+        """One range per forward of `module` (the transformer runs once per denoising step)."""
+        if not self.active:
+            yield
+            return
+        from torch.profiler import record_function
+        open_ranges, count = [], [0]
+
+        def pre(mod, args):
+            count[0] += 1
+            rf = record_function(f"{name}_{count[0]}")
+            rf.__enter__()
+            open_ranges.append(rf)
+
+        def post(mod, args, output):
+            if open_ranges:
+                open_ranges.pop().__exit__(None, None, None)
+
+        handles = [module.register_forward_pre_hook(pre), module.register_forward_hook(post)]
+        try:
+            yield
+        finally:
+            for h in handles:
+                h.remove()
+            while open_ranges:
+                open_ranges.pop().__exit__(None, None, None)
+
+    # --- CAPTURE ---
+    @contextmanager
+    def capture(self, label="dispatch"):
+        """Wraps one dispatch. Yields a summary dict the caller may extend (None when disarmed)."""
+        ticket = self._take()
+        if ticket is None:
+            yield None
+            return
+        import torch
+        from torch.profiler import profile, ProfilerActivity
+        capture_id, index = ticket
+        out_dir = os.path.join(self.root, capture_id)
+        os.makedirs(out_dir, exist_ok=True)
+        base = os.path.join(out_dir, f"{label}_{index}")
+
+        cuda = torch.cuda.is_available()
+        activities = [ProfilerActivity.CPU] + ([ProfilerActivity.CUDA] if cuda else [])
+        summary = {"capture": capture_id, "index": index, "started_at": time.time()}
+        if cuda and self.memory:
+            torch.cuda.memory._record_memory_history(max_entries=MEMORY_HISTORY_ENTRIES)
+            torch.cuda.reset_peak_memory_stats()
+
+        prof = profile(activities=activities, profile_memory=self.memory, record_shapes=self.memory, with_stack=self.memory)
+        start = time.time()
+        try:
+            with prof:
+                yield summary
+        except Exception as e:
+            summary["error"] = str(e)
+            raise
+        finally:
+            self.active = False
+            summary["seconds"] = round(time.time() - start, 3)
+            files = {}
+            try:
+                prof.export_chrome_trace(base + ".trace.json")
+                files["trace"] = base + ".trace.json"
+            except Exception as e:
+                logger.error(f"[PROFILER] Chrome trace export failed: {e}")
+            if cuda and self.memory:
+                summary["peak_gb"] = round(torch.cuda.max_memory_allocated() / (1024**3), 3)
+                try:
+                    prof.export_memory_timeline(base + ".memory.html", device="cuda:0")
+                    files["memory_timeline"] = base + ".memory.html"
+                except Exception as e:
+                    logger.error(f"[PROFILER] Memory timeline export failed: {e}")
+                try:
+                    torch.cuda.memory._dump_snapshot(base + ".snapshot.pickle")
+                    files["snapshot"] = base + ".snapshot.pickle"
+                except Exception as e:
+                    logger.error(f"[PROFILER] Allocator snapshot failed: {e}")
+                torch.cuda.memory._record_memory_history(enabled=None)
+            summary["files"] = {k: "/" + v.replace(os.sep, "/") for k, v in files.items()}
+            with open(base + ".summary.json", "w", encoding="utf-8") as f:
+                json.dump(summary, f, indent=2, default=str)
+            with self._lock:
+                self.captures.append(summary)
+                self.captures = self.captures[-MAX_ARMED:]
+            logger.info(f"[PROFILER] Captured {label} {index} ({summary['seconds']:.2f}s) -> {base}.*")
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "armed": self.remaining,
+                "capture": self.capture_id,
+                "memory": self.memory,
+                "active": self.active,
+                "recent": list(self.captures[-5:]),
+            }
+
+
+profiler = ProfilerCapture()
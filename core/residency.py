@@ -0,0 +1,288 @@
+import os
+import sys
+import time
+import errno
+import ctypes
+import ctypes.util
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+PAGE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+MODE = os.environ.get("ASSET_RESIDENCY", "lock").strip().lower()   # lock | advise | off
+CHECK_INTERVAL_S = 30.0         # Background residency audit (re-warms evicted ranges)
+ALERT_MIN_BYTES = 64 * 1024**2  # Evictions below this per component are noise, not an alert
+ALERT_HISTORY = 50
+
+# madvise(2) advice values (Linux)
+MADV_WILLNEED = 3
+MADV_POPULATE_READ = 22         # 5.14+: synchronously fault the range in
+
+_libc = None
+if sys.platform.startswith("linux"):
+    try:
+        _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        _libc.mlock.argtypes = _libc.munlock.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        _libc.madvise.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int]
+        _libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_ubyte)]
+    except (OSError, AttributeError):
+        _libc = None
+
+
+def _raise_memlock_limit():
+    """Unprivileged processes may lift the soft RLIMIT_MEMLOCK up to the hard limit."""
+    try:
+        import resource
+        soft, hard = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+        if soft != hard:
+            resource.setrlimit(resource.RLIMIT_MEMLOCK, (hard, hard))
+        return hard
+    except (ImportError, ValueError, OSError):
+        return None
+
+
+def host_ranges(module, seen=None):
+    """Page-aligned (start, length) spans of a module's CPU parameter/buffer storages."""
+    import torch
+    if not isinstance(module, torch.nn.Module):
+        return []
+    seen = set() if seen is None else seen
+    spans = []
+    for t in list(module.parameters()) + list(module.buffers()):
+        if t.device.type != "cpu":
+            continue
+        storage = t.untyped_storage()
+        ptr, size = storage.data_ptr(), storage.nbytes()
+        if not size or ptr in seen:
+            continue
+        seen.add(ptr)
+        start = ptr & ~(PAGE - 1)
+        spans.append((start, -(-(ptr + size - start) // PAGE) * PAGE))
+    spans.sort()
+    merged = []
+    for start, length in spans:
+        if merged and start <= merged[-1][0] + merged[-1][1]:
+            prev_start, prev_len = merged[-1]
+            merged[-1] = (prev_start, max(prev_len, start + length - prev_start))
+        else:
+            merged.append((start, length))
+    return merged
+
+
+class WorkingSet:
+    """
+    Host Working-Set Manager.
+    Keeps the host (CPU) copies of every resident pipeline component in RAM:
+      lock:   mlock(2) the weight pages (RLIMIT_MEMLOCK permitting); ranges that cannot be
+              locked fall back to `advise`.
+      advise: madvise(POPULATE_READ / WILLNEED) now, then re-warm whatever the kernel evicts.
+      touch:  Non-Linux fallback: read one byte per page to fault the copy back in.
+    A background audit measures resident vs swapped bytes per component (mincore(2)) and
+    raises an alert whenever pages were evicted since the last audit. Touch mode cannot
+    measure residency, so its audit only reports sizes and never re-warms.
+    """
+    def __init__(self, mode=MODE):
+        self.mode = "off" if mode == "off" else (mode if _libc is not None else "touch")
+        self.pipelines = {}             # key -> pipeline (model manager residency)
+        self.locked = {}                # start -> length of mlocked spans
+        self.advised = {}               # start -> length of spans warmed without a lock
+        self.lock_failed = None         # errno name of the first refused mlock
+        self.report = {}                # component -> last audit
+        self.alerts = deque(maxlen=ALERT_HISTORY)
+        self.stats = {"audits": 0, "rewarms": 0, "rewarm_bytes": 0, "last_audit_s": 0.0}
+        self._lock = threading.RLock()
+        self.guards = ()                # Locks held by anything that migrates weights (audit skips while busy)
+        self._thread = None
+        self._stop = threading.Event()
+        if self.mode == "lock":
+            _raise_memlock_limit()
+
+    # --- TRACKING ---
+    def track(self, key, pipeline):
+        with self._lock:
+            self.pipelines[key] = pipeline
+        self.ensure()
+
+    def untrack(self, key):
+        with self._lock:
+            self.pipelines.pop(key, None)
+            for name in [n for n in self.report if n.startswith(f"{key}/")]:
+                del self.report[name]
+            self._prune(self._components())
+
+    def _prune(self, components):
+        """Forget spans whose storage is gone (freed, migrated to Silicon, re-allocated elsewhere)."""
+        live = {start: length for _, _, spans in components for start, length in spans}
+        stale = [(s, n) for s, n in self.locked.items() if live.get(s) != n]
+        for start, length in stale:
+            del self.locked[start]
+            self._munlock(start, length)
+        for start, length in stale:
+            # munlock is not reference-counted: live spans sharing those pages must be pinned again
+            for s in [s for s, n in self.locked.items() if s < start + length and start < s + n]:
+                del self.locked[s]
+        for start in [s for s, n in self.advised.items() if live.get(s) != n]:
+            del self.advised[start]
+
+    def _components(self):
+        """(name, module, spans) per distinct component; pooled shards are listed once."""
+        out, seen_modules, seen_ptrs = [], set(), set()
+        for key, pipe in list(self.pipelines.items()):
+            for name, module in getattr(pipe, "components", {}).items():
+                if module is None or id(module) in seen_modules:
+                    continue
+                seen_modules.add(id(module))
+                spans = host_ranges(module, seen_ptrs)
+                if spans or hasattr(module, "parameters"):
+                    out.append((f"{key}/{name}", module, spans))
+        return out
+
+    # --- PINNING ---
+    def ensure(self):
+        """
+        Per-strike hook (replaces the old one-element manifold warm): pin host spans that
+        appeared since the last call (components migrated back from Silicon, new builds).
+        Already-locked spans cost nothing; spans that no longer back a component are released first.
+        """
+        if self.mode == "off":
+            return
+        with self._lock:
+            components = self._components()
+            self._prune(components)
+            for name, _, spans in components:
+                for start, length in spans:
+                    if self.locked.get(start) == length or self.advised.get(start) == length:
+                        continue
+                    if self.mode == "lock" and self.lock_failed is None and self._mlock(start, length):
+                        self.locked[start] = length
+                        continue
+                    self._warm(start, length)
+                    self.advised[start] = length
+
+    def _mlock(self, start, length):
+        if _libc.mlock(start, length) == 0:
+            return True
+        err = ctypes.get_errno()
+        if self.lock_failed is None:
+            self.lock_failed = errno.errorcode.get(err, str(err))
+            logger.warning(f"[RESIDENCY] mlock refused ({self.lock_failed}); falling back to madvise. Raise RLIMIT_MEMLOCK / grant CAP_IPC_LOCK to pin weights.")
+        return False
+
+    def _munlock(self, start, length):
+        if _libc is not None:
+            _libc.munlock(start, length)  # Spans already freed by the allocator just return ENOMEM
+
+    def _warm(self, start, length):
+        if self.mode == "touch":
+            return self._touch(start, length)
+        if _libc.madvise(start, length, MADV_POPULATE_READ) != 0:
+            _libc.madvise(start, length, MADV_WILLNEED)
+            self._touch(start, length)
+
+    @staticmethod
+    def _touch(start, length):
+        """Fault a span in by reading one byte per page."""
+        import torch
+        buf = (ctypes.c_ubyte * length).from_address(start)
+        torch.frombuffer(buf, dtype=torch.uint8)[::PAGE].sum()
+
+    # --- AUDIT ---
+    def _resident_bytes(self, spans):
+        if _libc is None:
+            return None
+        resident = 0
+        for start, length in spans:
+            pages = length // PAGE
+            vec = (ctypes.c_ubyte * pages)()
+            if _libc.mincore(start, length, vec) != 0:
+                return None
+            resident += (pages - bytes(vec).count(0)) * PAGE
+        return resident
+
+    def audit(self):
+        """Resident vs swapped bytes per component; alerts and re-warms on eviction."""
+        if self.mode == "off":
+            return self.report
+        start_t = time.time()
+        with self._lock:
+            for name, module, spans in self._components():
+                total = sum(length for _, length in spans)
+                resident = self._resident_bytes(spans)
+                locked = sum(length for start, length in spans if self.locked.get(start) == length)
+                prev = self.report.get(name)
+                entry = {
+                    "host_bytes": total,
+                    "resident_bytes": resident,
+                    "swapped_bytes": None if resident is None else total - resident,
+                    "locked_bytes": locked,
+                }
+                evicted = 0 if resident is None else total - resident
+                if evicted >= ALERT_MIN_BYTES and (prev is None or evicted > (prev.get("swapped_bytes") or 0)):
+                    self._alert(name, evicted, total)
+                if evicted and locked < total:  # Unmeasurable (touch mode): nothing to go on, never re-touch
+                    for s, length in spans:
+                        if self.locked.get(s) != length:
+                            self._warm(s, length)
+                    self.stats["rewarms"] += 1
+                    self.stats["rewarm_bytes"] += evicted
+                self.report[name] = entry
+            self.stats["audits"] += 1
+            self.stats["last_audit_s"] = round(time.time() - start_t, 3)
+        return self.report
+
+    def _alert(self, name, evicted, total):
+        alert = {"at": time.time(), "component": name, "evicted_bytes": evicted, "host_bytes": total}
+        self.alerts.append(alert)
+        logger.warning(f"[RESIDENCY] {name}: {evicted / 1e9:.2f}GB of {total / 1e9:.2f}GB paged out of host RAM. Re-warming; the next strike would have faulted it back in.")
+
+    # --- BACKGROUND ---
+    def start(self, interval=CHECK_INTERVAL_S):
+        if self.mode == "off" or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                if not self._acquire_guards():
+                    continue  # Weights are migrating (strike / model swap): spans may be freed under us
+                try:
+                    self.ensure()
+                    self.audit()
+                except Exception as e:
+                    logger.error(f"[RESIDENCY] Audit Fault: {e}")
+                finally:
+                    for guard in self.guards:
+                        guard.release()
+
+        self._thread = threading.Thread(target=loop, daemon=True, name="working-set")
+        self._thread.start()
+        logger.info(f"[RESIDENCY] Working-set manager online | mode: {self.mode} | audit every {interval:.0f}s")
+
+    def _acquire_guards(self):
+        taken = []
+        for guard in self.guards:
+            if not guard.acquire(blocking=False):
+                for held in reversed(taken):
+                    held.release()
+                return False
+            taken.append(guard)
+        return True
+
+    def stop(self):
+        self._stop.set()
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "mode": self.mode,
+                "lock_failed": self.lock_failed,
+                "locked_gb": round(sum(self.locked.values()) / 1e9, 2),
+                "components": {k: dict(v) for k, v in self.report.items()},
+                "alerts": list(self.alerts)[-5:],
+                "stats": dict(self.stats),
+            }
+
+
+working_set = WorkingSet()
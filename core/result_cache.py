@@ -0,0 +1,172 @@
+import os
+import json
+import asyncio
+import hashlib
+import logging
+import threading
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+OUTPUT_DIR = "outputs"
+INDEX_FILE = ".result_index.json"
+MAX_ENTRIES = 5000
+WEIGHTS_ROOT = "models/flux-klein/transformer"
+
+
+def model_fingerprint(model_id):
+    """Model identity for cache keys: variant + size/mtime of its transformer weights."""
+    variant = "klein-4b" if "4b" in str(model_id).lower() else "klein-9b"
+    path = os.path.join(WEIGHTS_ROOT, variant, "safetensors", "diffusion_pytorch_model-large.safetensors")
+    try:
+        st = os.stat(path)
+        return f"{variant}:{st.st_size}:{int(st.st_mtime)}"
+    except OSError:
+        return variant
+
+
+class ResultCache:
+    """
+    Deterministic Strike Memory.
+    A fixed-seed request is a pure function of its inputs, so its PNG is reused: results are
+    keyed by a canonical hash of every generation input plus model identity and indexed
+    next to the outputs. Identical requests already in flight are coalesced onto one strike.
+    Only full-size renders are stored: an admission downscale is a degraded answer for this key.
+    """
+    def __init__(self, output_dir=OUTPUT_DIR, max_entries=MAX_ENTRIES):
+        self.output_dir = output_dir
+        self.max_entries = max_entries
+        self._index = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()  # Serializes index file writes (outside _lock)
+        self._version = 0                    # Index snapshots, so a slow writer never lands an older one last
+        self._written = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    # --- KEYS ---
+    @staticmethod
+    def key(prompt, seed, width, height, steps, guidance, sampler, scheduler, model_id, **extra):
+        """Canonical hash of the request, or None when the request is not deterministic (seed -1)."""
+        if seed is None or int(seed) < 0:
+            return None
+        payload = {
+            "prompt": str(prompt).strip(), "seed": int(seed), "width": int(width), "height": int(height),
+            "steps": int(steps), "guidance": round(float(guidance), 6), "sampler": sampler, "scheduler": scheduler,
+            "model": model_fingerprint(model_id),
+        }
+        payload.update({k: v for k, v in extra.items() if v is not None})
+        blob = json.dumps(payload, sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(blob.encode("utf-8")).hexdigest()
+
+    # --- INDEX (lives in the output directory) ---
+    def _index_path(self):
+        return os.path.join(self.output_dir, INDEX_FILE)
+
+    def _load(self):
+        if self._index is None:
+            try:
+                with open(self._index_path(), "r", encoding="utf-8") as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {}
+        return self._index
+
+    def _snapshot(self):
+        """Serialized index + its version. Call under _lock."""
+        self._version += 1
+        return self._version, json.dumps(self._index)
+
+    def _persist(self, snapshot):
+        version, blob = snapshot
+        os.makedirs(self.output_dir, exist_ok=True)
+        tmp = self._index_path() + ".tmp"
+        with self._write_lock:
+            if version < self._written:
+                return  # A newer snapshot is already on disk
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(blob)
+            os.replace(tmp, self._index_path())
+            self._written = version
+
+    def get(self, key):
+        """Cached result dict, if its file still exists. Blocking file I/O: call off the event loop."""
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._load().get(key)
+            if entry is None:
+                return None
+            if os.path.exists(os.path.join(self.output_dir, os.path.basename(entry["path"]))):
+                self.hits += 1
+                return dict(entry)
+            del self._index[key]  # Output was deleted: drop the entry on disk too, or it returns after a restart
+            snapshot = self._snapshot()
+        self._persist(snapshot)
+        return None
+
+    def put(self, key, result):
+        """Record a result and rewrite the index. Blocking file I/O: call off the event loop."""
+        if key is None or result.get("status") != "success":
+            return
+        with self._lock:
+            index = self._load()
+            index[key] = {"path": result["path"], "time": result.get("time", 0.0)}
+            while len(index) > self.max_entries:
+                index.pop(next(iter(index)))
+            snapshot = self._snapshot()
+        self._persist(snapshot)
+
+    # --- COALESCING ---
+    async def run(self, key, strike, store=True):
+        """
+        Await `strike()` once per key. Concurrent callers with the same key share the result.
+        If the leading caller is cancelled (client disconnect), its waiters strike for themselves.
+        store=False coalesces without caching (e.g. the render was downscaled by admission).
+        Returns (result, coalesced).
+        """
+        if key is None:
+            return await strike(), False
+        while (fut := self._inflight.get(key)) is not None:
+            self.coalesced += 1
+            logger.info(f"[CACHE] Coalesced onto in-flight strike {key[:12]}")
+            try:
+                return await asyncio.shield(fut), True
+            except asyncio.CancelledError:
+                task = asyncio.current_task()
+                if not fut.cancelled() or (hasattr(task, "cancelling") and task.cancelling()):
+                    raise  # This caller was cancelled, not the leader
+                logger.info(f"[CACHE] Leading strike {key[:12]} cancelled; taking over")
+        self.misses += 1
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[key] = fut
+        try:
+            result = await strike()
+            if store:
+                await asyncio.to_thread(self.put, key, result)
+            fut.set_result(result)
+            return result, False
+        except asyncio.CancelledError:
+            fut.cancel()
+            raise
+        except BaseException as e:
+            fut.set_exception(e)
+            fut.exception()  # Mark retrieved when nobody else is waiting
+            raise
+        finally:
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "entries": len(self._load()),
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "in_flight": len(self._inflight),
+            }
+
+
+result_cache = ResultCache()
@@ -0,0 +1,164 @@
+import io
+import hashlib
+import logging
+import functools
+import threading
+from contextlib import contextmanager
+from collections import OrderedDict
+from PIL import Image
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+MAX_SOURCES = 32            # Decoded uploads kept for re-use by source_id
+MAX_ENCODED = 64            # (source, resolution) latent / mask entries
+SOURCE_ID_LEN = 16
+
+
+def source_key(content):
+    return hashlib.sha256(content).hexdigest()[:SOURCE_ID_LEN]
+
+
+class SourceCache:
+    """
+    Iterative Edit Memory.
+    Uploaded sources are decoded once and addressed by a content hash (source_id).
+    Pixel tensors and preprocessed masks are cached per (source_id, width, height), so repeat
+    img2img/inpaint strikes on the same canvas skip PIL decode. For img2img the pipeline's own
+    VAE encode is intercepted (see `cached_encoder`), so repeats also skip the encoder.
+    """
+    def __init__(self, max_sources=MAX_SOURCES, max_encoded=MAX_ENCODED):
+        self.max_sources = max_sources
+        self.max_encoded = max_encoded
+        self._sources = OrderedDict()
+        self._latents = OrderedDict()
+        self._masks = OrderedDict()      # Mask and pixel tensors
+        self._lock = threading.Lock()
+        self._bound = threading.local()  # source_id of the edit this thread is running
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _touch(store, key, value, limit):
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > limit:
+            store.popitem(last=False)
+
+    # --- SOURCES ---
+    def put(self, content):
+        """Register raw upload bytes. Returns (source_id, decoded PIL image)."""
+        sid = source_key(content)
+        with self._lock:
+            image = self._sources.get(sid)
+            if image is not None:
+                self._sources.move_to_end(sid)
+                self.hits += 1
+                return sid, image
+            self.misses += 1
+        image = Image.open(io.BytesIO(content))
+        image.load()
+        with self._lock:
+            self._touch(self._sources, sid, image, self.max_sources)
+        return sid, image
+
+    def get(self, source_id):
+        with self._lock:
+            image = self._sources.get(source_id)
+            if image is not None:
+                self._sources.move_to_end(source_id)
+            return image
+
+    # --- ENCODED ARTEFACTS ---
+    @contextmanager
+    def bind(self, source_id):
+        """Route this thread's pipeline VAE encodes through the latent cache, keyed by `source_id`."""
+        prev = getattr(self._bound, "source_id", None)
+        self._bound.source_id = source_id
+        try:
+            yield
+        finally:
+            self._bound.source_id = prev
+
+    def cached_encoder(self, encode):
+        """
+        Wrap a pipeline's `_encode_vae_image(image=<preprocessed pixels>, ...)`. Installed by the
+        loader, so the pipeline still preprocesses the PIL source itself; only the VAE pass is
+        skipped on a repeat strike, keyed by (source_id, preprocessed shape).
+        """
+        @functools.wraps(encode)
+        def wrapper(pipe, image, **kwargs):
+            sid = getattr(self._bound, "source_id", None)
+            if sid is None:
+                return encode(pipe, image=image, **kwargs)
+            key = (sid, tuple(image.shape))
+            with self._lock:
+                cached = self._latents.get(key)
+                if cached is not None:
+                    self._latents.move_to_end(key)
+                    self.hits += 1
+            if cached is not None:
+                return cached.to(image.device, non_blocking=True)
+            with self._lock:
+                self.misses += 1
+            lat = encode(pipe, image=image, **kwargs)
+            with self._lock:
+                self._touch(self._latents, key, lat.to("cpu"), self.max_encoded)
+            logger.info(f"[CACHE] Source Latents Encoded: {sid} @ {image.shape[-1]}x{image.shape[-2]}")
+            return lat
+
+        wrapper.source_cached = True
+        return wrapper
+
+    @staticmethod
+    def caches_latents(pipe):
+        """True when the pipeline's VAE encode goes through `cached_encoder`."""
+        return getattr(getattr(type(pipe), "_encode_vae_image", None), "source_cached", False)
+
+    def pixels(self, pipe, source_id, image):
+        """Preprocessed [-1, 1] pixel tensor at target size (for pipelines that must see pixels, e.g. inpaint)."""
+        processor = getattr(pipe, "image_processor", None)
+        if processor is None or source_id is None:
+            return image
+        key = (source_id, "px", image.width, image.height)
+        with self._lock:
+            cached = self._masks.get(key)
+            if cached is not None:
+                self._masks.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        tensor = processor.preprocess(image, height=image.height, width=image.width)
+        with self._lock:
+            self._touch(self._masks, key, tensor, self.max_encoded)
+        return tensor
+
+    def mask(self, pipe, mask_id, mask_image, width, height):
+        """Preprocessed mask tensor at target size, or the PIL mask when the pipeline has no mask processor."""
+        processor = getattr(pipe, "mask_processor", None)
+        if processor is None or mask_id is None:
+            return mask_image
+        key = (mask_id, width, height)
+        with self._lock:
+            cached = self._masks.get(key)
+            if cached is not None:
+                self._masks.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        tensor = processor.preprocess(mask_image, height=height, width=width)
+        with self._lock:
+            self._touch(self._masks, key, tensor, self.max_encoded)
+        return tensor
+
+    def get_state(self):
+        with self._lock:
+            return {
+                "sources": len(self._sources),
+                "latents": len(self._latents),
+                "tensors": len(self._masks),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+source_cache = SourceCache()
@@ -0,0 +1,97 @@
+import time
+import logging
+import importlib
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+IMPORT_BUDGET_S = 1.5       # `import server` must stay under this (no torch/diffusers on the boot path)
+
+
+class StartupProfile:
+    """
+    Boot Timeline.
+    Milestones since interpreter start, deferred heavy imports (when they finally happened and
+    what they cost) and spans such as the first ML-stack patch pass.
+    """
+    def __init__(self):
+        self.t0 = time.perf_counter()
+        try:
+            import psutil
+            self.process_start = psutil.Process().create_time()
+        except Exception:
+            self.process_start = time.time()
+        self.boot_offset = time.time() - self.process_start    # Interpreter boot before this module
+        self.marks = []
+        self.imports = []
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def _now(self):
+        return self.boot_offset + (time.perf_counter() - self.t0)
+
+    def mark(self, name):
+        with self._lock:
+            self.marks.append({"name": name, "at_s": round(self._now(), 3)})
+        logger.info(f"[STARTUP] {name} @ {self._now():.2f}s")
+
+    def since(self, name):
+        """Seconds from process start to a recorded milestone (None if not reached)."""
+        return next((m["at_s"] for m in self.marks if m["name"] == name), None)
+
+    @contextmanager
+    def span(self, name, kind="span"):
+        start, at = time.perf_counter(), self._now()
+        try:
+            yield
+        finally:
+            entry = {"name": name, "at_s": round(at, 3), "seconds": round(time.perf_counter() - start, 3)}
+            with self._lock:
+                (self.imports if kind == "import" else self.spans).append(entry)
+            logger.info(f"[STARTUP] {name} {kind}: {entry['seconds']:.2f}s (deferred to {at:.2f}s)")
+
+    def report(self):
+        with self._lock:
+            return {
+                "import_budget_s": IMPORT_BUDGET_S,
+                "marks": list(self.marks),
+                "deferred_imports": list(self.imports),
+                "spans": list(self.spans),
+            }
+
+
+startup_profile = StartupProfile()
+
+
+class LazyModule:
+    """Module proxy that imports on first attribute access; the import is timed in the startup profile."""
+    def __init__(self, name):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+        self.__dict__["_lock"] = threading.Lock()
+
+    def _load(self):
+        module = self.__dict__["_module"]
+        if module is None:
+            with self.__dict__["_lock"]:
+                module = self.__dict__["_module"]
+                if module is None:
+                    with startup_profile.span(self._name, kind="import"):
+                        module = importlib.import_module(self._name)
+                    self.__dict__["_module"] = module
+        return module
+
+    def __getattr__(self, attr):
+        return getattr(self._load(), attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self._load(), attr, value)
+
+    def __repr__(self):
+        state = "loaded" if self.__dict__["_module"] is not None else "deferred"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_import(name):
+    return LazyModule(name)
@@ -0,0 +1,248 @@
+import os
+import re
+import asyncio
+import gzip
+import hashlib
+import logging
+import mimetypes
+import posixpath
+import time
+import threading
+
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+try:
+    import brotli
+except ImportError:  # Optional: gzip-only when the brotli wheel is absent
+    brotli = None
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+TEXT_TYPES = {".js", ".mjs", ".css", ".html", ".svg", ".json", ".map", ".txt"}
+IMAGE_TYPES = {".png", ".webp", ".jpg", ".jpeg", ".gif"}
+MIN_COMPRESS_BYTES = 512
+HASH_LEN = 10
+RESCAN_S = 2.0              # Edits under static/ are picked up within this window (no restart)
+
+# Relative references the build rewrites to fingerprinted URLs
+_JS_IMPORT = re.compile(r"""((?:import|export)\s[^'"]*?from\s*|import\s*\(?\s*)(['"])(\.{1,2}/[^'"?#]+)(?:\?[^'"]*)?\2""")
+_CSS_URL = re.compile(r"""(url\(\s*)(['"]?)(?!https?:|data:|/)([^'")?#]+)(?:\?[^'")]*)?\2(\s*\))""")
+_HTML_REF = re.compile(r"""((?:src|href)=)(['"])(?!https?:|data:|/|#)([^'"?#]+)(?:\?[^'"]*)?\2""")
+_MODULE_ENTRY = re.compile(r"""<script[^>]+type=["']module["'][^>]*src=["']([^"'?]+)""")
+
+
+class Asset:
+    def __init__(self, body, media_type, digest):
+        self.body = body
+        self.media_type = media_type
+        self.digest = digest
+        self.etag = f'"{digest}"'
+        self.gzip = None
+        self.br = None
+
+    def precompress(self):
+        """Build the brotli/gzip variants (part of the build, so never on the event loop)."""
+        if len(self.body) < MIN_COMPRESS_BYTES:
+            return
+        self.gzip = gzip.compress(self.body, compresslevel=9, mtime=0)
+        if brotli is not None:
+            self.br = brotli.compress(self.body, quality=11)
+
+    def encoded(self, encoding):
+        """Precompressed variant, or None when the asset is too small or the codec is absent."""
+        return {"br": self.br, "gzip": self.gzip}.get(encoding)
+
+
+class AssetBuild:
+    """
+    Fingerprinted View of static/.
+    Text assets are rewritten so every relative reference carries `?v=<content hash>`.
+    Hashes are Merkle-style (an importer's hash covers its rewritten imports), so any change
+    busts every URL on the path to it and everything else stays cached. index.html gets
+    <link rel="modulepreload"> for the whole ES module graph so the browser fetches it in
+    one round trip instead of a waterfall.
+    """
+    def __init__(self, root):
+        self.root = os.path.abspath(root)
+        self.assets = {}
+        self.modules = []
+        self.signature = None
+
+    @staticmethod
+    def scan(root):
+        """Cheap change detector: (path, size, mtime) of every file."""
+        sig = []
+        for dirpath, dirnames, filenames in os.walk(root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                st = os.stat(os.path.join(dirpath, name))
+                sig.append((dirpath, name, st.st_size, st.st_mtime_ns))
+        return hash(tuple(sorted(sig)))
+
+    def build(self):
+        self.signature = self.scan(self.root)
+        files = {}
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            dirnames[:] = [d for d in dirnames if not d.startswith(".")]
+            for name in filenames:
+                full = os.path.join(dirpath, name)
+                rel = os.path.relpath(full, self.root).replace(os.sep, "/")
+                with open(full, "rb") as f:
+                    files[rel] = f.read()
+
+        hashes, resolving = {}, set()
+
+        def resolve(rel):
+            if rel in hashes:
+                return hashes[rel]
+            if rel in resolving:  # Import cycle: fall back to the raw content hash
+                return hashlib.sha256(files[rel]).hexdigest()[:HASH_LEN]
+            resolving.add(rel)
+            body = self._rewrite(rel, files[rel], files, resolve)
+            resolving.discard(rel)
+            digest = hashlib.sha256(body).hexdigest()[:HASH_LEN]
+            media_type = mimetypes.guess_type(rel)[0] or "application/octet-stream"
+            self.assets[rel] = Asset(body, media_type, digest)
+            hashes[rel] = digest
+            return digest
+
+        for rel in files:
+            resolve(rel)
+        self._preload_modules(files)
+        for rel, asset in self.assets.items():
+            if os.path.splitext(rel)[1].lower() in TEXT_TYPES:
+                asset.precompress()
+        logger.info(f"[STATIC] Fingerprinted {len(self.assets)} assets ({len(self.modules)} ES modules preloaded) | brotli: {'on' if brotli else 'off'}")
+        return self
+
+    @staticmethod
+    def _target(rel, ref):
+        return posixpath.normpath(posixpath.join(posixpath.dirname(rel), ref))
+
+    def _rewrite(self, rel, body, files, resolve):
+        ext = os.path.splitext(rel)[1].lower()
+        if ext not in (".js", ".mjs", ".css", ".html"):
+            return body
+        text = body.decode("utf-8")
+
+        def sub(match, ref_group):
+            ref = match.group(ref_group)
+            target = self._target(rel, ref)
+            if target not in files:
+                return match.group(0)
+            quote = match.group(2)
+            tail = match.group(4) if ext == ".css" else ""
+            return f"{match.group(1)}{quote}{ref}?v={resolve(target)}{quote}{tail}"
+
+        if ext in (".js", ".mjs"):
+            text = _JS_IMPORT.sub(lambda m: sub(m, 3), text)
+        elif ext == ".css":
+            text = _CSS_URL.sub(lambda m: sub(m, 3), text)
+        else:
+            text = _HTML_REF.sub(lambda m: sub(m, 3), text)
+        return text.encode("utf-8")
+
+    def _preload_modules(self, files):
+        index = self.assets.get("index.html")
+        if index is None:
+            return
+        html = index.body.decode("utf-8")
+        seen, stack = [], [m for m in _MODULE_ENTRY.findall(html) if m in files]
+        while stack:
+            rel = stack.pop()
+            if rel in seen:
+                continue
+            seen.append(rel)
+            for m in _JS_IMPORT.finditer(files[rel].decode("utf-8")):
+                target = self._target(rel, m.group(3))
+                if target in files:
+                    stack.append(target)
+        self.modules = seen
+        links = "".join(f'  <link rel="modulepreload" href="{rel}?v={self.assets[rel].digest}">\n' for rel in seen)
+        html = html.replace("</head>", links + "</head>", 1)
+        self.assets["index.html"] = Asset(html.encode("utf-8"), index.media_type, hashlib.sha256(html.encode("utf-8")).hexdigest()[:HASH_LEN])
+
+
+def _accepts(scope, encoding):
+    for name, value in scope.get("headers", []):
+        if name == b"accept-encoding":
+            return encoding in value.decode("latin-1").lower()
+    return False
+
+
+def _header(scope, key):
+    for name, value in scope.get("headers", []):
+        if name == key:
+            return value.decode("latin-1")
+    return None
+
+
+class FingerprintedStatic(StaticFiles):
+    """
+    Editor UI mount. Fingerprinted URLs (?v=<hash> matching the current build) are immutable;
+    everything else (index.html, unversioned hits) revalidates by ETag. Text assets are served
+    from their precompressed brotli/gzip variants. Rescans and rebuilds run in a worker thread;
+    requests arriving while one is in flight are served from the previous build.
+    """
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._build = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+
+    async def current(self):
+        due = time.monotonic() - self._checked > RESCAN_S
+        if self._build is None or (due and not self._lock.locked()):
+            await asyncio.to_thread(self._refresh)
+        return self._build
+
+    def _refresh(self):
+        with self._lock:
+            if self._build is not None and time.monotonic() - self._checked <= RESCAN_S:
+                return  # Refreshed by another request while this one waited
+            if self._build is None or AssetBuild.scan(self.directory) != self._build.signature:
+                self._build = AssetBuild(self.directory).build()
+            self._checked = time.monotonic()
+
+    async def get_response(self, path, scope):
+        rel = path.replace(os.sep, "/").strip("/")
+        if rel in ("", "."):
+            rel = "index.html"
+        asset = (await self.current()).assets.get(rel)
+        if asset is None:
+            return await super().get_response(path, scope)
+
+        version = dict(p.split("=", 1) for p in scope.get("query_string", b"").decode().split("&") if "=" in p).get("v")
+        headers = {
+            "ETag": asset.etag,
+            "Cache-Control": IMMUTABLE if version == asset.digest else REVALIDATE,
+            "Vary": "Accept-Encoding",
+        }
+        if _header(scope, b"if-none-match") == asset.etag:
+            return Response(status_code=304, headers=headers)
+
+        body = asset.body
+        if os.path.splitext(rel)[1].lower() in TEXT_TYPES:
+            for encoding in ("br", "gzip"):
+                if _accepts(scope, encoding):
+                    encoded = asset.encoded(encoding)
+                    if encoded is not None:
+                        body, headers["Content-Encoding"] = encoded, encoding
+                        break
+        return Response(body, media_type=asset.media_type, headers=headers)
+
+
+class OutputFiles(StaticFiles):
+    """
+    /outputs mount. Strike, batch, session and tile images are written once under unique
+    names, so they are immutable; `latest.*` and index files change in place and revalidate.
+    """
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        name = os.path.basename(str(full_path))
+        mutable = name.startswith("latest.") or os.path.splitext(name)[1].lower() not in IMAGE_TYPES
+        response.headers["Cache-Control"] = REVALIDATE if mutable else IMMUTABLE
+        return response
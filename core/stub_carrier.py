@@ -0,0 +1,95 @@
+import time
+import random
+import logging
+
+from core.carrier import ZerodragCarrier, Preempted
+from core.loaders.stub_loader import load_profile, sample
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+STUB_ENCODER_LAYERS = 36    # Yield points of the simulated speculative encode (text encoder depth)
+
+
+class StubCarrier(ZerodragCarrier):
+    """
+    Simulated Carrier (ASSET_BACKEND=stub).
+    Only the Silicon work is simulated: the Brain / speculative encode, Engine, the hi-res
+    handoff and Optics are sleeps drawn from the stub profile, scaled by megapixels and steps
+    like the real ones. The real _render / dispatch and the cache / preemption bookkeeping
+    around them drive these, so model activation, the working set, the embedding cache,
+    hi-res planning, the admission upscale and the persist path (strike PNGs, latest.png,
+    derivatives) are production code. Runs on worker threads exactly like the real carrier.
+    """
+    def __init__(self, profile=None):
+        super().__init__()
+        self.profile = profile or load_profile()
+        self.rng = random.Random()
+        self.vram_gb = 0.0
+
+    def _delay(self, key, scale=1.0):
+        seconds = sample(self.profile[key], self.rng) * scale * float(self.profile.get("speed", 1.0))
+        time.sleep(seconds)
+        return seconds
+
+    # --- SILICON (simulated) ---
+    def clear_board(self, hard=True, need_gb=None):
+        self.reclaim["calls"] += 1
+        return 0
+
+    def evacuate(self):
+        self.engine_resident = self.optics_resident = False
+        self.vram_gb = 0.0
+
+    def _brain_strike(self, prompt):
+        if self.engine_resident or self.optics_resident:
+            self._delay("migrate_s")
+        self.engine_resident = self.optics_resident = False
+        self._delay("brain_s")
+        return ("stub", None, prompt)  # (prompt_embeds, pooled_projections, text_ids)
+
+    def _speculative_encode(self, prompt):
+        seconds = sample(self.profile["brain_s"], self.rng) * float(self.profile.get("brain_cpu_factor", 1.0)) * float(self.profile.get("speed", 1.0))
+        for _ in range(STUB_ENCODER_LAYERS):
+            if self._preempt.is_set():
+                raise Preempted()
+            time.sleep(seconds / STUB_ENCODER_LAYERS)
+        return ("stub", None, prompt), "CPU"
+
+    def _phase_engine(self, prompt_embeds, pooled_projections, text_ids, height, width, steps, guidance, seed, latents=None, sigmas=None, mu=None):
+        self.phase = "ENGINE"
+        if not self.engine_resident:
+            self._delay("migrate_s")
+            self.engine_resident = True
+        self._delay("step_s_per_mp", scale=steps * height * width / 1e6)
+        self.vram_gb = self.profile["vram_base_gb"] + self.profile["vram_per_mp_gb"] * height * width / 1e6
+        if self.rng.random() < float(self.profile.get("fail_rate", 0.0)):
+            self.engine_resident = False
+            raise RuntimeError("Injected stub fault.")
+        return ("latents", height, width, seed)
+
+    def _phase_upscale(self, latents, height, width, steps, strength, seed, base_seq_len):
+        total = max(steps, int(round(steps / max(strength, 1e-3))))
+        return ("latents", height, width, seed), [1.0 / total] * steps, None
+
+    def _phase_optics(self, latents, height, width):
+        self.phase = "OPTICS"
+        if not self.optics_resident:
+            self._delay("migrate_s")
+        self._delay("optics_s_per_mp", scale=height * width / 1e6)
+        self.optics_resident = False
+        return self._image(width, height, latents[3])
+
+    def _peak_gb(self):
+        return round(self.vram_gb, 3)
+
+    def _image(self, width, height, seed):
+        from PIL import Image
+        if self.profile.get("image") == "flat":
+            rng = random.Random(seed)
+            return Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+        return Image.merge("RGB", [Image.effect_noise((width, height), 48) for _ in range(3)])
+
+    def get_state(self):
+        state = super().get_state()
+        state.update({"backend": "stub", "simulated_vram_gb": round(self.vram_gb, 2)})
+        return state
@@ -0,0 +1,141 @@
+import time
+import asyncio
+import logging
+from core.vram import governor
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+SAMPLE_HZ = 4.0             # One hardware poll per tick, shared by every socket.
+DEFAULT_CLIENT_HZ = 2.0
+MAX_CLIENT_HZ = 10.0
+CLIENT_BACKLOG = 4          # Frames a client may fall behind before it is dropped.
+
+
+def _delta(prev, curr):
+    """Nested diff of two telemetry snapshots. Removed keys map to None."""
+    out = {}
+    for k, v in curr.items():
+        p = prev.get(k) if isinstance(prev, dict) else None
+        if isinstance(v, dict) and isinstance(p, dict):
+            sub = _delta(p, v)
+            if sub: out[k] = sub
+        elif p != v or k not in prev:
+            out[k] = v
+    for k in prev:
+        if k not in curr: out[k] = None
+    return out
+
+
+class _Subscriber:
+    def __init__(self, websocket, hz):
+        self.websocket = websocket
+        self.interval = 1.0 / max(0.1, min(MAX_CLIENT_HZ, hz))
+        self.frames = asyncio.Queue(maxsize=CLIENT_BACKLOG)
+        self.last_state = None
+        self.next_due = 0.0
+        self.dropped = False
+        self.task = None
+
+
+class TelemetryBroadcaster:
+    """
+    Single Sampler, Many Sockets.
+    One background task polls the governor at SAMPLE_HZ (off the event loop) and fans
+    the snapshot out to every /ws/telemetry subscriber as delta frames, honouring each
+    client's own rate. Clients that cannot keep up are dropped, never buffered.
+    """
+    def __init__(self, sample_hz=SAMPLE_HZ):
+        self.sample_hz = sample_hz
+        self.subscribers = set()
+        self.snapshot = {}
+        self.samples = 0
+        self.drops = 0
+        self._task = None
+        self._sources = {}
+
+    def set_rate(self, hz):
+        self.sample_hz = max(0.2, min(MAX_CLIENT_HZ, float(hz)))
+        logger.info(f"[TELEMETRY] Sampler Rate: {self.sample_hz:.1f}Hz")
+        return self.sample_hz
+
+    def register_source(self, name, fn):
+        """Attach an extra section to each snapshot (e.g. carrier phase, queue state)."""
+        self._sources[name] = fn
+
+    def _sample(self):
+        status = dict(governor.get_telemetry())
+        for name, fn in self._sources.items():
+            try:
+                status[name] = fn()
+            except Exception as e:
+                status[name] = {"error": str(e)}
+        status["broadcast"] = {"subscribers": len(self.subscribers), "drops": self.drops}
+        return status
+
+    async def _run(self):
+        while self.subscribers:
+            period = 1.0 / self.sample_hz
+            tick = time.monotonic()
+            try:
+                self.snapshot = await asyncio.to_thread(self._sample)
+                self.samples += 1
+            except Exception as e:
+                logger.warning(f"[TELEMETRY] Sample Fault: {e}")
+            self._publish(tick)
+            await asyncio.sleep(max(0.0, period - (time.monotonic() - tick)))
+        self._task = None
+
+    def _publish(self, now):
+        for sub in list(self.subscribers):
+            if sub.dropped or now < sub.next_due:
+                continue
+            if sub.last_state is None:
+                frame = {"type": "full", "data": self.snapshot}
+            else:
+                data = _delta(sub.last_state, self.snapshot)
+                if not data:
+                    continue
+                frame = {"type": "delta", "data": data}
+            try:
+                sub.frames.put_nowait(frame)
+            except asyncio.QueueFull:
+                self._drop(sub)
+                continue
+            sub.last_state = self.snapshot
+            sub.next_due = now + sub.interval
+
+    def _drop(self, sub):
+        sub.dropped = True
+        self.subscribers.discard(sub)
+        self.drops += 1
+        if sub.task is not None:
+            sub.task.cancel()  # Unblock a send stuck on a full socket
+        logger.warning("[TELEMETRY] Slow subscriber dropped.")
+
+    async def serve(self, websocket, hz=DEFAULT_CLIENT_HZ):
+        """Pump frames to one accepted socket until it disconnects or is dropped."""
+        sub = _Subscriber(websocket, hz)
+        sub.task = asyncio.current_task()
+        self.subscribers.add(sub)
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            while not sub.dropped:
+                try:
+                    frame = await asyncio.wait_for(sub.frames.get(), timeout=1.0)
+                except asyncio.TimeoutError:
+                    continue
+                await websocket.send_json(frame)
+        except asyncio.CancelledError:
+            if not sub.dropped: raise
+        finally:
+            self.subscribers.discard(sub)
+            if sub.dropped:
+                try: await websocket.close(code=1013)
+                except Exception: pass
+
+    def get_state(self):
+        return {"subscribers": len(self.subscribers), "samples": self.samples, "drops": self.drops, "sample_hz": self.sample_hz}
+
+
+broadcaster = TelemetryBroadcaster()
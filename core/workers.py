@@ -0,0 +1,257 @@
+import os
+import time
+import queue
+import asyncio
+import hashlib
+import logging
+import threading
+import itertools
+import multiprocessing as mp
+from core.loaders.stub_loader import BACKEND
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+HEARTBEAT_S = 2.0
+STALE_S = 10.0              # No heartbeat for this long -> unhealthy, not routed to
+AFFINITY_PROMPT = 100       # Router score: prompt embeddings already cached
+AFFINITY_MODEL = 10         # Router score: target model already owns the worker's Silicon
+DEPTH_PENALTY = 150         # Per queued job: affinity only breaks ties between equally loaded workers
+CPU_WORKERS = 2             # Default worker count without CUDA devices (simulated backend only)
+WORKER_RAM_GB = os.environ.get("ASSET_WORKER_RAM_GB")  # Per-worker residency budget (default: host budget / workers)
+
+
+def prompt_tag(prompt):
+    """Stable short hash of a normalised prompt (heartbeats advertise cached embeddings by tag)."""
+    return hashlib.sha1(str(prompt).strip().encode("utf-8")).hexdigest()[:12]
+
+
+def _worker_main(index, device, inbox, outbox, ram_budget_gb):
+    """
+    Worker process: one Carrier, one device, a share of the host RAM budget.
+    CUDA_VISIBLE_DEVICES is pinned by the parent before spawn, so "cuda" here is the worker's own GPU.
+    """
+    from core.carrier import carrier
+    from model_manager import model_manager
+    carrier.worker_tag = f"w{index}"
+    model_manager.set_budget(ram_budget_gb)  # N workers share one host: each pins at most its slice
+    busy = threading.Event()
+    stop = threading.Event()
+
+    def health():
+        return {
+            "type": "health", "worker": index, "pid": os.getpid(), "device": device, "busy": busy.is_set(),
+            "last_prompt": carrier.last_prompt, "model": model_manager.current, "phase": carrier.phase,
+            "prompts": [prompt_tag(p) for p in carrier.cached_prompts()],
+        }
+
+    def heartbeat():
+        # Own thread: strikes (and the first cold build) outlast STALE_S without starving health
+        while not stop.wait(HEARTBEAT_S):
+            outbox.put(health())
+
+    outbox.put(health())
+    threading.Thread(target=heartbeat, daemon=True, name="heartbeat").start()
+    while True:
+        job = inbox.get()
+        if job is None:
+            break
+        job_id, params = job
+        busy.set()
+        outbox.put(health())
+        try:
+            result = carrier.dispatch(**params)
+            outbox.put({"type": "result", "worker": index, "job": job_id, "ok": True, "result": result})
+        except Exception as e:
+            outbox.put({"type": "result", "worker": index, "job": job_id, "ok": False,
+                        "error": str(e), "oom": type(e).__name__ == "OutOfMemoryError"})
+        busy.clear()
+        outbox.put(health())
+    stop.set()
+
+
+class WorkerHandle:
+    def __init__(self, index, device, process, inbox):
+        self.index = index
+        self.device = device
+        self.process = process
+        self.inbox = inbox
+        self.pending = set()
+        self.state = {}
+        self.last_seen = 0.0
+
+    @property
+    def depth(self):
+        return len(self.pending)
+
+    @property
+    def healthy(self):
+        return self.process.is_alive() and (time.time() - self.last_seen) < STALE_S
+
+    def as_dict(self):
+        return {
+            "worker": self.index, "device": self.device, "pid": self.process.pid,
+            "healthy": self.healthy, "queue_depth": self.depth,
+            "model": self.state.get("model"), "phase": self.state.get("phase"),
+            "last_seen_s": round(time.time() - self.last_seen, 1) if self.last_seen else None,
+        }
+
+
+class WorkerPool:
+    """
+    Multi-Process Carrier Fleet.
+    One worker process per GPU, each with its own Carrier. CPU-only workers exist for the
+    simulated backend (ASSET_BACKEND=stub); the real Carrier is CUDA-only.
+    The router prefers the worker whose prompt embedding cache (advertised by tag in each
+    heartbeat) / resident model already matches the request, then falls back to the
+    least-loaded healthy worker.
+    """
+    def __init__(self):
+        self.workers = []
+        self.enabled = False
+        self._ctx = mp.get_context("spawn")
+        self._outbox = None
+        self._futures = {}
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+        self._loop = None
+        self.routed_affine = 0
+        self.routed_least_loaded = 0
+
+    def start(self, count=None, loop=None):
+        """
+        Spawn workers. count=None -> one per visible CUDA device (CPU_WORKERS if none, stub backend only).
+        Each worker gets WORKER_RAM_GB of host residency, or an equal share of this process's budget.
+        """
+        import torch
+        from model_manager import model_manager
+        devices = list(range(torch.cuda.device_count()))
+        if not devices and BACKEND != "stub":
+            raise RuntimeError("Worker pool needs CUDA devices (CPU workers only run with ASSET_BACKEND=stub).")
+        if count is None:
+            count = len(devices) or CPU_WORKERS
+        ram_budget_gb = float(WORKER_RAM_GB) if WORKER_RAM_GB else model_manager.ram_budget_gb / count
+        self._loop = loop or asyncio.get_event_loop()
+        self._outbox = self._ctx.Queue()
+        for i in range(count):
+            device = f"cuda:{devices[i % len(devices)]}" if devices else "cpu"
+            inbox = self._ctx.Queue()
+            env_prev = os.environ.get("CUDA_VISIBLE_DEVICES")
+            if devices:
+                os.environ["CUDA_VISIBLE_DEVICES"] = str(devices[i % len(devices)])
+            try:
+                proc = self._ctx.Process(target=_worker_main, args=(i, device, inbox, self._outbox, ram_budget_gb), daemon=True, name=f"carrier-w{i}")
+                proc.start()
+            finally:
+                if env_prev is None: os.environ.pop("CUDA_VISIBLE_DEVICES", None)
+                else: os.environ["CUDA_VISIBLE_DEVICES"] = env_prev
+            self.workers.append(WorkerHandle(i, device, proc, inbox))
+        threading.Thread(target=self._collect, daemon=True, name="worker-collector").start()
+        self.enabled = True
+        logger.info(f"[WORKERS] Fleet Online: {count} worker(s) | {[w.device for w in self.workers]} | {ram_budget_gb:.1f}GB host RAM each")
+        return count
+
+    def stop(self):
+        for w in self.workers:
+            try: w.inbox.put(None)
+            except Exception: pass
+        for w in self.workers:
+            w.process.join(timeout=5)
+        self.enabled = False
+
+    # --- RESULTS ---
+    def _collect(self):
+        next_reap = time.monotonic() + HEARTBEAT_S
+        while True:
+            # Reap on a timer: with 2+ workers heartbeating the outbox is never idle
+            if time.monotonic() >= next_reap:
+                self._reap()
+                next_reap = time.monotonic() + HEARTBEAT_S
+            try:
+                msg = self._outbox.get(timeout=HEARTBEAT_S)
+            except queue.Empty:
+                continue
+            w = self.workers[msg["worker"]]
+            w.last_seen = time.time()
+            if msg["type"] == "health":
+                w.state = msg
+                continue
+            with self._lock:
+                w.pending.discard(msg["job"])
+                fut = self._futures.pop(msg["job"], None)
+            if fut is not None:
+                self._loop.call_soon_threadsafe(self._resolve, fut, msg)
+
+    def _reap(self):
+        """Fail jobs stranded on a worker process that died."""
+        for w in self.workers:
+            if w.process.is_alive() or not w.pending:
+                continue
+            with self._lock:
+                stranded = [(j, self._futures.pop(j, None)) for j in w.pending]
+                w.pending.clear()
+            logger.error(f"[WORKERS] Worker {w.index} died (exit {w.process.exitcode}). Failing {len(stranded)} job(s).")
+            for job_id, fut in stranded:
+                if fut is not None:
+                    self._loop.call_soon_threadsafe(self._resolve, fut, {"ok": False, "error": f"Worker {w.index} died."})
+
+    @staticmethod
+    def _resolve(fut, msg):
+        if fut.done():
+            return
+        if msg["ok"]:
+            fut.set_result(msg["result"])
+        elif msg.get("oom"):
+            import torch
+            fut.set_exception(torch.cuda.OutOfMemoryError(msg["error"]))
+        else:
+            fut.set_exception(RuntimeError(msg["error"]))
+
+    # --- ROUTING ---
+    def route(self, params):
+        healthy = [w for w in self.workers if w.healthy] or [w for w in self.workers if w.process.is_alive()]
+        if not healthy:
+            raise RuntimeError("No live carrier workers.")
+        prompt = str(params.get("prompt", "")).strip()
+        tag = prompt_tag(prompt) if prompt else None
+        model = f"flux-{params.get('model_id', '4b')}"
+
+        def affinity(w):
+            s = 0
+            if tag and tag in w.state.get("prompts", ()): s += AFFINITY_PROMPT
+            if w.state.get("model") == model: s += AFFINITY_MODEL
+            return s
+
+        best = max(healthy, key=lambda w: (affinity(w) - w.depth * DEPTH_PENALTY, -w.index))
+        if affinity(best) > 0:
+            self.routed_affine += 1
+        else:
+            self.routed_least_loaded += 1
+        return best
+
+    async def submit(self, **params):
+        """Route one dispatch to a worker and await its result dict."""
+        worker = self.route(params)
+        # Optimistic affinity: once this job runs, the worker holds its prompt and model
+        prompt = str(params.get("prompt", "")).strip()
+        worker.state = dict(worker.state, last_prompt=prompt, model=f"flux-{params.get('model_id', '4b')}",
+                            prompts=list(worker.state.get("prompts", ())) + [prompt_tag(prompt)])
+        job_id = next(self._ids)
+        fut = asyncio.get_running_loop().create_future()
+        with self._lock:
+            self._futures[job_id] = fut
+            worker.pending.add(job_id)
+        worker.inbox.put((job_id, params))
+        result = await fut
+        result["worker"] = worker.index
+        return result
+
+    def get_state(self):
+        return {
+            "enabled": self.enabled,
+            "workers": [w.as_dict() for w in self.workers],
+            "routed_affine": self.routed_affine,
+            "routed_least_loaded": self.routed_least_loaded,
+        }
+
+
+worker_pool = WorkerPool()
@@ -1,84 +1,250 @@
 
 import os
-import shutil
-from huggingface_hub import hf_hub_download
+import sys
+import json
+import hashlib
+import argparse
+import threading
+import urllib.request
+import urllib.error
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Base Directions
 BASE_MODEL_DIR = os.path.join(os.getcwd(), "models")
 SOVEREIGN_FLUX_DIR = os.path.join(BASE_MODEL_DIR, "flux2-klein")
+MANIFEST_PATH = os.path.join(BASE_MODEL_DIR, "manifest.json")
 
-def requisition_component(repo, filename, target_subpath, rename_as=None):
-    """Surgical Injection with High-Velocity Check."""
-    target_dir = os.path.join(SOVEREIGN_FLUX_DIR, target_subpath)
-    os.makedirs(target_dir, exist_ok=True)
+CHUNK = 8 * 1024 * 1024
+DEFAULT_JOBS = 4
+RETRIES = 3
 
-    local_filename = rename_as if rename_as else filename.split('/')[-1]
-    target_path = os.path.join(target_dir, local_filename)
+# Component Manifest. size/sha256 are pinned by `--write-manifest` (or resolved from the Hub at run time).
+COMPONENTS = [
+    # 1. VAE for 4B
+    {"repo": "Comfy-Org/flux2-dev", "filename": "split_files/vae/flux2-vae.safetensors",
+     "target_subpath": "vae", "rename_as": "diffusion_pytorch_model.safetensors"},
+    # 2. Text Encoder for 4B
+    {"repo": "Comfy-Org/flux2-klein-4B", "filename": "split_files/text_encoders/qwen_3_4b.safetensors",
+     "target_subpath": "text_encoder/4b", "rename_as": "model.safetensors"},
+    # 3. 4B Model Weights
+    {"repo": "black-forest-labs/FLUX.2-klein-4b-fp8", "filename": "flux-2-klein-4b-fp8.safetensors",
+     "target_subpath": "transformer/4b", "rename_as": "model.safetensors"},
+    # 4. 4B Config
+    {"repo": "black-forest-labs/FLUX.2-klein-4b-fp8", "filename": "config.json",
+     "target_subpath": "transformer/4b", "rename_as": "config.json"},
+    # 5. 4B Text Encoder Config
+    {"repo": "Comfy-Org/flux2-klein-4B", "filename": "text_encoder/config.json",
+     "target_subpath": "text_encoder/4b", "rename_as": "config.json"},
+]
+
+_print_lock = threading.Lock()
+
+
+def say(msg):
+    with _print_lock:
+        print(msg, flush=True)
+
+
+def local_name(comp):
+    return comp.get("rename_as") or comp["filename"].split("/")[-1]
 
-    if os.path.exists(target_path):
-        print(f"✅ Component Saturated: {local_filename}")
-        return
 
-    print(f"📥 Requisitioning {local_filename} from {repo}...")
+def target_path(comp):
+    return os.path.join(SOVEREIGN_FLUX_DIR, comp["target_subpath"], local_name(comp))
+
+
+def load_manifest(path=None):
+    """Pinned size/sha256 per target (keyed by target_subpath/local name)."""
+    path = path or MANIFEST_PATH
     try:
-        downloaded_path = hf_hub_download(
-            repo_id=repo,
-            filename=filename,
-            local_dir=target_dir,
-            local_dir_use_symlinks=False
-        )
-        # Move file to expected name if different
-        if os.path.basename(downloaded_path) != local_filename:
-            final_path = os.path.join(target_dir, local_filename)
-            shutil.move(downloaded_path, final_path)
-        print(f"✨ {local_filename} Saturated.")
-    except Exception as e:
-        print(f"❌ Requisition Failed for {local_filename}: {e}")
-
-def ignite_sovereign_download():
-    print("🦾 VEETANCE BRAIN SYNC: INITIATING...")
+        with open(path, "r", encoding="utf-8") as f:
+            pinned = {e["key"]: e for e in json.load(f)}
+    except (OSError, ValueError):
+        pinned = {}
+    comps = []
+    for comp in COMPONENTS:
+        comp = dict(comp)
+        entry = pinned.get(f"{comp['target_subpath']}/{local_name(comp)}", {})
+        comp.setdefault("size", entry.get("size"))
+        comp.setdefault("sha256", entry.get("sha256"))
+        comps.append(comp)
+    return comps
 
-    # 1. VAE for 4B
-    requisition_component(
-        repo="Comfy-Org/flux2-dev",
-        filename="split_files/vae/flux2-vae.safetensors",
-        target_subpath="vae",
-        rename_as="diffusion_pytorch_model.safetensors"
-    )
 
-    # 2. Text Encoder for 4B
-    requisition_component(
-        repo="Comfy-Org/flux2-klein-4B",
-        filename="split_files/text_encoders/qwen_3_4b.safetensors",
-        target_subpath="text_encoder/4b",
-        rename_as="model.safetensors"
-    )
+def write_manifest(comps, path=None):
+    path = path or MANIFEST_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump([{"key": f"{c['target_subpath']}/{local_name(c)}", "repo": c["repo"], "filename": c["filename"],
+                    "size": c.get("size"), "sha256": c.get("sha256")} for c in comps], f, indent=2)
+    say(f"📜 Manifest pinned: {path}")
 
-    # 3. 4B Model Weights
-    requisition_component(
-        repo="black-forest-labs/FLUX.2-klein-4b-fp8",
-        filename="flux-2-klein-4b-fp8.safetensors",
-        target_subpath="transformer/4b",
-        rename_as="model.safetensors"
-    )
 
-    # 4. 4B Config
-    requisition_component(
-        repo="black-forest-labs/FLUX.2-klein-4b-fp8",
-        filename="config.json",
-        target_subpath="transformer/4b",
-        rename_as="config.json"
-    )
+# --- SOURCES ---
+def hub_source(comp):
+    """(url, headers) on the Hub; fills size/sha256 from file metadata when the manifest has none."""
+    from huggingface_hub import hf_hub_url, get_hf_file_metadata
+    from huggingface_hub.utils import build_hf_headers
+    url = hf_hub_url(repo_id=comp["repo"], filename=comp["filename"])
+    if comp.get("size") is None or comp.get("sha256") is None:
+        meta = get_hf_file_metadata(url)
+        comp["size"] = comp.get("size") or meta.size
+        etag = (meta.etag or "").strip('"')
+        if comp.get("sha256") is None and len(etag) == 64:  # LFS etag is the sha256
+            comp["sha256"] = etag
+    return url, build_hf_headers()
 
-    # 5. 4B Text Encoder Config
-    requisition_component(
-        repo="Comfy-Org/flux2-klein-4B",
-        filename="text_encoder/config.json",
-        target_subpath="text_encoder/4b",
-        rename_as="config.json"
-    )
 
-    print("\n🚀 BRAIN MANIFOLD ALIGNED. 🦾⚡")
+def mirror_source(comp, mirror):
+    """
+    Mirror layout matches models/flux2-klein: <mirror>/<target_subpath>/<local name>.
+    A mirror only supplies bytes; what they must hash to comes from the manifest or the Hub.
+    """
+    rel = f"{comp['target_subpath']}/{local_name(comp)}"
+    if mirror.startswith(("http://", "https://")):
+        return mirror.rstrip("/") + "/" + rel, {}
+    return os.path.join(mirror, *rel.split("/")), None
+
+
+def resolve_source(comp, mirror=None):
+    """
+    (src, headers) for the transfer, with the expected size/sha256 settled first: from the
+    pinned manifest, else from Hub file metadata. Never from the bytes being checked (an
+    existing file or a mirror copy), so a truncated or corrupt copy cannot vouch for itself.
+    """
+    url, headers = None, None
+    if not mirror or comp.get("size") is None or comp.get("sha256") is None:
+        url, headers = hub_source(comp)
+    if comp.get("size") is None:
+        raise IOError(f"no expected size for {local_name(comp)}; pin a manifest (--write-manifest) or allow Hub access")
+    return mirror_source(comp, mirror) if mirror else (url, headers)
+
+
+def _client_error(e):
+    """4xx from urllib or the Hub client (bad repo/path, no access): retrying cannot help."""
+    code = getattr(e, "code", None) or getattr(getattr(e, "response", None), "status_code", None)
+    return isinstance(code, int) and 400 <= code < 500 and code not in (408, 429)
+
+
+# --- TRANSFER ---
+def _hash_file(path, digest=None):
+    digest = digest or hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK), b""):
+            digest.update(block)
+    return digest
+
+
+def verify(comp, path, full=True):
+    """Size (always) + sha256 (full=True) against the manifest. Unknown fields pass."""
+    if not os.path.exists(path):
+        return False
+    if comp.get("size") is not None and os.path.getsize(path) != comp["size"]:
+        return False
+    if full and comp.get("sha256"):
+        return _hash_file(path).hexdigest() == comp["sha256"]
+    return True
+
+
+def _open_stream(src, headers, offset):
+    """Byte stream from `offset` and whether the source honoured the offset."""
+    if headers is None:
+        f = open(src, "rb")
+        f.seek(offset)
+        return f, True
+    req = urllib.request.Request(src, headers=dict(headers, **({"Range": f"bytes={offset}-"} if offset else {})))
+    resp = urllib.request.urlopen(req, timeout=60)
+    return resp, offset == 0 or resp.status == 206
+
+
+def fetch(comp, src, headers):
+    """Chunked, resumable transfer into <target>.part with a streaming sha256, then atomic rename."""
+    final = target_path(comp)
+    part = final + ".part"
+    os.makedirs(os.path.dirname(final), exist_ok=True)
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if comp.get("size") is not None and offset > comp["size"]:
+        os.remove(part)
+        offset = 0
+
+    digest = _hash_file(part) if offset else hashlib.sha256()  # Resume: fold the bytes we already have
+    if offset and offset == comp.get("size"):
+        say(f"⏩ {local_name(comp)}: partial already complete, verifying.")  # A range request would 416
+    else:
+        stream, resumed = _open_stream(src, headers, offset)
+        if offset and not resumed:
+            say(f"↩️  {local_name(comp)}: source ignored range request, restarting.")
+            offset, digest = 0, hashlib.sha256()
+        if offset:
+            say(f"⏩ Resuming {local_name(comp)} at {offset / 1e9:.2f}GB")
+        with stream, open(part, "ab" if offset else "wb") as out:
+            for block in iter(lambda: stream.read(CHUNK), b""):
+                out.write(block)
+                digest.update(block)
+
+    size = os.path.getsize(part)
+    if comp.get("size") is not None and size != comp["size"]:
+        raise IOError(f"size {size} != {comp['size']} (partial kept for resume)")
+    if comp.get("sha256") and digest.hexdigest() != comp["sha256"]:
+        os.remove(part)
+        raise IOError(f"sha256 mismatch ({digest.hexdigest()[:12]} != {comp['sha256'][:12]}); corrupt partial discarded")
+    comp["size"], comp["sha256"] = size, digest.hexdigest()
+    os.replace(part, final)
+
+
+def requisition_component(comp, mirror=None, full_verify=True):
+    """Surgical Injection with Integrity Check."""
+    name, final = local_name(comp), target_path(comp)
+    src = headers = None
+    for attempt in range(1, RETRIES + 1):
+        try:
+            if src is None:
+                src, headers = resolve_source(comp, mirror)  # Expected size/sha256 before trusting anything on disk
+            if os.path.exists(final):
+                if verify(comp, final, full=full_verify):
+                    say(f"✅ Component Saturated: {name}")
+                    return True
+                say(f"⚠️  {name} failed verification. Re-requisitioning...")
+                if os.path.getsize(final) < comp["size"]:
+                    os.replace(final, final + ".part")  # Truncated: keep the bytes, resume after them
+                else:
+                    os.remove(final)
+            say(f"📥 Requisitioning {name} from {mirror or comp['repo']}..." + (f" (attempt {attempt})" if attempt > 1 else ""))
+            fetch(comp, src, headers)
+            say(f"✨ {name} Saturated ({comp['size'] / 1e9:.2f}GB, sha256 {comp['sha256'][:12]}).")
+            return True
+        except (OSError, urllib.error.URLError) as e:
+            say(f"❌ Requisition Failed for {name}: {e}")
+            if _client_error(e):
+                break  # 4xx: wrong path or no access, not a flaky transfer
+        except Exception as e:
+            say(f"❌ Requisition Failed for {name}: {e}")
+            break
+    return False
+
+
+def ignite_sovereign_download(mirror=None, jobs=DEFAULT_JOBS, full_verify=True, pin=False):
+    print("🦾 VEETANCE BRAIN SYNC: INITIATING...")
+    comps = load_manifest()
+    ok = True
+    with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+        futures = {pool.submit(requisition_component, c, mirror, full_verify): c for c in comps}
+        for fut in as_completed(futures):
+            ok = fut.result() and ok
+    if pin and ok:
+        write_manifest(comps)
+    if ok:
+        print("\n🚀 BRAIN MANIFOLD ALIGNED. 🦾⚡")
+    else:
+        print("\n🛑 BRAIN MANIFOLD INCOMPLETE. Re-run to resume.")
+    return ok
+
 
 if __name__ == "__main__":
-    ignite_sovereign_download()
+    parser = argparse.ArgumentParser(description="Fetch and verify model weights.")
+    parser.add_argument("--mirror", help="Local directory or http(s) URL laid out like models/flux2-klein")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Concurrent downloads")
+    parser.add_argument("--fast", action="store_true", help="Existing files: check size only (skip sha256)")
+    parser.add_argument("--write-manifest", action="store_true", help=f"Pin resolved sizes/hashes to {MANIFEST_PATH}")
+    args = parser.parse_args()
+    sys.exit(0 if ignite_sovereign_download(args.mirror, args.jobs, not args.fast, args.write_manifest) else 1)
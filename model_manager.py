@@ -1,8 +1,278 @@
 """
 Model Manager for FLUX and Qwen models
 Coordinates loading, unloading, and management of different model components.
+
+Host RAM is the residency tier: FLUX 4B / 9B and Qwen-Layered pipelines stay loaded
+on CPU under RAM_BUDGET_GB (LRU eviction). Switching models is a pointer swap plus a
+Silicon migration, never a reload from disk. FLUX components come from the shared
+component pool, so VAE and tokenizer exist once across variants.
 """
-DEUS: YOUR HELP IS NEEDED.
+import gc
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from core.carrier import carrier
+from core.vram import governor
+from core.loaders.hybrid_loader import hybrid_loader
+from core.loaders.component_pool import component_pool, module_bytes, disk_bytes
+from core.residency import working_set
+from core.decompose_engine import decompose_engine
+from core.startup import lazy_import
+
+torch = lazy_import("torch")
+
+logger = logging.getLogger("ASSET_EDITOR")
+
+RAM_BUDGET_GB = 50.0
+QWEN_PATH = "models/qwen-image-layered"
+
+
+def _tensor_bytes(pipes):
+    """Host bytes held by the given pipelines, counting shared storages once."""
+    seen = set()
+    return sum(module_bytes(comp, seen) for pipe in pipes for comp in getattr(pipe, "components", {}).values())
+
+
+class ResidentModel:
+    def __init__(self, key, kind, pipeline):
+        self.key = key
+        self.kind = kind            # "flux" | "qwen"
+        self.pipeline = pipeline
+        self.loaded_at = time.time()
+        self.last_used = self.loaded_at
+
 
 class ModelManager:
-    
\ No newline at end of file
+    """
+    RAM-Budgeted Residency Manager.
+    Keeps several pipelines resident in host RAM, tracks which one owns Silicon,
+    and evicts least-recently-used pipelines when the RAM budget is exceeded.
+
+    Locking: builds run under `_build_lock` only (one at a time, nothing else waits on
+    them). Every Silicon / active-pipeline change takes the strike lock (`carrier.strike()`)
+    first and then `_lock`, so it never lands under a running strike. `get_state` reads a
+    snapshot and takes neither.
+    """
+    def __init__(self, ram_budget_gb=RAM_BUDGET_GB):
+        self.ram_budget_gb = ram_budget_gb
+        self.resident = OrderedDict()   # key -> ResidentModel (LRU order)
+        self.current = None             # key owning the GPU
+        self.building = None            # key whose pipeline is being built
+        self._resident_bytes = 0
+        self._lock = threading.RLock()
+        self._build_lock = threading.Lock()
+        self._publish()
+
+    # --- ACCOUNTING ---
+    def _recount(self):
+        self._resident_bytes = _tensor_bytes([m.pipeline for m in self.resident.values()])
+        self._publish()
+
+    def _publish(self):
+        """Immutable snapshot for get_state (telemetry and /health never wait on a build or swap)."""
+        self._state = {
+            "current": self.current,
+            "building": self.building,
+            "resident": list(self.resident.keys()),
+            "resident_gb": round(self.resident_gb(), 2),
+            "budget_gb": self.ram_budget_gb,
+        }
+
+    def resident_gb(self):
+        return self._resident_bytes / 1e9
+
+    def set_budget(self, gb):
+        with carrier.strike(), self._lock:
+            self.ram_budget_gb = float(gb)
+            logger.info(f"[RAM] Residency Budget: {self.ram_budget_gb:.1f}GB")
+            self._enforce_budget()
+            return self.ram_budget_gb
+
+    def _enforce_budget(self, keep=(), incoming_bytes=0):
+        """Evict LRU pipelines until resident + `incoming_bytes` (a pending build) fits the budget."""
+        with self._lock:
+            self._recount()
+            budget = self.ram_budget_gb * 1e9 - incoming_bytes
+            while self.resident and self._resident_bytes > budget:
+                # Never the Silicon owner: it may be mid-strike (pre-build eviction runs outside the strike lock)
+                victim = next((k for k in self.resident if k not in keep and k != self.current), None)
+                if victim is None:
+                    logger.warning(f"[RAM] Over budget ({(self._resident_bytes + incoming_bytes) / 1e9:.1f}GB incl. pending build) but nothing evictable.")
+                    return
+                self._evict(victim)
+
+    def _evict(self, key):
+        entry = self.resident.pop(key)
+        if entry.kind == "flux" and hybrid_loader.pipeline is entry.pipeline:
+            hybrid_loader.pipeline, hybrid_loader.model_id = None, None
+        del entry
+        working_set.untrack(key)
+        decompose_engine.invalidate(key)
+        component_pool.release(key)  # Shared shards survive while another pipeline owns them
+        gc.collect()
+        self._recount()
+        logger.info(f"[RAM] Evicted {key.upper()} (LRU). Residency: {self.resident_gb():.1f}GB")
+
+    def _touch(self, key):
+        entry = self.resident[key]
+        entry.last_used = time.time()
+        self.resident.move_to_end(key)
+        return entry
+
+    def _resident_or_build(self, key, kind, build, estimate):
+        """Resident entry for `key`, building it first if needed. Only `_build_lock` is held while building."""
+        with self._lock:
+            if key in self.resident:
+                return self._touch(key)
+        with self._build_lock:
+            with self._lock:
+                if key in self.resident:
+                    return self._touch(key)  # A concurrent caller built it while we waited
+                incoming = estimate()
+                self._enforce_budget(keep=(key,), incoming_bytes=incoming)
+                self.building = key
+                self._publish()
+            logger.info(f"[RAM] Building {key.upper()} (~{incoming / 1e9:.1f}GB incoming) | Residency: {self.resident_gb():.1f}GB / {self.ram_budget_gb:.0f}GB")
+            try:
+                pipe = build()
+            finally:
+                with self._lock:
+                    self.building = None
+                    self._publish()
+            with self._lock:
+                entry = ResidentModel(key, kind, pipe)
+                self.resident[key] = entry
+                self._recount()
+        working_set.track(key, pipe)
+        return entry
+
+    # --- SILICON OWNERSHIP ---
+    def _yield_silicon(self, next_key):
+        """Move whatever owns the GPU back to host RAM (weights stay resident). Caller holds the strike lock."""
+        if self.current is None or self.current == next_key:
+            return
+        prev = self.resident.get(self.current)
+        if prev is not None:
+            if prev.kind == "flux":
+                carrier.evacuate()
+            else:
+                prev.pipeline.to("cpu")
+                carrier.clear_board()
+        logger.info(f"[VRAM] Silicon Yielded: {self.current.upper()} -> {next_key.upper()}")
+
+    # --- FLUX ---
+    def load_flux_model(self, model_size="4b", sampler_type="flow_euler", scheduler_type="linear"):
+        size = "9b" if "9b" in str(model_size).lower() else "4b"
+        key = f"flux-{size}"
+        with self._lock:
+            if self.current == key and key in self.resident and hybrid_loader.pipeline is self.resident[key].pipeline:
+                return self._touch(key).pipeline  # Already owns Silicon
+        start = time.time()
+        while True:
+            built = key not in self.resident
+            entry = self._resident_or_build(
+                key, "flux",
+                build=lambda: hybrid_loader.build_franklin_pipeline(model_id=size, sampler_type=sampler_type, scheduler_type=scheduler_type, owner=key),
+                estimate=lambda: hybrid_loader.estimate_bytes(size),
+            )
+            with carrier.strike(), self._lock:
+                if self.resident.get(key) is not entry:
+                    continue  # Evicted between build and activation (budget change): go again
+                if not built:
+                    logger.info(f"[RAM] {key.upper()} Resident. Swap in place.")
+                self._yield_silicon(key)
+                if hybrid_loader.pipeline is not entry.pipeline or self.current != key:
+                    carrier.invalidate_brain()
+                hybrid_loader.pipeline, hybrid_loader.model_id = entry.pipeline, size
+                self.current = key
+                governor.active_model = key
+                self._enforce_budget(keep=(key,))
+                logger.info(f"[SUCCESS] {key.upper()} Active in {time.time() - start:.2f}s | Residency: {self.resident_gb():.1f}GB / {self.ram_budget_gb:.0f}GB")
+                return entry.pipeline
+
+    def load_flux(self, model_size="4b"):
+        return self.load_flux_model(model_size=model_size)
+
+    @property
+    def _flux_pipe(self):
+        entry = self.resident.get(self.current) if self.current else None
+        return entry.pipeline if entry is not None and entry.kind == "flux" else None
+
+    def generate_image_with_flux(self, prompt, height=1024, width=1024, num_inference_steps=4, guidance_scale=1.0, seed=-1, sampler="flow_euler", scheduler="linear"):
+        """Carrier strike on the active FLUX variant. Returns a PIL image."""
+        size = self.current.split("-")[-1] if self._flux_pipe is not None else "4b"
+        image, _ = carrier.render(
+            prompt, model_id=size, height=height, width=width, steps=num_inference_steps,
+            guidance=guidance_scale, seed=seed, sampler=sampler, scheduler=scheduler
+        )
+        return image
+
+    # --- QWEN ---
+    def _build_qwen(self):
+        hybrid_loader.ensure_patched()
+        from diffusers import QwenImageLayeredPipeline
+        return QwenImageLayeredPipeline.from_pretrained(QWEN_PATH, torch_dtype=torch.bfloat16, low_cpu_mem_usage=True)
+
+    def load_qwen_model(self, model_size="7b"):
+        """Returns (pipeline, key). Pipeline is None if Qwen-Layered cannot be loaded."""
+        key = "qwen-layered"
+        while True:
+            try:
+                entry = self._resident_or_build(
+                    key, "qwen", build=self._build_qwen,
+                    estimate=lambda: disk_bytes(QWEN_PATH) if os.path.exists(QWEN_PATH) else 0,
+                )
+            except Exception as e:
+                logger.error(f"[ERROR] Qwen Manifold Fault: {e}")
+                return None, None
+            with carrier.strike(), self._lock:
+                if self.resident.get(key) is not entry:
+                    continue
+                self._yield_silicon(key)
+                if self.current != key:
+                    entry.pipeline.to("cuda")
+                self.current = key
+                governor.active_model = key
+                self._enforce_budget(keep=(key,))
+                return entry.pipeline, key
+
+    # --- PURGE ---
+    def offload_current(self, hard_purge=False):
+        """Soft: vacate Silicon, keep host residency. Hard: drop every resident model."""
+        if hard_purge:
+            return self.clear_all_models()
+        with carrier.strike(), self._lock:
+            if self.current:
+                self._yield_silicon("none")
+            self.current = None
+            governor.active_model = "NONE"
+            self._publish()
+
+    def clear_all_models(self):
+        with carrier.strike(), self._lock:
+            self.offload_current(hard_purge=False)
+            for key in list(self.resident):
+                working_set.untrack(key)
+                component_pool.release(key)
+            self.resident.clear()
+            self._resident_bytes = 0
+            hybrid_loader.pipeline, hybrid_loader.model_id = None, None
+            carrier.invalidate_brain()
+            decompose_engine.invalidate()
+            gc.collect()
+            carrier.clear_board()
+            self._publish()
+            logger.info("[RAM] Hard Purge: All Manifolds Released.")
+
+    def get_state(self):
+        """Lock-free: safe from the event loop and the telemetry sampler while a build or swap runs."""
+        state = dict(self._state)
+        state["pool"] = component_pool.get_state()
+        return state
+
+
+model_manager = ModelManager()
+working_set.guards = (carrier.strike_lock, model_manager._lock)
@@ -4,27 +4,82 @@ Qwen-Image-Layered endpoint for RGBA layer extraction
 """
 
 import uuid
-import torch
+import json
+import asyncio
 import warnings
 # Suppress Pydantic 'model_' protected namespace warnings
 warnings.filterwarnings("ignore", message='.*protected namespace "model_".*')
 
 from pathlib import Path
 from fastapi import APIRouter, UploadFile, File, Form
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from concurrent.futures import ThreadPoolExecutor
 from PIL import Image
 import io
+import os
+from core.decompose_engine import decompose_engine, DEFAULT_PRESET
+from core.source_cache import source_key
+from core.derivatives import derivatives
+from core.carrier import carrier
 
 router = APIRouter()
 
 OUTPUTS_DIR = Path(__file__).parent.parent / "outputs"
 
+# PNG encoding is zlib-bound and releases the GIL: fan layers out across threads.
+ENCODE_WORKERS = min(8, os.cpu_count() or 4)
+PNG_COMPRESS_LEVEL = 1      # Lossless either way; level 1 is several times faster than the default 6
+_encode_pool = ThreadPoolExecutor(max_workers=ENCODE_WORKERS, thread_name_prefix="layer-encode")
+
+
+def _save_original(session_dir, content, pil_image):
+    """Persist the upload byte-for-byte (no decode/re-encode round trip)."""
+    ext = (pil_image.format or "png").lower().replace("jpeg", "jpg")
+    name = f"original.{ext}"
+    (session_dir / name).write_bytes(content)
+    return name
+
+
+def _save_layer(session_dir, index, layer_img):
+    layer_img.save(session_dir / f"layer_{index}.png", compress_level=PNG_COMPRESS_LEVEL)
+    derivatives.submit(f"/outputs/{session_dir.name}/layer_{index}.png")
+    return index
+
+
+def _submit_layers(session_dir, layer_images):
+    """Queue every layer on the encode pool. Returns futures in completion-agnostic order."""
+    return [_encode_pool.submit(_save_layer, session_dir, i, img) for i, img in enumerate(layer_images)]
+
+
+def _prepare(layers):
+    return max(1, min(10, layers))
+
+
+def _run_decompose(pil_image, layers, preset, resolution, steps, refine_alpha, image_key):
+    """
+    Qwen activation + decompose as one strike: no FLUX swap or admin offload can move the
+    weights in between. None if the Qwen manifold cannot be loaded.
+    """
+    from model_manager import model_manager
+    with carrier.strike():
+        pipe, model_key = model_manager.load_qwen_model(model_size='7b')
+        if pipe is None:
+            return None
+        return decompose_engine.run(
+            pipe, pil_image, layers,
+            preset=preset, steps=steps, resolution=resolution,
+            refine_alpha=refine_alpha, image_key=image_key, model_key=model_key
+        )
+
 
 @router.post("/decompose")
 async def decompose_image(
     image: UploadFile = File(...),
     layers: int = Form(default=4),
-    resolution: int = Form(default=640)
+    resolution: int = Form(default=None),
+    preset: str = Form(default=DEFAULT_PRESET),
+    steps: int = Form(default=None),
+    refine_alpha: bool = Form(default=None)
 ):
     """
     Decompose an image into RGBA layers using Qwen-Image-Layered.
@@ -32,17 +87,17 @@ async def decompose_image(
     Args:
         image: Source image file
         layers: Number of layers to decompose (1-10)
-        resolution: Processing resolution (640 or 1024, 640 recommended)
+        resolution: Processing resolution (384-1024, 32-aligned). Defaults to the preset's.
+        preset: Speed preset (quality, balanced, fast, draft)
+        steps: Optional step-count override
+        refine_alpha: Decompose low-res, then refine alpha at source resolution
     
     Returns:
         JSON with session_id and layer URLs
     """
-    from model_manager import model_manager
-    
     try:
         # Validate
-        layers = max(1, min(10, layers))
-        resolution = 640 if resolution < 800 else 1024
+        layers = _prepare(layers)
         
         # Create session
         session_id = str(uuid.uuid4())[:8]
@@ -51,48 +106,77 @@ async def decompose_image(
         
         # Load image
         content = await image.read()
-        pil_image = Image.open(io.BytesIO(content)).convert("RGBA")
+        pil_image = Image.open(io.BytesIO(content))
         
-        # Save original
-        original_path = session_dir / "original.png"
-        pil_image.save(original_path)
+        # Save original (raw upload bytes)
+        original_name = _save_original(session_dir, content, pil_image)
+        pil_image = pil_image.convert("RGBA")
         
-        # Load Qwen (swap FLUX out if needed)
-        # Assuming model_manager will handle this via qwen_loader if updated
-        # For now, we'll try to get it if it exists or load 7b
-        pipe, _ = model_manager.load_qwen_model(model_size='7b') 
-        if pipe is None:
+        # Load Qwen (swap FLUX out if needed) and decompose
+        layer_images = await asyncio.to_thread(
+            _run_decompose, pil_image, layers, preset, resolution, steps, refine_alpha, source_key(content)
+        )
+        if layer_images is None:
             return JSONResponse({"error": "Failed to load Qwen manifold."}, status_code=500)
         
-        # Decompose (Official Qwen pattern from HuggingFace)
-        inputs = {
-            "image": pil_image,
-            "generator": torch.Generator(device="cuda").manual_seed(42),
-            "true_cfg_scale": 4.0,
-            "negative_prompt": " ",
-            "num_inference_steps": 50,
-            "num_images_per_prompt": 1,
-            "layers": layers,
-            "resolution": resolution,  # 640 recommended per docs
-            "cfg_normalize": True,
-            "use_en_prompt": True,  # Auto-caption in English
-        }
-        
-        with torch.inference_mode():
-            output = pipe(**inputs)
-        
-        # Save layers
-        layer_urls = []
-        for i, layer_img in enumerate(output.images[0]):
-            layer_path = session_dir / f"layer_{i}.png"
-            layer_img.save(layer_path)
-            layer_urls.append(f"/outputs/{session_id}/layer_{i}.png")
+        # Save layers (parallel PNG encode)
+        futures = _submit_layers(session_dir, layer_images)
+        await asyncio.gather(*(asyncio.wrap_future(f) for f in futures))
+        layer_urls = [f"/outputs/{session_id}/layer_{i}.png" for i in range(len(futures))]
         
         return JSONResponse({
             "session_id": session_id,
+            "original": f"/outputs/{session_id}/{original_name}",
             "layers": layer_urls,
             "count": len(layer_urls)
         })
     except Exception as e:
         print(f"[ERROR] decompose failed: {e}")
         return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@router.post("/decompose/stream")
+async def decompose_image_stream(
+    image: UploadFile = File(...),
+    layers: int = Form(default=4),
+    resolution: int = Form(default=None),
+    preset: str = Form(default=DEFAULT_PRESET),
+    steps: int = Form(default=None),
+    refine_alpha: bool = Form(default=None)
+):
+    """
+    Streaming variant of /decompose.
+    Emits NDJSON events over chunked HTTP: `session` immediately, one `layer` per RGBA
+    layer the moment its PNG is on disk, then `done` (or `error`).
+    """
+    layers = _prepare(layers)
+    session_id = str(uuid.uuid4())[:8]
+    session_dir = OUTPUTS_DIR / session_id
+    session_dir.mkdir(parents=True, exist_ok=True)
+    content = await image.read()
+
+    def event(payload):
+        return (json.dumps(payload) + "\n").encode("utf-8")
+
+    async def stream():
+        try:
+            pil_image = Image.open(io.BytesIO(content))
+            original_name = _save_original(session_dir, content, pil_image)
+            yield event({"event": "session", "session_id": session_id, "original": f"/outputs/{session_id}/{original_name}", "layers": layers, "preset": preset})
+
+            layer_images = await asyncio.to_thread(
+                _run_decompose, pil_image.convert("RGBA"), layers, preset, resolution, steps, refine_alpha, source_key(content)
+            )
+            if layer_images is None:
+                yield event({"event": "error", "error": "Failed to load Qwen manifold."})
+                return
+            pending = [asyncio.wrap_future(f) for f in _submit_layers(session_dir, layer_images)]
+            for done in asyncio.as_completed(pending):
+                i = await done
+                yield event({"event": "layer", "index": i, "url": f"/outputs/{session_id}/layer_{i}.png"})
+            yield event({"event": "done", "session_id": session_id, "count": len(pending)})
+        except Exception as e:
+            print(f"[ERROR] decompose stream failed: {e}")
+            yield event({"event": "error", "error": str(e)})
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -1,10 +1,10 @@
 """
 ASSET EDITOR - Generate Routes
-FLUX-KLEIN endpoints for txt2img, img2img, and inpaint
+FLUX-KLEIN endpoints for img2img and inpaint (txt2img lives in server.py)
 """
 
 import uuid
-import torch
+import asyncio
 import warnings
 # Suppress Pydantic 'model_' protected namespace warnings
 warnings.filterwarnings("ignore", message='.*protected namespace "model_".*')
@@ -14,9 +14,17 @@ from fastapi import APIRouter, UploadFile, File, Form
 from fastapi.responses import JSONResponse
 from PIL import Image, ImageOps
 import io
+from core.admission import admission, REJECT
+from core.source_cache import source_cache, source_key
+from core import inpaint_crop
+from core.derivatives import derivatives
+from core.carrier import carrier
+from core.startup import lazy_import
 import inspect
 import functools
 
+torch = lazy_import("torch")
+
 router = APIRouter()
 
 OUTPUTS_DIR = Path(__file__).parent.parent / "outputs"
@@ -28,6 +36,54 @@ VRAM_4B_BASE_GB = 8.1
 VRAM_9B_BASE_GB = 10.5
 VRAM_PER_MEGAPIXEL_GB = 1.2
 
+def _admission_rejection(plan):
+    """JSON response for a plan the admission gate refused (503 + Retry-After when queue-bound)."""
+    headers = {"Retry-After": str(plan.retry_after)} if plan.retry_after else None
+    return JSONResponse(
+        {"error": plan.reason, "admission": plan.as_dict()},
+        status_code=503 if plan.retry_after else 507,
+        headers=headers
+    )
+
+
+def _run_pipe(pipe, **kwargs):
+    """Pipeline call for worker threads (keeps the event loop free while queued strikes wait)."""
+    with torch.inference_mode():
+        return pipe(**kwargs)
+
+
+async def _resolve_source(image, source_id):
+    """Upload -> (source_id, PIL). A known source_id skips both the upload and the decode."""
+    if image is not None:
+        content = await image.read()
+        return source_cache.put(content)
+    if source_id:
+        cached = source_cache.get(source_id)
+        if cached is not None:
+            return source_id, cached
+    return None, None
+
+
+def _run_cached_edit(source_id, image, mask_id=None, mask_image=None, **kwargs):
+    """
+    Worker-thread strike that reuses cached source artefacts when the pipeline allows.
+    Runs under the carrier's strike lock: the active FLUX pipeline (4B if none) is resolved
+    there, so no swap or offload can move it mid-edit.
+    """
+    from model_manager import model_manager
+    with carrier.strike():
+        pipe = model_manager._flux_pipe or model_manager.load_flux("4b")
+        if mask_image is None:
+            # The pipeline gets PIL and preprocesses it; its VAE encode hits the latent cache when hooked
+            kwargs["image"] = image
+            with source_cache.bind(source_id if source_cache.caches_latents(pipe) else None):
+                return _run_pipe(pipe, **kwargs)
+        # Inpaint derives masked-image latents from pixels; hand it the cached pixel tensor.
+        kwargs["image"] = source_cache.pixels(pipe, source_id, image)
+        kwargs["mask_image"] = source_cache.mask(pipe, mask_id, mask_image, image.width, image.height)
+        return _run_pipe(pipe, **kwargs)
+
+
 def estimate_vram_usage(width: int, height: int, is_9b: bool = False) -> float:
     """Estimate total VRAM usage for a generation at given resolution."""
     megapixels = (width * height) / 1_000_000
@@ -38,79 +94,6 @@ def estimate_vram_usage(width: int, height: int, is_9b: bool = False) -> float:
     return round(estimated, 2)
 
 
-@router.post("/txt2img")
-async def text_to_image(
-    prompt: str = Form(...),
-    width: int = Form(default=1024),
-    height: int = Form(default=1024),
-    steps: int = Form(default=4),
-    guidance: float = Form(default=1.0),
-    sampler: str = Form(default="euler"),
-    scheduler: str = Form(default="standard"),
-    seed: int = Form(default=-1),
-    model_variant: str = Form(default="flux-4b"),
-    vram_budget: float = Form(default=14.5)
-):
-    """Generate image from text prompt using FLUX.2-Klein Sovereign Dispatch."""
-    from model_manager import model_manager
-    
-    # identify requested variant
-    is_9b = "9b" in model_variant.lower()
-    model_size = "9b" if is_9b else "4b"
-    
-    try:
-        # 1. ENSURE LOADED
-        if not model_manager.current or model_size not in model_manager.current:
-            print(f"[VRAM] Auto-Negotiating {model_size} Manifold...")
-            model_manager.load_flux_model(model_size=model_size)
-
-        # 2. GENERATE
-        # Seed logic
-        if seed < 0:
-            import random
-            seed = random.randint(0, 2**32 - 1)
-
-        print(f"[CARRIER] Dispatching Sovereign Request: {width}x{height} | {steps} steps")
-        
-        # Execute via Carrier
-        image = model_manager.generate_image_with_flux(
-            prompt=prompt,
-            height=height,
-            width=width,
-            num_inference_steps=steps,
-            guidance_scale=guidance,
-            seed=seed
-        )
-
-        # 3. PERSISTENCE
-        session_id = str(uuid.uuid4())[:8]
-        session_dir = OUTPUTS_DIR / session_id
-        session_dir.mkdir(parents=True, exist_ok=True)
-        
-        output_path = session_dir / "generated.png"
-        image.save(output_path)
-        
-        print(f"[VRAM] Generation Cycle Complete. Image persisted to {session_id}")
-
-        return JSONResponse({
-            "session_id": session_id,
-            "image": f"/outputs/{session_id}/generated.png",
-            "seed": seed,
-            "model": model_manager.current,
-            "status": "success"
-        })
-
-    except torch.cuda.OutOfMemoryError:
-        print("[VRAM] CRITICAL: Silicon Exhaustion. Purging Manifold.")
-        model_manager.clear_all_models()
-        return JSONResponse({"error": "VRAM Exhaustion. Manifold Reset."}, status_code=507)
-    except Exception as e:
-        import traceback
-        print(f"[ERROR] Sovereign Dispatch Failed: {e}")
-        traceback.print_exc()
-        return JSONResponse({"error": str(e)}, status_code=500)
-
-
 def set_scheduler(pipe, sampler_name: str, scheduler_mode: str = "standard", width: int = 1024, height: int = 1024, steps: int = 4):
     from diffusers import FlowMatchEulerDiscreteScheduler
     
@@ -160,43 +143,56 @@ def set_scheduler(pipe, sampler_name: str, scheduler_mode: str = "standard", wid
     return pipe
 
 
+@router.post("/sources")
+async def upload_source(image: UploadFile = File(...)):
+    """Register a source canvas once; later edits reference it by source_id."""
+    source_id, pil_image = await _resolve_source(image, None)
+    return JSONResponse({"source_id": source_id, "width": pil_image.width, "height": pil_image.height, "mode": pil_image.mode})
+
+
 @router.post("/img2img")
 async def image_to_image(
-    image: UploadFile = File(...),
+    image: UploadFile = File(None),
+    source_id: str = Form(default=None),
     prompt: str = Form(...),
     strength: float = Form(default=0.75),
     steps: int = Form(default=4),
     guidance: float = Form(default=4.0),
     seed: int = Form(default=-1)
 ):
-    """Transform image based on prompt."""
+    """Transform image based on prompt. Pass `source_id` instead of `image` to reuse a cached source."""
     from model_manager import model_manager as swapper
-    
-    if swapper.current and swapper.current.startswith("flux-"):
-        pipe = swapper._flux_pipe
-    else:
-        pipe = swapper.load_flux("4b")
-    
-    # Load image
-    content = await image.read()
-    pil_image = Image.open(io.BytesIO(content)).convert("RGB")
+
+    # Load image (cached by content hash)
+    source_id, pil_image = await _resolve_source(image, source_id)
+    if pil_image is None:
+        return JSONResponse({"error": "Unknown or missing source. Upload an image or a valid source_id."}, status_code=404)
+    pil_image = pil_image.convert("RGB")
     
     # Seed
     if seed < 0:
         seed = torch.randint(0, 2**32, (1,)).item()
     generator = torch.Generator(device="cuda").manual_seed(seed)
     
+    plan = admission.plan(*pil_image.size, steps)
+    if plan.decision == REJECT:
+        return _admission_rejection(plan)
+    if plan.upscale:
+        pil_image = pil_image.resize((plan.width, plan.height), Image.LANCZOS)
+
     # Generate
     try:
-        with torch.inference_mode():
-            result = pipe(
+        async with admission.slot(plan):
+            result = await asyncio.to_thread(
+                _run_cached_edit, source_id, pil_image,
                 prompt=prompt,
-                image=pil_image,
                 strength=strength,
                 guidance_scale=guidance,
                 num_inference_steps=steps,
                 generator=generator
             )
+        if plan.upscale:
+            result.images[0] = result.images[0].resize((plan.target_width, plan.target_height), Image.LANCZOS)
         
         # Save
         session_id = str(uuid.uuid4())[:8]
@@ -205,6 +201,7 @@ async def image_to_image(
         
         output_path = session_dir / "edited.png"
         result.images[0].save(output_path)
+        derivatives.submit(f"/outputs/{session_id}/{output_path.name}")
         
         # Sanitization Protocol: Purge cache
         torch.cuda.empty_cache()
@@ -214,48 +211,55 @@ async def image_to_image(
         return JSONResponse({
             "session_id": session_id,
             "image": f"/outputs/{session_id}/edited.png",
+            "source_id": source_id,
             "seed": seed
         })
     except torch.cuda.OutOfMemoryError:
-        print("[VRAM] CRITICAL: OutOfMemoryError in img2img. Purging Manifold.")
-        swapper.offload_current(hard_purge=True)
-        return JSONResponse({"error": "GPU Memory Exhaustion during Edit. Reservoir Purged."}, status_code=507)
+        print("[VRAM] CRITICAL: OutOfMemoryError in img2img. Evacuating to Host RAM.")
+        admission.record_oom(plan)
+        await asyncio.to_thread(swapper.offload_current, hard_purge=False)
+        return JSONResponse({"error": "GPU Memory Exhaustion during Edit. Host Residency Preserved."}, status_code=503, headers={"Retry-After": "1"})
 
 
 @router.post("/inpaint")
 async def inpaint_image(
-    image: UploadFile = File(...),
+    image: UploadFile = File(None),
+    source_id: str = Form(default=None),
     mask: UploadFile = File(None),
     prompt: str = Form(...),
     strength: float = Form(default=0.85),
     steps: int = Form(default=4),
     guidance: float = Form(default=4.0),
     seed: int = Form(default=-1),
-    use_alpha_mask: bool = Form(default=True)
+    use_alpha_mask: bool = Form(default=True),
+    crop_to_mask: bool = Form(default=True),
+    crop_padding: int = Form(default=inpaint_crop.DEFAULT_PADDING),
+    feather: int = Form(default=inpaint_crop.DEFAULT_FEATHER)
 ):
     """
     Inpaint masked region of image.
     
     If use_alpha_mask=True and no mask provided, extracts mask from alpha channel.
+    Pass `source_id` instead of `image` to reuse a cached source.
+    With crop_to_mask=True only the padded mask bounding box is denoised (at a bucket
+    resolution) and composited back with a feathered seam.
     """
     from model_manager import model_manager as swapper
-    
-    if swapper.current and swapper.current.startswith("flux-"):
-        pipe = swapper._flux_pipe
-    else:
-        pipe = swapper.load_flux("4b")
-    
-    # Load source image
-    content = await image.read()
-    pil_image = Image.open(io.BytesIO(content))
+
+    # Load source image (cached by content hash)
+    source_id, pil_image = await _resolve_source(image, source_id)
+    if pil_image is None:
+        return JSONResponse({"error": "Unknown or missing source. Upload an image or a valid source_id."}, status_code=404)
     
     # Handle mask
     if mask:
         # Manual mask provided
         mask_content = await mask.read()
+        mask_id = source_key(mask_content)
         mask_image = Image.open(io.BytesIO(mask_content)).convert("L")
     elif use_alpha_mask and pil_image.mode == "RGBA":
         # Auto mask from alpha channel
+        mask_id = f"{source_id}:alpha"
         mask_image = pil_image.split()[3]
         mask_image = ImageOps.invert(mask_image)
     else:
@@ -263,24 +267,45 @@ async def inpaint_image(
     
     # Convert to RGB for pipeline
     rgb_image = pil_image.convert("RGB")
+    mask_image = inpaint_crop.match_canvas(mask_image, rgb_image.size)
+    canvas_image, canvas_mask = rgb_image, mask_image
+
+    # Crop Mode: denoise only the edited region
+    crop = inpaint_crop.plan_crop(mask_image, max(0, crop_padding)) if crop_to_mask else None
+    if crop is not None:
+        rgb_image, mask_image = inpaint_crop.crop_inputs(rgb_image, mask_image, crop)
+        source_id = f"{source_id}@{','.join(map(str, crop.box))}"
+        mask_id = f"{mask_id}@{','.join(map(str, crop.box))}"
     
     # Seed
     if seed < 0:
         seed = torch.randint(0, 2**32, (1,)).item()
     generator = torch.Generator(device="cuda").manual_seed(seed)
     
+    plan = admission.plan(*rgb_image.size, steps)
+    if plan.decision == REJECT:
+        return _admission_rejection(plan)
+    if plan.upscale:
+        rgb_image = rgb_image.resize((plan.width, plan.height), Image.LANCZOS)
+        mask_image = mask_image.resize((plan.width, plan.height), Image.BILINEAR)
+
     # Inpaint
     try:
-        with torch.inference_mode():
-            result = pipe(
-                prompt=prompt,
-                image=rgb_image,
+        async with admission.slot(plan):
+            result = await asyncio.to_thread(
+                _run_cached_edit, source_id, rgb_image,
+                mask_id=mask_id,
                 mask_image=mask_image,
+                prompt=prompt,
                 strength=strength,
                 guidance_scale=guidance,
                 num_inference_steps=steps,
                 generator=generator
             )
+        if plan.upscale:
+            result.images[0] = result.images[0].resize((plan.target_width, plan.target_height), Image.LANCZOS)
+        if crop is not None:
+            result.images[0] = inpaint_crop.composite(canvas_image, result.images[0], canvas_mask, crop, feather=max(0, feather))
         
         # Save
         session_id = str(uuid.uuid4())[:8]
@@ -289,6 +314,7 @@ async def inpaint_image(
         
         output_path = session_dir / "inpainted.png"
         result.images[0].save(output_path)
+        derivatives.submit(f"/outputs/{session_id}/{output_path.name}")
         
         # Sanitization Protocol: Purge cache
         torch.cuda.empty_cache()
@@ -298,9 +324,12 @@ async def inpaint_image(
         return JSONResponse({
             "session_id": session_id,
             "image": f"/outputs/{session_id}/inpainted.png",
+            "source_id": source_id.split("@")[0],
+            "crop": crop.as_dict() if crop is not None else None,
             "seed": seed
         })
     except torch.cuda.OutOfMemoryError:
-        print("[VRAM] CRITICAL: OutOfMemoryError in inpaint. Purging Manifold.")
-        swapper.offload_current(hard_purge=True)
-        return JSONResponse({"error": "GPU Memory Exhaustion during Inpaint. Reservoir Purged."}, status_code=507)
+        print("[VRAM] CRITICAL: OutOfMemoryError in inpaint. Evacuating to Host RAM.")
+        admission.record_oom(plan)
+        await asyncio.to_thread(swapper.offload_current, hard_purge=False)
+        return JSONResponse({"error": "GPU Memory Exhaustion during Inpaint. Host Residency Preserved."}, status_code=503, headers={"Retry-After": "1"})
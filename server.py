@@ -1,11 +1,11 @@
 import os
-import torch
 import logging
 import asyncio
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Form, APIRouter
-from fastapi.staticfiles import StaticFiles
+from contextlib import asynccontextmanager
+from core.startup import startup_profile, lazy_import, IMPORT_BUDGET_S
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, Form, APIRouter, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, JSONResponse
 from pydantic import BaseModel
 import uvicorn
 
@@ -15,8 +15,23 @@ from core.logger_config import setup_asset_editor_logging
 from core.logger_config import setup_asset_editor_logging
 from core.carrier import carrier
 from core.vram import governor
+from core.admission import admission, REJECT
+from core.telemetry import broadcaster
+from core.source_cache import source_cache
+from core.workers import worker_pool
+from core.result_cache import result_cache
+from core.buckets import snap, latent_buffers
+from core.batch import batch_manager, parse_manifest
+from core.static_assets import FingerprintedStatic, OutputFiles, IMMUTABLE
+from core.derivatives import derivatives, pyramid_key
+from core.residency import working_set
+from core.profiling import profiler
 from core.loaders.hybrid_loader import hybrid_loader
+from model_manager import model_manager
+from routes import generate as generate_routes, decompose as decompose_routes
 
+torch = lazy_import("torch")  # Only needed on fault paths; the ML stack loads on the first pipeline build
+startup_profile.mark("server_imported")
 
 # Initialize Asset Editor Signal Manifold
 setup_asset_editor_logging()
@@ -24,6 +39,48 @@ logger = logging.getLogger("ASSET_EDITOR")
 
 app = FastAPI(title="Asset Editor | Zerodrag", description="Sovereign Image Editor")
 
+broadcaster.register_source("carrier", carrier.get_state)
+broadcaster.register_source("queue", admission.get_state)
+broadcaster.register_source("sources", source_cache.get_state)
+broadcaster.register_source("residency", model_manager.get_state)
+broadcaster.register_source("workers", worker_pool.get_state)
+broadcaster.register_source("results", result_cache.get_state)
+broadcaster.register_source("buffers", latent_buffers.get_state)
+broadcaster.register_source("derivatives", derivatives.get_state)
+broadcaster.register_source("working_set", working_set.get_state)
+broadcaster.register_source("batches", lambda: [j.get_state() for j in batch_manager.jobs.values() if j.status == "running"])
+
+# --- WORKER POOL MODE ---
+# ASSET_WORKERS=auto -> one carrier process per GPU; ASSET_WORKERS=<n> -> n processes.
+WORKER_MODE = os.environ.get("ASSET_WORKERS", "").strip().lower()
+
+@app.on_event("startup")
+async def report_startup():
+    startup_profile.mark("app_ready")
+    import_s = startup_profile.since("server_imported") - startup_profile.boot_offset
+    if import_s > IMPORT_BUDGET_S:
+        logger.warning(f"[STARTUP] Server import took {import_s:.2f}s (budget {IMPORT_BUDGET_S:.2f}s). Something heavy is back on the boot path.")
+
+@app.on_event("startup")
+async def start_working_set():
+    working_set.start()
+
+@app.on_event("startup")
+async def start_workers():
+    if WORKER_MODE in ("", "0", "off"):
+        return
+    try:
+        count = worker_pool.start(None if WORKER_MODE == "auto" else int(WORKER_MODE), loop=asyncio.get_running_loop())
+    except RuntimeError as e:
+        logger.error(f"[WORKERS] {e} Serving in-process.")
+        return
+    admission.max_concurrent = count
+
+@app.on_event("shutdown")
+async def stop_workers():
+    if worker_pool.enabled:
+        worker_pool.stop()
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -37,22 +94,26 @@ api_router = APIRouter(prefix="/api")
 
 @api_router.get("/health")
 async def health():
-    return {"status": "Asset Editor Online", "governor": governor.get_telemetry()}
+    return {"status": "Asset Editor Online", "governor": governor.get_telemetry(), "admission": admission.get_state(), "residency": model_manager.get_state()}
+
+@api_router.get("/startup")
+async def startup_report():
+    return startup_profile.report()
 
 @api_router.post("/preload")
 async def preload(model: str = "flux-4b"):
     logger.info(f"[SYSTEM] Preload Sequence Initiated | Target: {model.upper()}")
     try:
-        # Route to 4B Sovereign
-        model_id = "4b"
-        hybrid_loader.build_franklin_pipeline(model_id=model_id, precision="fp16")
-        governor.active_model = "flux-4b"
+        # Resident swap (RAM) or first build via the Model Manager
+        model_id = "9b" if "9b" in model.lower() else "4b"
+        await asyncio.to_thread(model_manager.load_flux_model, model_size=model_id)
         
         return {
             "status": "success", 
             "model": model,
             "loaded": True,
-            "vram_governor": governor.get_telemetry()
+            "vram_governor": governor.get_telemetry(),
+            "residency": model_manager.get_state()
         }
     except Exception as e:
         logger.error(f"Preload Fault: {e}")
@@ -61,17 +122,67 @@ async def preload(model: str = "flux-4b"):
 @api_router.post("/offload")
 async def offload():
     logger.info("[SYSTEM] Offload Sequence Initiated.")
-    # Purge Both Manifolds
-    carrier.clear_board()
+    # Vacate Silicon; host residency is kept for instant re-activation (waits for a running strike)
+    await asyncio.to_thread(model_manager.offload_current, hard_purge=False)
+    return {"status": "success", "message": "Silicon Purged (Global)", "residency": model_manager.get_state()}
+
+@api_router.post("/purge")
+async def purge():
+    logger.info("[SYSTEM] Hard Purge Sequence Initiated.")
+    await asyncio.to_thread(model_manager.clear_all_models)
+    return {"status": "success", "message": "Host Residency Released", "residency": model_manager.get_state()}
+
+@api_router.get("/residency/working-set")
+async def host_working_set():
+    """Resident vs swapped host bytes per component (fresh audit) and recent eviction alerts."""
+    await asyncio.to_thread(working_set.audit)
+    return working_set.get_state()
 
-    governor.active_model = "NONE"
-    return {"status": "success", "message": "Silicon Purged (Global)"}
+@api_router.post("/residency/budget")
+async def set_ram_budget(budget_gb: float = Form(50.0)):
+    budget = await asyncio.to_thread(model_manager.set_budget, budget_gb)
+    return {"status": "success", "budget_gb": budget, "residency": model_manager.get_state()}
 
 @api_router.post("/governor/limit")
 async def set_vram_limit(limit_percent: float = Form(95.0)):
     governor.set_limit(limit_percent)
     return {"status": "success", "limit": float(limit_percent), "budget_gb": governor.get_budget_gb()}
 
+@api_router.get("/workers")
+async def workers():
+    return worker_pool.get_state()
+
+@api_router.post("/telemetry/rate")
+async def set_telemetry_rate(hz: float = Form(4.0)):
+    return {"status": "success", "sample_hz": broadcaster.set_rate(hz), "broadcast": broadcaster.get_state()}
+
+# --- PROFILER (admin) ---
+@api_router.post("/profile/arm")
+async def profile_arm(count: int = Form(1), memory: bool = Form(True)):
+    """Capture the next `count` dispatches: Chrome trace + memory timeline under /outputs/profiles/."""
+    state = profiler.arm(count, memory=memory)
+    if worker_pool.enabled:
+        state["warning"] = "Worker pool active: strikes run in worker processes and are not captured by this process."
+    return {"status": "success", "profiler": state}
+
+@api_router.post("/profile/disarm")
+async def profile_disarm():
+    return {"status": "success", "profiler": profiler.disarm()}
+
+@api_router.get("/profile")
+async def profile_state():
+    return profiler.get_state()
+
+@api_router.post("/preencode")
+async def preencode(prompt: str = Form(...)):
+    """Speculative Brain pass while the user types. Low priority: yields to any queued or running strike."""
+    if worker_pool.enabled:
+        return {"status": "skipped", "reason": "worker pool"}
+    queue = admission.get_state()
+    if queue["in_flight"] or queue["waiting"]:
+        return {"status": "busy"}
+    return {"status": await asyncio.to_thread(carrier.pre_encode, prompt)}
+
 @api_router.post("/txt2img")
 async def txt2img(
     prompt: str = Form(...),
@@ -82,56 +193,216 @@ async def txt2img(
     seed: int = Form(-1),
     target_model: str = Form("flux-4b", alias="model_variant"),
     sampler: str = Form("flow_euler"),
-    scheduler: str = Form("linear")
+    scheduler: str = Form("linear"),
+    hires: str = Form("auto")
 ):
     if isinstance(prompt, list): prompt = prompt[0]
+    hires = "auto" if hires.lower() == "auto" else hires.lower() in ("1", "true", "on", "yes")
     logger.info(f"[DATA] Inference Request Received | Target: {target_model} | {prompt[:40]}... | Sampler: {sampler} | Scheduler: {scheduler}")
+
+    m_id = "4b"
+
+    # --- RESOLUTION BUCKET: recurring shapes keep the allocator and buffer pool warm ---
+    requested = [width, height]
     try:
-        # ROUTING LOGIC
-        m_id = "4b"
-        result = carrier.dispatch(
-            prompt=str(prompt),
-            model_id=m_id,
-            height=height,
-            width=width,
-            steps=steps,
-            guidance=guidance,
-            seed=seed,
-            sampler=sampler,
-            scheduler=scheduler
+        bucket = snap(width, height)
+    except ValueError as e:
+        return JSONResponse({"status": "error", "message": str(e), "requested": requested}, status_code=400)
+    if bucket != (width, height):
+        logger.info(f"[BUCKETS] Snapped {width}x{height} -> {bucket[0]}x{bucket[1]}")
+    width, height = bucket
+
+    # --- RESULT CACHE: fixed-seed requests are deterministic ---
+    cache_key = result_cache.key(prompt, seed, width, height, steps, guidance, sampler, scheduler, model_id=m_id, hires=hires)
+    cached = await asyncio.to_thread(result_cache.get, cache_key) if cache_key else None
+    if cached is not None:
+        logger.info(f"[CACHE] Result Hit: {cached['path']} (saved {cached.get('time', 0.0):.1f}s)")
+        return {
+            "status": "success",
+            "image": cached["path"],
+            "width": width,
+            "height": height,
+            "requested": requested,
+            "model": target_model.upper(),
+            "cached": True,
+            "telemetry": governor.get_telemetry()
+        }
+
+    # --- ADMISSION GATE ---
+    plan = admission.plan(width, height, steps, model_id=m_id)
+    logger.info(f"[ADMISSION] {plan.decision.upper()} | {plan.vram_gb:.2f}GB | ETA {plan.eta_s:.1f}s {plan.reason}")
+    if plan.decision == REJECT:
+        headers = {"Retry-After": str(plan.retry_after)} if plan.retry_after else None
+        return JSONResponse(
+            {"status": "error", "message": plan.reason, "admission": plan.as_dict()},
+            status_code=503 if plan.retry_after else 507,
+            headers=headers
         )
+
+    async def strike():
+        async with admission.slot(plan):
+            # ROUTING LOGIC: worker fleet (residency-affine) or the in-process carrier
+            run = worker_pool.submit if worker_pool.enabled else (lambda **k: asyncio.to_thread(carrier.dispatch, **k))
+            result = await run(
+                prompt=str(prompt),
+                model_id=m_id,
+                height=plan.height,
+                width=plan.width,
+                steps=steps,
+                guidance=guidance,
+                seed=seed,
+                sampler=sampler,
+                scheduler=scheduler,
+                target_height=plan.target_height,
+                target_width=plan.target_width,
+                hires=hires
+            )
+        admission.observe(plan, result.get("time", 0.0), steps, peak_gb=result.get("peak_gb"), model_id=m_id)
+        return result
+
+    try:
+        # Identical in-flight requests share one strike
+        result, coalesced = await result_cache.run(cache_key, strike, store=not plan.upscale)
         
         telemetry = governor.get_telemetry()
         return {
             "status": "success", 
             "image": result.get("path", "/outputs/latest.png"),
+            "width": plan.target_width,
+            "height": plan.target_height,
+            "requested": requested,
             "model": target_model.upper(),
             "vram_used": telemetry["gpu"]["used"],
+            "cached": coalesced,
+            "passes": result.get("passes"),
+            "admission": plan.as_dict(),
             "telemetry": telemetry
         }
+    except torch.cuda.OutOfMemoryError as e:
+        # Carrier already evacuated to host RAM; residency survives. Recalibrate and back off.
+        admission.record_oom(plan)
+        logger.error(f"Inference Fault (OOM): {e}")
+        return JSONResponse(
+            {"status": "error", "message": "VRAM Exhaustion. Host Residency Preserved.", "admission": plan.as_dict()},
+            status_code=503,
+            headers={"Retry-After": "1"}
+        )
     except Exception as e:
         import traceback
         logger.error(f"Inference Fault: {e}")
         logger.error(traceback.format_exc())
         return {"status": "error", "message": str(e)}
 
+# --- BATCH JOBS ---
+@asynccontextmanager
+async def _batch_slot(item):
+    """
+    Batch items queue through the same admission gate as interactive strikes and render at
+    the planned size. They wait out a deep queue instead of being refused; an item that can
+    never fit the VRAM budget fails on its own.
+    """
+    plan = admission.plan(item["width"], item["height"], item["steps"], model_id=item["model"], background=True)
+    if plan.decision == REJECT:
+        raise RuntimeError(f"Admission rejected: {plan.reason}")
+    async with admission.slot(plan):
+        yield plan
+
+@api_router.post("/batch")
+async def batch_submit(manifest: UploadFile = File(...), fmt: str = Form(None)):
+    raw = await manifest.read()
+    if fmt is None and manifest.filename:
+        fmt = "csv" if manifest.filename.lower().endswith(".csv") else "jsonl"
+    try:
+        items = parse_manifest(raw.decode("utf-8"), fmt)
+    except (ValueError, KeyError) as e:
+        return JSONResponse(status_code=400, content={"status": "error", "message": f"Manifest rejected: {e}"})
+    job = batch_manager.submit(items, slot=_batch_slot)
+    logger.info(f"[BATCH] Job {job.id} accepted: {len(items)} item(s)")
+    return {"status": "success", "job": job.get_state()}
+
+@api_router.get("/batch")
+async def batch_list():
+    return {"jobs": batch_manager.list()}
+
+@api_router.get("/batch/{job_id}")
+async def batch_status(job_id: str):
+    job = batch_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Unknown batch job"})
+    return job.get_state()
+
+@api_router.post("/batch/{job_id}/resume")
+async def batch_resume(job_id: str):
+    job = batch_manager.resume(job_id, slot=_batch_slot)
+    if job is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Unknown batch job"})
+    return {"status": "success", "job": job.get_state()}
+
+@api_router.post("/batch/{job_id}/cancel")
+async def batch_cancel(job_id: str):
+    job = batch_manager.get(job_id)
+    if job is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Unknown batch job"})
+    job.cancel()
+    return {"status": "success", "job": job.get_state()}
+
+# --- OUTPUT DERIVATIVES (thumbnail + WebP tile pyramid for the viewport) ---
+@api_router.get("/pyramid")
+async def pyramid(src: str):
+    key = pyramid_key(src)
+    meta = await asyncio.to_thread(derivatives.ensure, key) if key else None
+    if meta is None:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "No derivatives for this source"})
+    return {
+        **meta,
+        "thumb": f"/api/tiles/{key}/thumb.webp",
+        "tiles": f"/api/tiles/{key}/{{level}}/{{col}}_{{row}}.webp",
+    }
+
+@api_router.get("/tiles/{key:path}/thumb.webp")
+async def pyramid_thumb(key: str):
+    return await _derivative_file(key, derivatives.thumb_path)
+
+@api_router.get("/tiles/{key:path}/{level}/{tile}.webp")
+async def pyramid_tile(key: str, level: int, tile: str):
+    try:
+        col, row = (int(v) for v in tile.split("_"))
+    except ValueError:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Bad tile address"})
+    return await _derivative_file(key, lambda k: derivatives.tile_path(k, level, col, row))
+
+async def _derivative_file(key, locate):
+    if pyramid_key(key) != key:
+        return JSONResponse(status_code=404, content={"status": "error", "message": "Unknown source"})
+    path = locate(key)
+    if not os.path.exists(path):
+        # Not built yet (or still queued): join/trigger the build instead of 404ing the viewport
+        await asyncio.to_thread(derivatives.ensure, key)
+        if not os.path.exists(path):
+            return JSONResponse(status_code=404, content={"status": "error", "message": "Tile out of range"})
+    return FileResponse(path, media_type="image/webp", headers={"Cache-Control": IMMUTABLE})
+
+# --- EDIT / DECOMPOSE ROUTES ---
+# /img2img, /inpaint, /sources, /decompose(/stream). The /txt2img above (result cache, hi-res,
+# worker pool) is registered first and takes precedence over routes.generate's.
+api_router.include_router(generate_routes.router)
+api_router.include_router(decompose_routes.router)
+
 app.include_router(api_router)
 
 @app.websocket("/ws/telemetry")
-async def telemetry_stream(websocket: WebSocket):
+async def telemetry_stream(websocket: WebSocket, hz: float = 2.0):
     await websocket.accept()
     try:
-        while True:
-            status = governor.get_telemetry()
-            await websocket.send_json(status)
-            await asyncio.sleep(0.5)
+        await broadcaster.serve(websocket, hz=hz)
     except (WebSocketDisconnect, Exception):
         pass
 
 # --- STATIC ASSET SERVING ---
+# Fingerprinted + precompressed UI, immutable write-once outputs
 os.makedirs("outputs", exist_ok=True)
-app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
-app.mount("/", StaticFiles(directory="static", html=True), name="static")
+app.mount("/outputs", OutputFiles(directory="outputs"), name="outputs")
+app.mount("/", FingerprintedStatic(directory="static", html=True), name="static")
 
 if __name__ == "__main__":
     print("ASSET EDITOR INITIALIZED")
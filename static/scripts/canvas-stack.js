@@ -41,36 +41,44 @@ const CanvasStack = {
       z-index: ${index};
     `;
 
-        const ctx = canvas.getContext('2d');
-        const img = new Image();
-
-        await new Promise((resolve, reject) => {
-            img.onload = () => {
-                canvas.width = img.width;
-                canvas.height = img.height;
-
-                // Update container size to match first layer
-                if (index === 0) {
-                    this.container.style.width = `${img.width}px`;
-                    this.container.style.height = `${img.height}px`;
-                }
-
-                ctx.drawImage(img, 0, 0);
-                resolve();
-            };
-            img.onerror = reject;
-            img.src = imageUrl;
-        });
+        // Tiled outputs: size from the pyramid, thumbnail first, then visible tiles only
+        const pyramid = await TilePyramid.load(imageUrl);
+
+        if (pyramid) {
+            canvas.width = pyramid.width;
+            canvas.height = pyramid.height;
+            if (index === 0) {
+                this.container.style.width = `${pyramid.width}px`;
+                this.container.style.height = `${pyramid.height}px`;
+            }
+            await TilePyramid.drawThumb(canvas, pyramid).catch(() => { });
+        } else {
+            const ctx = canvas.getContext('2d');
+            const img = await TilePyramid.loadImage(imageUrl);
+            canvas.width = img.width;
+            canvas.height = img.height;
+
+            // Update container size to match first layer
+            if (index === 0) {
+                this.container.style.width = `${img.width}px`;
+                this.container.style.height = `${img.height}px`;
+            }
+
+            ctx.drawImage(img, 0, 0);
+        }
 
         this.container.appendChild(canvas);
 
         this.layers.push({
             index,
             url: imageUrl,
+            thumb: pyramid ? pyramid.thumb : imageUrl,
             canvas,
+            pyramid,
             visible: true
         });
 
+        this.refreshTiles();
         this.updateLayerList();
         return canvas;
     },
@@ -90,6 +98,7 @@ const CanvasStack = {
         if (layer) {
             layer.visible = !layer.visible;
             layer.canvas.style.opacity = layer.visible ? '1' : '0';
+            this.refreshTiles();
             this.updateLayerList();
         }
     },
@@ -98,15 +107,40 @@ const CanvasStack = {
         return this.layers[this.selectedIndex] || null;
     },
 
-    getLayerBlob(index) {
+    async getLayerBlob(index) {
         const layer = this.layers[index];
         if (!layer) return null;
 
+        await this.ensureFull(layer);
         return new Promise(resolve => {
             layer.canvas.toBlob(resolve, 'image/png');
         });
     },
 
+    refreshTiles() {
+        const container = document.getElementById('canvasContainer');
+        if (!container) return;
+        const viewRect = container.getBoundingClientRect();
+
+        this.layers.forEach(layer => {
+            if (layer.pyramid && layer.visible) {
+                TilePyramid.paint(layer.canvas, layer.pyramid, viewRect);
+            }
+        });
+    },
+
+    async ensureFull(layer) {
+        // Edits and exports need every source pixel, not the tiles drawn so far
+        if (!layer.pyramid) return;
+        layer.pyramid.detached = true;
+        layer.pyramid = null;
+
+        const img = await TilePyramid.loadImage(layer.url);
+        const ctx = layer.canvas.getContext('2d');
+        ctx.clearRect(0, 0, layer.canvas.width, layer.canvas.height);
+        ctx.drawImage(img, 0, 0);
+    },
+
     updateLayerList() {
         const listEl = document.getElementById('layerList');
 
@@ -118,7 +152,7 @@ const CanvasStack = {
         listEl.innerHTML = this.layers.map((layer, i) => `
       <div class="layer-item ${i === this.selectedIndex ? 'selected' : ''}" 
            data-index="${i}">
-        <img class="layer-thumb" src="${layer.url}" alt="Layer ${i}">
+        <img class="layer-thumb" src="${layer.thumb}" alt="Layer ${i}">
         <span class="layer-name">Layer ${i}</span>
         <button class="layer-toggle ${layer.visible ? 'visible' : ''}" 
                 data-toggle="${i}" title="Toggle visibility">
@@ -156,7 +190,10 @@ const CanvasStack = {
         const ctx = layer.canvas.getContext('2d');
         ctx.clearRect(0, 0, layer.canvas.width, layer.canvas.height);
         ctx.drawImage(img, 0, 0);
+        if (layer.pyramid) layer.pyramid.detached = true;
+        layer.pyramid = null;
         layer.url = imageUrl;
+        layer.thumb = imageUrl;
 
         this.updateLayerList();
     }
@@ -10,17 +10,17 @@ export const API = {
 
         if (!response.ok) {
             const error = await response.json().catch(() => ({ error: response.statusText }));
-            throw new Error(error.error || 'Request failed');
+            throw Object.assign(new Error(error.error || 'Request failed'), { status: response.status });
         }
 
         return response.json();
     },
 
-    async decompose(imageFile, layers = 4) {
+    async decompose(imageFile, layers = 4, preset = 'quality') {
         const formData = new FormData();
         formData.append('image', imageFile);
         formData.append('layers', layers);
-        formData.append('resolution', 640);
+        formData.append('preset', preset);
 
         return this.request('/decompose', { method: 'POST', body: formData });
     },
@@ -41,24 +41,48 @@ export const API = {
         return this.request('/txt2img', { method: 'POST', body: formData });
     },
 
-    async img2img(imageBlob, prompt, strength = 0.75) {
-        const formData = new FormData();
-        formData.append('image', imageBlob, 'image.png');
-        formData.append('prompt', prompt);
-        formData.append('strength', strength);
+    // Sources the server has decoded/encoded already, by content hash (same key as core/source_cache.py)
+    knownSources: new Set(),
 
-        return this.request('/img2img', { method: 'POST', body: formData });
+    async sourceKey(blob) {
+        if (!window.crypto || !crypto.subtle) return null; // Insecure context: always upload
+        const digest = await crypto.subtle.digest('SHA-256', await blob.arrayBuffer());
+        return Array.from(new Uint8Array(digest).slice(0, 8), b => b.toString(16).padStart(2, '0')).join('');
     },
 
-    async inpaint(imageBlob, maskBlob, prompt, strength = 0.85, useAlphaMask = false) {
-        const formData = new FormData();
-        formData.append('image', imageBlob, 'image.png');
-        formData.append('prompt', prompt);
-        formData.append('strength', strength);
-        formData.append('use_alpha_mask', useAlphaMask);
-        if (maskBlob) formData.append('mask', maskBlob, 'mask.png');
+    async editRequest(endpoint, imageBlob, fields) {
+        // Repeat edits of an unchanged canvas reference it by source_id instead of re-uploading
+        const key = await this.sourceKey(imageBlob);
+        const build = (byId) => {
+            const formData = new FormData();
+            if (byId) formData.append('source_id', key);
+            else formData.append('image', imageBlob, 'image.png');
+            fields.forEach(([name, value, filename]) => filename ? formData.append(name, value, filename) : formData.append(name, value));
+            return formData;
+        };
+
+        let result;
+        if (key && this.knownSources.has(key)) {
+            try {
+                result = await this.request(endpoint, { method: 'POST', body: build(true) });
+            } catch (e) {
+                if (e.status !== 404) throw e;
+                this.knownSources.delete(key); // Evicted server-side: fall back to a full upload
+            }
+        }
+        if (!result) result = await this.request(endpoint, { method: 'POST', body: build(false) });
+        if (result.source_id) this.knownSources.add(result.source_id);
+        return result;
+    },
+
+    async img2img(imageBlob, prompt, strength = 0.75) {
+        return this.editRequest('/img2img', imageBlob, [['prompt', prompt], ['strength', strength]]);
+    },
 
-        return this.request('/inpaint', { method: 'POST', body: formData });
+    async inpaint(imageBlob, maskBlob, prompt, strength = 0.85, useAlphaMask = false, cropToMask = true) {
+        const fields = [['prompt', prompt], ['strength', strength], ['use_alpha_mask', useAlphaMask], ['crop_to_mask', cropToMask]];
+        if (maskBlob) fields.push(['mask', maskBlob, 'mask.png']);
+        return this.editRequest('/inpaint', imageBlob, fields);
     },
 
     async health() { return this.request('/health'); },
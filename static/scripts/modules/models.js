@@ -59,8 +59,10 @@ export const Models = {
 
         ws.onmessage = (event) => {
             try {
-                const health = JSON.parse(event.data);
-                this.updateInterface(health);
+                // Shared broadcaster: first frame is full, the rest are deltas
+                const frame = JSON.parse(event.data);
+                this.telemetry = frame.type === 'full' ? frame.data : this.mergeDelta(this.telemetry || {}, frame.data);
+                this.updateInterface(this.telemetry);
             } catch (e) { console.error(e); }
         };
 
@@ -70,6 +72,15 @@ export const Models = {
         };
     },
 
+    mergeDelta(state, delta) {
+        for (const [k, v] of Object.entries(delta)) {
+            if (v === null) delete state[k];
+            else if (typeof v === 'object' && !Array.isArray(v) && typeof state[k] === 'object' && state[k] !== null) this.mergeDelta(state[k], v);
+            else state[k] = v;
+        }
+        return state;
+    },
+
     updateInterface(health) {
         if (health) {
             // Stats Update
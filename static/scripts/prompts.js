@@ -90,6 +90,11 @@ const PromptBank = {
         "Blend impressionist color treatment"
     ],
 
+    // Speculative pre-encode (server fills its embedding cache before Generate)
+    preEncodeDelay: 600,
+    preEncodeTimer: null,
+    lastPreEncoded: '',
+
     init() {
         this.setPlaceholder('genPrompt', this.generate);
         this.setPlaceholder('editPrompt', this.edit);
@@ -122,6 +127,31 @@ const PromptBank = {
         return [];
     },
 
+    schedulePreEncode(delay = this.preEncodeDelay, retry = true) {
+        clearTimeout(this.preEncodeTimer);
+        this.preEncodeTimer = setTimeout(() => this.preEncode(retry), delay);
+    },
+
+    async preEncode(retry = true) {
+        const prompt = document.getElementById('genPrompt')?.value.trim();
+        if (!prompt || prompt === this.lastPreEncoded) return;
+
+        const formData = new FormData();
+        formData.append('prompt', prompt);
+        try {
+            const res = await fetch('/api/preencode', { method: 'POST', body: formData });
+            const { status } = await res.json();
+            if (status === 'encoded' || status === 'cached') {
+                this.lastPreEncoded = prompt;
+            } else if (status === 'busy' && retry) {
+                // A strike holds the Silicon: try once more when it is likely done
+                this.schedulePreEncode(this.preEncodeDelay * 3, false);
+            }
+        } catch (e) {
+            // Best effort only; Generate encodes on its own
+        }
+    },
+
     // Handle Space to Autocomplete
     handleSpace(e) {
         if (e.code === 'Space') {
@@ -138,6 +168,7 @@ const PromptBank = {
 
                     // Force re-shuffling of placeholder for next use if they clear it
                     this.init();
+                    if (activeEl.id === 'genPrompt') this.schedulePreEncode(0);
 
                     // Visual feedback
                     activeEl.style.transition = 'background 0.2s, color 0.2s';
@@ -155,4 +186,6 @@ document.addEventListener('DOMContentLoaded', () => {
     PromptBank.init();
     // Global listener for Space autocompletion (when empty)
     document.addEventListener('keydown', (e) => PromptBank.handleSpace(e));
+    // Pre-encode the generate prompt once typing pauses
+    document.getElementById('genPrompt')?.addEventListener('input', () => PromptBank.schedulePreEncode());
 });
@@ -0,0 +1,112 @@
+/**
+ * ASSET EDITOR - Tile Pyramid
+ * Streams only the visible WebP tiles of an output at the current zoom
+ */
+
+const TilePyramid = {
+    async load(imageUrl) {
+        if (!imageUrl || !imageUrl.startsWith('/outputs/')) return null;
+
+        try {
+            const res = await fetch(`/api/pyramid?src=${encodeURIComponent(imageUrl)}`);
+            if (!res.ok) return null;
+            const meta = await res.json();
+
+            // Finest-grid coverage: which level last painted each full-res tile cell (-1 = thumbnail only)
+            meta.top = meta.levels - 1;
+            meta.cols = Math.ceil(meta.width / meta.tile);
+            meta.rows = Math.ceil(meta.height / meta.tile);
+            meta.coverage = new Int8Array(meta.cols * meta.rows).fill(-1);
+            meta.inflight = new Set();
+            return meta;
+        } catch (e) {
+            return null;
+        }
+    },
+
+    loadImage(url) {
+        return new Promise((resolve, reject) => {
+            const img = new Image();
+            img.onload = () => resolve(img);
+            img.onerror = reject;
+            img.src = url;
+        });
+    },
+
+    async drawThumb(canvas, meta) {
+        const img = await this.loadImage(meta.thumb);
+        canvas.getContext('2d').drawImage(img, 0, 0, meta.width, meta.height);
+    },
+
+    levelFor(meta, density) {
+        // Coarsest level that still has at least one tile pixel per device pixel
+        const level = meta.top + Math.ceil(Math.log2(Math.max(density * (window.devicePixelRatio || 1), 1e-3)));
+        return Math.max(0, Math.min(meta.top, level));
+    },
+
+    paint(canvas, meta, viewRect) {
+        const rect = canvas.getBoundingClientRect();
+        if (!rect.width || !rect.height) return;
+
+        const left = Math.max(viewRect.left, rect.left);
+        const right = Math.min(viewRect.right, rect.right);
+        const top = Math.max(viewRect.top, rect.top);
+        const bottom = Math.min(viewRect.bottom, rect.bottom);
+        if (right <= left || bottom <= top) return;
+
+        const density = rect.width / meta.width;
+        const level = this.levelFor(meta, density);
+        const factor = 2 ** (meta.top - level); // Full-res pixels per level pixel
+        const span = meta.tile * factor;        // Full-res pixels per tile
+
+        const c0 = Math.floor((left - rect.left) / density / span);
+        const c1 = Math.min(Math.ceil(meta.width / span), Math.ceil((right - rect.left) / density / span));
+        const r0 = Math.floor((top - rect.top) / density / span);
+        const r1 = Math.min(Math.ceil(meta.height / span), Math.ceil((bottom - rect.top) / density / span));
+
+        for (let row = r0; row < r1; row++) {
+            for (let col = c0; col < c1; col++) {
+                this.fetchTile(canvas, meta, level, col, row, factor);
+            }
+        }
+    },
+
+    cells(meta, x, y, span) {
+        const out = [];
+        const cx1 = Math.min(meta.cols, Math.ceil((x + span) / meta.tile));
+        const cy1 = Math.min(meta.rows, Math.ceil((y + span) / meta.tile));
+        for (let cy = Math.floor(y / meta.tile); cy < cy1; cy++) {
+            for (let cx = Math.floor(x / meta.tile); cx < cx1; cx++) {
+                out.push(cy * meta.cols + cx);
+            }
+        }
+        return out;
+    },
+
+    fetchTile(canvas, meta, level, col, row, factor) {
+        const x = col * meta.tile * factor;
+        const y = row * meta.tile * factor;
+        const cells = this.cells(meta, x, y, meta.tile * factor);
+
+        // Zooming out never repaints sharper pixels with blurrier ones
+        if (cells.every(i => meta.coverage[i] >= level)) return;
+
+        const key = `${level}/${col}_${row}`;
+        if (meta.inflight.has(key)) return;
+        meta.inflight.add(key);
+
+        const url = meta.tiles.replace('{level}', level).replace('{col}', col).replace('{row}', row);
+        this.loadImage(url).then(img => {
+            if (meta.detached) return; // Layer switched to its full-resolution source meanwhile
+            const ctx = canvas.getContext('2d');
+            const w = img.width * factor;
+            const h = img.height * factor;
+            ctx.clearRect(x, y, w, h); // Alpha layers: replace the region, don't composite over it
+            ctx.drawImage(img, x, y, w, h);
+            cells.forEach(i => { meta.coverage[i] = level; });
+        }).catch(() => { }).finally(() => meta.inflight.delete(key));
+    }
+};
+
+// Expose to window for modules
+window.TilePyramid = TilePyramid;
@@ -12,6 +12,7 @@ const Viewport = {
 
     isPanning: false,
     startPos: { x: 0, y: 0 },
+    tileTimer: null,
 
     init() {
         this.container = document.getElementById('canvasContainer');
@@ -64,6 +65,13 @@ const Viewport = {
     updateTransform() {
         if (!this.wrapper) return;
         this.wrapper.style.transform = `translate(${this.offset.x}px, ${this.offset.y}px) scale(${this.scale})`;
+        this.scheduleTiles();
+    },
+
+    scheduleTiles() {
+        // Fetch tiles for the new view once panning/zooming settles
+        clearTimeout(this.tileTimer);
+        this.tileTimer = setTimeout(() => window.CanvasStack?.refreshTiles(), 80);
     },
 
     reset() {
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests run against the simulated backend (no GPU, no weights); must be set before core imports.
+os.environ.setdefault("ASSET_BACKEND", "stub")
+os.environ.setdefault("ASSET_RESIDENCY", "off")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,103 @@
+import gc
+import logging
+import tracemalloc
+
+import pytest
+import torch
+
+from core.buckets import LatentBufferPool, MAX_BUFFER_BUCKETS
+from core.carrier import ZerodragCarrier, carrier, EMBED_CACHE_SIZE
+from core.derivatives import derivatives
+from core.loaders.hybrid_loader import hybrid_loader
+from core.loaders.stub_loader import load_profile
+
+DISPATCHES = 2000
+WARMUP = 200
+PROMPTS = [f"leak probe {i}" for i in range(EMBED_CACHE_SIZE * 3)]
+SIZES = [(256, 256), (384, 256), (256, 384), (512, 512)]
+GROWTH_LIMIT = 2 * 1024**2      # Net traced bytes allowed between warm-up and the last dispatch
+
+
+@pytest.fixture
+def stub_carrier(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(derivatives, "submit", lambda url: None)  # Pyramids are not under test
+    profile = load_profile('{"speed": 0.0, "image": "flat"}')
+    monkeypatch.setattr(carrier, "profile", profile)
+    monkeypatch.setattr(hybrid_loader, "profile", profile)
+    logger = logging.getLogger("ASSET_EDITOR")
+    level = logger.level
+    logger.setLevel(logging.WARNING)  # Captured log records would count as growth
+    yield carrier
+    logger.setLevel(level)
+
+
+def _strike(c, i):
+    width, height = SIZES[i % len(SIZES)]
+    if i % 7 == 0:
+        c.pre_encode(PROMPTS[(i + 1) % len(PROMPTS)])
+    return c.dispatch(PROMPTS[i % len(PROMPTS)], height=height, width=width, seed=i, hires=False)
+
+
+def test_stub_dispatches_do_not_leak(stub_carrier):
+    for i in range(WARMUP):
+        _strike(stub_carrier, i)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.take_snapshot()
+        for i in range(WARMUP, DISPATCHES):
+            assert _strike(stub_carrier, i)["status"] == "success"
+        gc.collect()
+        after = tracemalloc.take_snapshot()
+    finally:
+        tracemalloc.stop()
+
+    growth = sum(stat.size_diff for stat in after.compare_to(before, "filename"))
+    assert growth < GROWTH_LIMIT, f"{growth / 1e6:.2f}MB retained over {DISPATCHES - WARMUP} dispatches"
+    assert len(stub_carrier.embed_cache) <= EMBED_CACHE_SIZE
+    assert stub_carrier._speculated <= set(stub_carrier.embed_cache)
+    assert not gc.garbage
+
+
+class _BufferPipe:
+    """Just enough of Flux2KleinPipeline for LatentBufferPool on CPU."""
+    vae_scale_factor = 8
+
+    class transformer:
+        class config:
+            axes_dims_rope = (32, 32, 32, 32)
+
+    @staticmethod
+    def _prepare_latent_ids(latents):
+        b, _, h, w = latents.shape
+        return torch.zeros((b, h * w, 3))
+
+    @staticmethod
+    def _pack_latents(latents):
+        b, c, h, w = latents.shape
+        return latents.reshape(b, c, h * w).permute(0, 2, 1)
+
+
+def test_latent_buffers_stay_bounded():
+    pool, pipe = LatentBufferPool(), _BufferPipe()
+    shapes = [(w, h) for w in range(256, 1280, 128) for h in range(256, 1280, 128)]
+    for i in range(3000):
+        width, height = shapes[i % len(shapes)]
+        pool.prepare_latents(pipe, 1, 32, height, width, device="cpu", dtype=torch.float32)
+        pool.pad_text_ids(torch.zeros((1, 64 + i % 40, 3)), 4)
+        assert len(pool._buckets) <= MAX_BUFFER_BUCKETS
+        assert len(pool._txt) <= MAX_BUFFER_BUCKETS
+    state = pool.get_state()
+    assert state["hits"] + state["misses"] == 3000
+    assert len(state["buckets"]) == MAX_BUFFER_BUCKETS
+
+
+def test_targeted_reclaim_skips_gc_on_cpu():
+    c = ZerodragCarrier()
+    for _ in range(5000):
+        assert c.clear_board(need_gb=1.0) == 0
+        assert c.clear_board(hard=False) == 0
+    assert c.reclaim["calls"] == 10000
+    assert c.reclaim["gc_runs"] == 0
+    assert c.reclaim["bytes_total"] == 0
@@ -0,0 +1,51 @@
+import io
+
+import pytest
+from PIL import Image
+
+from core.loaders.hybrid_loader import hybrid_loader
+from core.loaders.stub_loader import StubPipeline, load_profile
+from core.source_cache import source_cache
+from routes.generate import _run_cached_edit
+
+
+@pytest.fixture
+def stub_pipe(monkeypatch):
+    from model_manager import model_manager
+    monkeypatch.setattr(hybrid_loader, "profile", load_profile('{"speed": 0.0}'))
+    pipe = StubPipeline()
+    monkeypatch.setattr(type(model_manager), "_flux_pipe", property(lambda self: pipe))
+    return pipe
+
+
+def _upload(color):
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 48), color).save(buf, format="PNG")
+    return source_cache.put(buf.getvalue())
+
+
+def test_img2img_reuses_source_latents(stub_pipe):
+    assert source_cache.caches_latents(stub_pipe)
+    source_id, image = _upload("red")
+    hits = source_cache.hits
+    for _ in range(3):
+        result = _run_cached_edit(source_id, image, prompt="edit", num_inference_steps=1)
+        assert result.images[0].size == image.size
+    assert stub_pipe.encodes == 1
+    assert source_cache.hits - hits == 2
+
+
+def test_latents_keyed_by_source_and_size(stub_pipe):
+    first_id, first = _upload("orange")
+    second_id, second = _upload("teal")
+    _run_cached_edit(first_id, first, prompt="edit")
+    _run_cached_edit(second_id, second, prompt="edit")
+    _run_cached_edit(first_id, first.resize((32, 32)), prompt="edit")
+    assert stub_pipe.encodes == 3
+
+
+def test_unbound_encode_is_not_cached(stub_pipe):
+    _, image = _upload("green")
+    stub_pipe(image=image)
+    stub_pipe(image=image)
+    assert stub_pipe.encodes == 2
@@ -0,0 +1,31 @@
+import os
+import sys
+import json
+import subprocess
+
+from core.startup import IMPORT_BUDGET_S
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEAVY = ("torch", "diffusers", "transformers")
+PROBE = (
+    "import sys, time, json\n"
+    "t = time.perf_counter()\n"
+    "import server\n"
+    "elapsed = time.perf_counter() - t\n"
+    f"print(json.dumps({{'seconds': elapsed, 'heavy': [m for m in {HEAVY!r} if m in sys.modules]}}))\n"
+)
+
+
+def _import_server():
+    env = dict(os.environ)
+    env.pop("ASSET_BACKEND", None)  # Measure the production boot path, not the simulated one
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert out.returncode == 0, out.stderr
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def test_server_import_within_budget():
+    _import_server()  # Cold run writes bytecode caches; time the warm boot
+    probe = _import_server()
+    assert not probe["heavy"], f"ML stack imported at boot: {probe['heavy']}"
+    assert probe["seconds"] < IMPORT_BUDGET_S, f"import server took {probe['seconds']:.2f}s (budget {IMPORT_BUDGET_S:.2f}s)"